@@ -0,0 +1,227 @@
+"""
+An endless falling-tile corridor that's built in chunks as the player walks up it.
+
+Each chunk is CORRIDOR_CHUNK_LENGTH rows of FallingTiles between two walls. The second-to-last row holds one
+tile per possible answer to the chunk's math problem, and the last row is a gate of walls that only opens
+when the player steps on the right answer. Stepping on a wrong answer makes that tile fall away; the floor and
+the right answer stay put.
+
+Only CORRIDOR_RING_SIZE chunks ever exist. Once a chunk is out of sight behind the player, its sprites are
+moved up to become the next chunk ahead with a new problem, so the corridor costs the same however far it goes.
+Below the lowest chunk is a landing with the door out, walled in on three sides, which moves up along with it
+so the corridor is always closed off behind the player.
+"""
+import random
+
+import arcade
+
+from atlas import load_texture
+from constant import *
+from FallingTileStuff.falling_tile import FallingTile
+from numbers_and_math import get_clean_problem
+
+CORRIDOR_TILE_SIZE = TILE_SIZE * TILE_SCALING
+
+
+def answer_choices(answer, count):
+    """count distinct non-negative numbers including answer, in random order."""
+    spread = max(count, abs(answer) // 2)
+    candidates = [value for value in range(max(0, answer - spread), answer + spread + 1) if value != answer]
+    choices = random.sample(candidates, min(count - 1, len(candidates))) + [answer]
+    random.shuffle(choices)
+    return choices
+
+
+def make_wall():
+    wall = arcade.Sprite(texture=load_texture(CORRIDOR_WALL_PATH, hit_box_algorithm="None"),
+                         hit_box_algorithm="None")
+    wall.scale = CORRIDOR_TILE_SIZE / wall.texture.width
+    return wall
+
+
+def place_wall(walls, wall, center_x, center_y):
+    wall.center_x = center_x
+    wall.center_y = center_y
+    if walls not in wall.sprite_lists:
+        walls.append(wall)
+
+
+class CorridorChunk:
+
+    def __init__(self, scene, operator_str=None):
+        self.operator_str = operator_str
+
+        # Floor and answer tiles, drawn as their own layer. Built once and reused for every chunk this becomes.
+        self.tiles = arcade.SpriteList()
+        self.floor_tiles = []
+        self.answer_tiles = []
+        for _ in range(CORRIDOR_WIDTH * (CORRIDOR_CHUNK_LENGTH - 2)):
+            self.floor_tiles.append(self._make_tile(scene))
+        for _ in range(CORRIDOR_WIDTH):
+            self.answer_tiles.append(self._make_tile(scene))
+
+        # Walls go in the scene's walls layer so the physics engine stops the player at them
+        self.walls = scene.walls
+        self.side_walls = [make_wall() for _ in range(2 * CORRIDOR_CHUNK_LENGTH)]
+        self.gate = [make_wall() for _ in range(CORRIDOR_WIDTH)]
+
+        self.index = None
+        self.problem = None
+        self.solved = False
+
+    @staticmethod
+    def _make_tile(scene):
+        tile = FallingTile(scale=TILE_SCALING)
+        tile.setup(scene)
+        # Only wrong answers fall, and check_answer() drops those
+        tile.falls_when_touched = False
+        tile.answer = None
+        return tile
+
+    def place(self, index, origin_x, origin_y):
+        """Turn this into the index-th chunk of the corridor, with a new problem."""
+        self.index = index
+        self.problem = get_clean_problem(operator_str=self.operator_str)
+        self.solved = False
+        bottom = origin_y + index * CORRIDOR_CHUNK_LENGTH * CORRIDOR_TILE_SIZE
+
+        def column_x(column):
+            return origin_x + (column + 0.5) * CORRIDOR_TILE_SIZE
+
+        def row_y(row):
+            return bottom + (row + 0.5) * CORRIDOR_TILE_SIZE
+
+        for position, tile in enumerate(self.floor_tiles):
+            self._place_tile(tile, column_x(position % CORRIDOR_WIDTH), row_y(position // CORRIDOR_WIDTH))
+        choices = answer_choices(self.problem.answer, CORRIDOR_WIDTH)
+        for column, tile in enumerate(self.answer_tiles):
+            self._place_tile(tile, column_x(column), row_y(CORRIDOR_CHUNK_LENGTH - 2))
+            tile.answer = choices[column] if column < len(choices) else None
+
+        for row in range(CORRIDOR_CHUNK_LENGTH):
+            place_wall(self.walls, self.side_walls[2 * row], column_x(-1), row_y(row))
+            place_wall(self.walls, self.side_walls[2 * row + 1], column_x(CORRIDOR_WIDTH), row_y(row))
+        for column, wall in enumerate(self.gate):
+            place_wall(self.walls, wall, column_x(column), row_y(CORRIDOR_CHUNK_LENGTH - 1))
+
+    def _place_tile(self, tile, center_x, center_y):
+        tile.reset(center_x, center_y, CORRIDOR_FALL_DISTANCE)
+        if self.tiles not in tile.sprite_lists:
+            # It fell out of the corridor last time this chunk was used
+            self.tiles.append(tile)
+
+    @property
+    def top(self):
+        return self.gate[0].top
+
+    def check_answer(self, player):
+        """
+        Open the gate if the player is on the right answer, and drop any wrong answer they step on.
+        Returns True if this opened the gate.
+        """
+        if self.solved:
+            return False
+        for tile in self.answer_tiles:
+            if tile.answer is None or len(tile.sprite_lists) == 0 or not arcade.check_for_collision(player, tile):
+                continue
+            if tile.answer == self.problem.answer:
+                self.solved = True
+                for wall in self.gate:
+                    wall.remove_from_sprite_lists()
+                return True
+            tile.isFalling = True
+        return False
+
+    def draw(self):
+        if not self.solved:
+            gate = self.gate[len(self.gate) // 2]
+            arcade.draw_text(f"{self.problem.lhs} {self.problem.operator} {self.problem.rhs} = ?",
+                             gate.center_x, gate.center_y, arcade.color.WHITE, 20, bold=True,
+                             anchor_x="center", anchor_y="center")
+        for tile in self.answer_tiles:
+            if tile.answer is not None and len(tile.sprite_lists) > 0:
+                arcade.draw_text(str(tile.answer), tile.center_x, tile.center_y, arcade.color.BLACK, 20,
+                                 bold=True, anchor_x="center", anchor_y="center")
+
+
+class CorridorStream:
+    """
+    The corridor as a whole. Call update() every simulation step and draw() after the scene is drawn.
+    """
+
+    def __init__(self, scene, origin_x, origin_y, operator_str=None, ring_size=CORRIDOR_RING_SIZE, exit_door=None):
+        """
+        Params:
+        :origin_x, origin_y: bottom-left corner of the corridor's floor; the corridor runs up from there.
+        :operator_str: the operator every chunk's problem uses, or None for a random one each time.
+        :exit_door: the door out of the room, which is kept in the landing below the lowest chunk.
+        """
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.exit_door = exit_door
+        self.walls = scene.walls
+        # Walls either side of the landing, then the row underneath it
+        self.landing = [make_wall() for _ in range(2 + CORRIDOR_WIDTH + 2)]
+        self.chunks = []
+        for slot in range(ring_size):
+            chunk = CorridorChunk(scene, operator_str)
+            chunk.place(slot, origin_x, origin_y)
+            scene.add_sprite_list_before(f"{LAYER_NAME_FALLING_TILE}_corridor_{slot}", LAYER_NAME_PLAYER,
+                                         sprite_list=chunk.tiles)
+            self.chunks.append(chunk)
+        # Index of the chunk furthest behind, which lives in slot first_index % ring_size
+        self.first_index = 0
+        self.gates_opened = 0
+        self._place_landing()
+
+    @property
+    def start(self):
+        """Where the player should start: the middle of the first row."""
+        return self.origin_x + CORRIDOR_WIDTH * CORRIDOR_TILE_SIZE / 2, self.origin_y + CORRIDOR_TILE_SIZE / 2
+
+    def restart(self):
+        """Put the corridor back at its start with new problems, e.g. when the player comes back in from the hub."""
+        self.first_index = 0
+        for slot, chunk in enumerate(self.chunks):
+            chunk.place(slot, self.origin_x, self.origin_y)
+        self._place_landing()
+
+    def update(self, player):
+        for chunk in self.chunks:
+            chunk.tiles.update()
+            if chunk.check_answer(player):
+                self.gates_opened += 1
+
+        # Reuse chunks that are out of sight behind the player as the next ones ahead
+        first_index = self.first_index
+        behind = self.chunks[self.first_index % len(self.chunks)]
+        while behind.top < player.center_y - SCREEN_HEIGHT / 2 - CORRIDOR_TILE_SIZE:
+            behind.place(self.first_index + len(self.chunks), self.origin_x, self.origin_y)
+            self.first_index += 1
+            behind = self.chunks[self.first_index % len(self.chunks)]
+        if self.first_index != first_index:
+            self._place_landing()
+
+    def _place_landing(self):
+        """Wall in the row below the lowest chunk on three sides, with the exit door in the middle of it."""
+        bottom = self.origin_y + self.first_index * CORRIDOR_CHUNK_LENGTH * CORRIDOR_TILE_SIZE
+
+        def column_x(column):
+            return self.origin_x + (column + 0.5) * CORRIDOR_TILE_SIZE
+
+        landing_y = bottom - CORRIDOR_TILE_SIZE / 2
+        place_wall(self.walls, self.landing[0], column_x(-1), landing_y)
+        place_wall(self.walls, self.landing[1], column_x(CORRIDOR_WIDTH), landing_y)
+        for column, wall in enumerate(self.landing[2:], start=-1):
+            place_wall(self.walls, wall, column_x(column), landing_y - CORRIDOR_TILE_SIZE)
+        if self.exit_door is not None:
+            self.exit_door.setCoordinates(column_x(CORRIDOR_WIDTH // 2), landing_y)
+
+    def draw(self):
+        for chunk in self.chunks:
+            chunk.draw()
+
+    def signature(self):
+        """What render_signature() needs to know about the corridor."""
+        falling = tuple(tile.center_y for chunk in self.chunks for tile in chunk.tiles if tile.isFalling)
+        return self.first_index, tuple(chunk.solved for chunk in self.chunks), falling
@@ -1,11 +1,15 @@
 import arcade
 import random
 
-from constant import FALLING_TILE_PATH, LAYER_NAME_FALLING_TILE, LAYER_NAME_PLAYER
+from atlas import load_texture
+from constant import FALLING_TILE_PATH, FALLING_TILE_SPEED, LAYER_NAME_FALLING_TILE, LOG_HOT_PATHS
+from game_log import fields, get_logger
 # from constant import *
 # from numbers_and_math import BlockType
 # from enum import Enum
 
+log = get_logger("falling_tile")
+
 
 class FallingTile(arcade.Sprite):
 
@@ -31,8 +35,12 @@ class FallingTile(arcade.Sprite):
         super().__init__(scale=scale / 2)
 
         self.isFalling = False
+        # Whether the player touching the tile makes it fall. The corridor turns this off and drops tiles itself.
+        self.falls_when_touched = True
+        # The tile is gone once it falls to here
+        self.floor_y = 0
 
-        self.texture = arcade.load_texture(FALLING_TILE_PATH)
+        self.texture = load_texture(FALLING_TILE_PATH)
         self.player_sprite_list = None
     
 
@@ -40,8 +48,14 @@ class FallingTile(arcade.Sprite):
 
         # print(f"FallingTile Scene: {scene}")
 
-        self.player_sprite_list = scene.get_sprite_list(LAYER_NAME_PLAYER)
-        
+        self.player_sprite_list = scene.players
+
+    def reset(self, center_x, center_y, fall_distance):
+        """Put the tile back in place so it can be reused (see corridor.py)."""
+        self.center_x = center_x
+        self.center_y = center_y
+        self.floor_y = center_y - fall_distance
+        self.isFalling = False
 
 
     def update(self):
@@ -54,12 +68,13 @@ class FallingTile(arcade.Sprite):
             - Then make room reset at the end door.
         """
         # Tile go fall down
-        if self.collides_with_list(self.player_sprite_list):
+        if self.falls_when_touched and not self.isFalling and self.collides_with_list(self.player_sprite_list):
             self.isFalling = True
 
         if self.isFalling:
-            self.center_y -= 2
+            self.center_y -= FALLING_TILE_SPEED
 
-        print(f"Y: {self.center_y}")
-        if self.center_y <= 0:
+        if __debug__ and LOG_HOT_PATHS:
+            log.debug("Falling tile moved", extra=fields(y=self.center_y, falling=self.isFalling))
+        if self.center_y <= self.floor_y:
             self.kill()
\ No newline at end of file
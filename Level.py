@@ -1,47 +1,182 @@
 """
 Parent class for all levels
 """
+from pathlib import Path
+from types import SimpleNamespace
+
+import attr
+import pytiled_parser
+
 from constant import *
+from chunked_map import ChunkStreamer, ChunkedMap
+from game_log import fields, get_logger
+from game_scene import GameScene
 from door import Door
 from numbers_and_math import VisualMathProblemLocation, VisualMathProblem
+from save_state import restore_groups
+
+log = get_logger("score")
+
+
+def layer_bands(layer, rows):
+    """
+    Splits a tile layer into copies that each keep only a band of the given number of rows (the rest empty),
+    so its sprites can be built a band at a time. Any other kind of layer, or rows=None, gives the layer whole.
+    """
+    if rows is None or not isinstance(layer, pytiled_parser.TileLayer) or layer.data is None:
+        return [layer]
+    return [attr.evolve(layer, data=[row if start <= index < start + rows else [0] * len(row)
+                                     for index, row in enumerate(layer.data)])
+            for start in range(0, len(layer.data), rows)]
 
 
 class Level:
 
     def __init__(self):
 
+        self.name = None
+        self.scene = None
+
         # Score logic
         self.is_falling_tile_map = None
         self.score = None
         self.max_score = None
         self.problem_list = []
+        # An endless falling-tile corridor, for rooms that have one (see FallingTileStuff/corridor.py)
+        self.corridor = None
+        # Pages the map's tiles in and out around the player, for streamed maps (see chunked_map.py)
+        self.streamer = None
+        # Kept around so the map can be reloaded later (see hot_reload.py)
+        self.map_name = None
+        self.layer_options = None
+        # (columns, rows) of the tilemap, and the guidance arrow built from it the first time the level is entered
+        self.grid_size = None
+        self.guidance = None
+        # What's left of build() when the level is being built a stage at a time, otherwise None
+        self._stages = None
+        # Tile rows of a layer built per stage, or None for whole layers. Smaller stages cost more in total.
+        self.rows_per_stage = None
+
+    def build(self, snapshot=None):
+        """
+        Builds the level, yielding between stages that each take a while (parsing the map, each layer's sprites,
+        the problems) so it can be spread over several frames. Subclasses override this.
+        """
+        yield from ()
+
+    def build_step(self) -> bool:
+        """Runs the next stage of build(). Returns True once the level is fully built."""
+        if self._stages is None:
+            return True
+        try:
+            next(self._stages)
+            return False
+        except StopIteration:
+            self._stages = None
+            return True
+
+    def finish_building(self):
+        while not self.build_step():
+            pass
 
     def make_scene(self, map_name, room_operator, layer_options):
+        for _ in self.make_scene_stages(map_name, layer_options):
+            pass
+        return self.scene
+
+    def make_scene_stages(self, map_name, layer_options):
+        """
+        make_scene() as stages for build(): parses the map, then builds the sprites for each layer, in bands of
+        self.rows_per_stage rows if it's set. Sets self.scene once every layer is done.
+        """
+        self.map_name = map_name
+        self.layer_options = layer_options
 
-        # Load tile_map
-        tile_map = arcade.load_tilemap(map_name, TILE_SCALING, layer_options)
+        tiled_map = pytiled_parser.parse_map(Path(map_name))
+        self.grid_size = (tiled_map.map_size.width, tiled_map.map_size.height)
+        layers = tiled_map.layers
+        sprite_lists = {}
+        for layer in layers:
+            for band in layer_bands(layer, self.rows_per_stage):
+                yield
+                tiled_map.layers = [band]
+                tile_map = arcade.TileMap(scaling=TILE_SCALING, layer_options=layer_options,
+                                          hit_box_algorithm=TILE_HIT_BOX_ALGORITHM, tiled_map=tiled_map)
+                for name, sprite_list in tile_map.sprite_lists.items():
+                    if name not in sprite_lists:
+                        sprite_lists[name] = sprite_list
+                        continue
+                    sprites = list(sprite_list)
+                    sprite_list.clear()
+                    sprite_lists[name].extend(sprites)
+        tiled_map.layers = layers
 
-        # Initialize Scene from the tilemap
-        scene = arcade.Scene.from_tilemap(tile_map)
+        # Initialize Scene from the tilemap's layers. GameScene adds the game's own sprite lists.
+        self.scene = GameScene.from_tilemap(SimpleNamespace(sprite_lists=sprite_lists))
 
-        # Create the Sprite lists
-        scene.add_sprite_list(LAYER_NAME_NUMBER_TARGETS)
-        scene.add_sprite_list(LAYER_NAME_PLAYER)
-        scene.add_sprite_list(LAYER_NAME_NUMBER)
-        scene.add_sprite_list(LAYER_NAME_NUMBER_SYMBOLS)
-        scene.add_sprite_list(LAYER_NAME_NUMBER_HITBOX)
-        scene.add_sprite_list(LAYER_NAME_DOORS)
+    def make_streamed_scene(self, chunk_directory, room_operator):
+        """
+        Like make_scene(), for a map split into chunks by chunked_map.py. The scene starts with only the math
+        problems in it; self.streamer adds the tiles around the player as they move.
+        """
+        self.map_name = chunk_directory
+        chunked_map = ChunkedMap(chunk_directory)
+        self.grid_size = (chunked_map.width, chunked_map.height)
 
+        scene = GameScene()
+        for x, y in chunked_map.problem_origins:
+            problem_location = VisualMathProblemLocation(operator_str=room_operator)
+            problem_location.center_x = x
+            problem_location.center_y = y
+            scene.math_problems.append(problem_location)
+        self.streamer = ChunkStreamer(scene, chunked_map)
         return scene
 
+    def setup_problems(self, snapshot=None):
+        """
+        Set up the math problems on this Level's scene. Must be done AFTER the scene is fully initialized.
+        If a LevelSnapshot is given, the problems and blocks are rebuilt from it instead of generating new ones.
+        """
+        for index, prob in enumerate(self.scene.math_problems):
+            assert (isinstance(prob, VisualMathProblemLocation))
+            problem_snapshot = None
+            if snapshot is not None and index < len(snapshot.problems):
+                problem_snapshot = snapshot.problems[index]
+            prob.setup(self.scene, problem_snapshot)
+            prob.vmp.room_name = self.name
+            self.problem_list.append(prob.vmp)
+        if snapshot is not None:
+            restore_groups(self.problem_list, snapshot)
+
+    def unload(self):
+        """
+        Called when this Level is evicted. The player sprite is shared between every scene, so take it
+        out of this one, otherwise the player would keep the whole scene alive.
+        """
+        player_list = self.scene.players
+        for sprite in list(player_list):
+            player_list.remove(sprite)
+        self.scene = None
+        self.corridor = None
+        if self.streamer is not None:
+            self.streamer.stop()
+            self.streamer = None
+        self.guidance = None
+        self.problem_list = []
+
+    def mark_problems_shown(self):
+        """Called when the player enters this Level, to start timing how long each problem takes."""
+        for problem in self.problem_list:
+            problem.mark_shown()
+
     def update_score(self):
-        print("Updating score at the Level levelW")
         temp_score = 0
         for problem in self.problem_list:
             assert (isinstance(problem, VisualMathProblem))
             if problem.is_solved():
                 temp_score += 1
         self.score = temp_score
+        log.debug("Score updated", extra=fields(room=self.name, score=self.score, max_score=self.max_score))
 
     def is_level_complete(self) -> bool:
         return self.score >= self.max_score
@@ -0,0 +1,79 @@
+"""
+Every room in the game, declared in one place. Level builds a room from its RoomSpec, and MyGame uses the
+manifest for both the room registry and the hub's doors, so adding a room is just adding an entry here.
+"""
+
+
+class RoomSpec:
+
+    def __init__(self, map_name, operator, entrance, entrance_spawn, exit, exit_spawn, falling_tiles=False,
+                 corridor_origin=None, streamed=False):
+        """
+        Params:
+        :entrance: where the door into this room sits in the hub.
+        :entrance_spawn: where the player appears in this room after using that door.
+        :exit: where the door back to the hub sits in this room.
+        :exit_spawn: where the player appears in the hub after using it.
+        :falling_tiles: whether the map has a falling_tile layer.
+        :corridor_origin: if set, an endless falling-tile corridor (see FallingTileStuff/corridor.py) runs up
+        from this bottom-left corner.
+        :streamed: map_name is a directory made by chunked_map.py, whose tiles are paged in around the player
+        instead of loaded all at once. For worlds too big for load_tilemap().
+        """
+        self.map_name = map_name
+        self.operator = operator
+        self.entrance = entrance
+        self.entrance_spawn = entrance_spawn
+        self.exit = exit
+        self.exit_spawn = exit_spawn
+        self.falling_tiles = falling_tiles
+        self.corridor_origin = corridor_origin
+        self.streamed = streamed
+
+
+ROOM_MANIFEST = {
+    "addition": RoomSpec(
+        map_name="maps/Castle-Area.tmx",
+        operator="+",
+        entrance=(2016, 414),
+        entrance_spawn=(1696, 790),
+        exit=(1696, 863),
+        exit_spawn=(2016, 340)
+    ),
+    "subtraction": RoomSpec(
+        map_name="maps/falling-tile-demo.tmx",
+        operator="-",
+        entrance=(2050, 2718),
+        entrance_spawn=(513, 106),
+        exit=(513, 33),
+        exit_spawn=(2050, 2645),
+        falling_tiles=True
+    ),
+    # The corridor runs up from just right of the demo map, so it never overlaps it
+    "endless": RoomSpec(
+        map_name="maps/falling-tile-demo.tmx",
+        operator="-",
+        entrance=(2178, 2718),
+        entrance_spawn=(1760, 256),
+        exit=(1760, 160),
+        exit_spawn=(2178, 2645),
+        falling_tiles=True,
+        corridor_origin=(1600, 192)
+    ),
+    "multiplication": RoomSpec(
+        map_name="maps/Urban-Area.tmx",
+        operator="*",
+        entrance=(322, 1182),
+        entrance_spawn=(1312, 1500),
+        exit=(1312, 1567),
+        exit_spawn=(322, 1110)
+    ),
+    "division": RoomSpec(
+        map_name="maps/Grass-Area.tmx",
+        operator="/",
+        entrance=(2976, 1182),
+        entrance_spawn=(544, 1547),
+        exit=(544, 1630),
+        exit_spawn=(2976, 1099)
+    ),
+}
@@ -0,0 +1,84 @@
+"""
+A room built from its RoomSpec in manifest.py. This replaces the separate AdditionRoom, SubtractionRoom, etc.
+classes, which were the same code with different numbers in it.
+"""
+from constant import *
+from FallingTileStuff.corridor import CorridorStream
+from FallingTileStuff.falling_tile import FallingTile
+from numbers_and_math import VisualMathProblemLocation
+from door import Door
+from Level import Level
+from Rooms.manifest import ROOM_MANIFEST, RoomSpec
+
+
+def room_layer_options(spec: RoomSpec):
+    """Custom map options for a room's tilemap."""
+    layer_options = {
+        LAYER_NAME_MATH_PROBLEM_ORIGIN: {
+            "custom_class": VisualMathProblemLocation,
+            "custom_class_args": {
+                "operator_str": spec.operator
+            }
+        },
+        LAYER_NAME_WALLS: {
+            "hit_box_algorithm": "None",
+            "use_spatial_hash": True
+        },
+    }
+    if spec.falling_tiles:
+        layer_options[LAYER_NAME_FALLING_TILE] = {
+            "custom_class": FallingTile,
+            "custom_class_args": {
+            }
+        }
+    return layer_options
+
+
+class Room(Level):
+
+    def __init__(self, name, snapshot=None, staged=False):
+        """
+        Params:
+        :staged: only get ready to build, and leave the building to build_step() calls (see Level.build()).
+        """
+        super().__init__()
+
+        self.spec = ROOM_MANIFEST[name]
+        self.name = name
+        self.is_falling_tile_map = self.spec.falling_tiles
+
+        self._stages = self.build(snapshot)
+        if staged:
+            self.rows_per_stage = PREFETCH_ROWS_PER_STAGE
+        else:
+            self.finish_building()
+
+    def build(self, snapshot=None):
+        spec = self.spec
+        # Make the scene using the inherited method
+        if spec.streamed:
+            self.scene = self.make_streamed_scene(spec.map_name, spec.operator)
+        else:
+            yield from self.make_scene_stages(spec.map_name, room_layer_options(spec))
+        yield
+
+        if spec.falling_tiles:
+            for tile in self.scene.falling_tiles:
+                tile.setup(self.scene)
+        # The door back to the hub
+        home_door = Door("home")
+        home_door.setCoordinates(*spec.exit)
+        home_door.setTargetPlayerCoordinates(*spec.exit_spawn)
+        if spec.corridor_origin is not None:
+            # The corridor keeps the door in the landing it closes off behind the player
+            self.corridor = CorridorStream(self.scene, *spec.corridor_origin, spec.operator, exit_door=home_door)
+        yield
+
+        # Must be done AFTER scene is fully initialized
+        self.setup_problems(snapshot)
+
+        # Math Problem Logic
+        self.score = 0 if snapshot is None else snapshot.score
+        self.max_score = len(self.problem_list)
+
+        self.scene.doors.append(home_door)
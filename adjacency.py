@@ -0,0 +1,51 @@
+"""
+A grid index of which sprites are in which tile, so finding a sprite's neighbours is a dictionary lookup
+instead of a collision check against a whole sprite list.
+
+NumberBlock keeps its scene's index up to date from move_to(), and dropped blocks use it to find the
+blocks they should snap onto (see NumberBlockGroup.snap()).
+"""
+from constant import *
+
+
+class AdjacencyIndex:
+
+    def __init__(self, cell_size=TILE_SIZE * TILE_SCALING):
+        self.cell_size = cell_size
+        # {(column, row): [sprites whose center is in that tile]}. Usually one, but a carried block can pass over others.
+        self._cells = {}
+        # {sprite: (column, row)}
+        self._sprite_cells = {}
+
+    def cell_of(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def cell_center(self, cell):
+        column, row = cell
+        return (column + 0.5) * self.cell_size, (row + 0.5) * self.cell_size
+
+    def move(self, sprite):
+        """Add a sprite, or update its tile after it moved."""
+        cell = self.cell_of(sprite.center_x, sprite.center_y)
+        old_cell = self._sprite_cells.get(sprite)
+        if cell == old_cell:
+            return
+        if old_cell is not None:
+            self._remove_from_cell(sprite, old_cell)
+        self._cells.setdefault(cell, []).append(sprite)
+        self._sprite_cells[sprite] = cell
+
+    def remove(self, sprite):
+        cell = self._sprite_cells.pop(sprite, None)
+        if cell is not None:
+            self._remove_from_cell(sprite, cell)
+
+    def at(self, cell):
+        """The sprites in a tile."""
+        return self._cells.get(cell, ())
+
+    def _remove_from_cell(self, sprite, cell):
+        sprites = self._cells[cell]
+        sprites.remove(sprite)
+        if len(sprites) == 0:
+            del self._cells[cell]
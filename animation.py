@@ -0,0 +1,77 @@
+"""
+Time-based sprite animation. Only sprites that are currently playing a clip get ticked, so the per-frame
+cost depends on how many things are animating rather than how many sprites are in the scene.
+"""
+from constant import *
+
+
+class AnimationClip:
+    """
+    A sequence of textures shown one after the other, each for frame_duration seconds.
+    """
+
+    def __init__(self, textures, frame_duration=ANIMATION_FRAME_DURATION, loop=True):
+        assert (len(textures) > 0)
+        self.textures = textures
+        self.frame_duration = frame_duration
+        self.loop = loop
+
+    def get_duration(self):
+        return len(self.textures) * self.frame_duration
+
+
+class _PlayingClip:
+    def __init__(self, clip: AnimationClip):
+        self.clip = clip
+        self.elapsed = 0
+        self.frame = 0
+
+
+class Animator:
+    """
+    Keeps track of which sprites are playing which AnimationClip. Call update() once per frame with delta_time.
+    """
+
+    def __init__(self):
+        self._playing = {}
+
+    def play(self, sprite: arcade.Sprite, clip: AnimationClip, restart=False):
+        """
+        Start playing a clip on a sprite. If the sprite is already playing this clip it just keeps going,
+        unless restart is True.
+        """
+        playing = self._playing.get(sprite)
+        if playing is not None and playing.clip is clip and not restart:
+            return
+        self._playing[sprite] = _PlayingClip(clip)
+        sprite.texture = clip.textures[0]
+
+    def stop(self, sprite: arcade.Sprite):
+        """Stop animating a sprite. Its texture is left on whatever frame it was showing."""
+        self._playing.pop(sprite, None)
+
+    def is_playing(self, sprite: arcade.Sprite) -> bool:
+        return sprite in self._playing
+
+    def update(self, delta_time):
+        finished = []
+        for sprite, playing in self._playing.items():
+            clip = playing.clip
+            playing.elapsed += delta_time
+            frame = int(playing.elapsed / clip.frame_duration)
+            if frame >= len(clip.textures):
+                if clip.loop:
+                    playing.elapsed %= clip.get_duration()
+                    frame = int(playing.elapsed / clip.frame_duration) % len(clip.textures)
+                else:
+                    frame = len(clip.textures) - 1
+                    finished.append(sprite)
+            if frame != playing.frame:
+                playing.frame = frame
+                sprite.texture = clip.textures[frame]
+
+        for sprite in finished:
+            del self._playing[sprite]
+
+    def __len__(self):
+        return len(self._playing)
@@ -0,0 +1,228 @@
+"""
+Packs every image the game references into a single sprite atlas, and slices textures back out of it at runtime.
+
+The build step is run offline, whenever an image is added or hand-edited:
+
+    python atlas.py
+
+It writes ATLAS_IMAGE_PATH and an index at ATLAS_INDEX_PATH. The index uses the same TextureAtlas/SubTexture
+XML format as the Kenney sheets (assets/kenney_sokobanpack/Spritesheet/sokoban_spritesheet.xml), so the same
+parser reads both. If the atlas hasn't been built, load_texture() falls back to loading the individual files.
+
+The same build first writes scale-matched variants of every image that isn't drawn at the size of its file
+(e.g. 7@1.3x.png next to 7.png for the digits drawn at NUMBER_SCALING). Each one is resized once with a
+good filter and then drawn pixel for pixel, instead of the GPU stretching the original every frame.
+load_scaled_texture() picks the variant at runtime when it has been built.
+"""
+import os
+import xml.etree.ElementTree as ElementTree
+
+from constant import *
+import hit_box_cache
+
+# Texture regions inside the atlas image, keyed by the original file path. Loaded lazily by load_texture().
+_atlas_index = None
+# {(path, scale): path of its scale-matched variant, or None if there isn't one}. Filled in by load_scaled_texture().
+_variant_paths = {}
+
+
+def referenced_images():
+    """
+    Every image path the game loads through load_texture(). Add new paths here so the next build packs them.
+    """
+    # Imported here because numbers_and_math itself loads its textures through this module
+    from numbers_and_math import BlockType, BlockGroupPosition
+
+    paths = []
+
+    # Crates, in every type/group position combination NumberBlock.configure_texture() can ask for
+    for block_type in BlockType:
+        for group_position in BlockGroupPosition:
+            paths.append(f"{CRATE_BASE_PATH}{block_type.value}{group_position.value}{IMG_PATH_EXT}")
+    paths.append(TARGET_BOX)
+    paths.append(TRANSPARENT_BOX_PATH)
+
+    # Numbers and operator symbols
+    for digit in range(10):
+        paths.append(f"{NUM_BASE_PATH}{digit}{IMG_PATH_EXT}")
+    for symbol in ["add", "subtract", "multiply", "divide2", "equals"]:
+        paths.append(f"{NUM_BASE_PATH}{symbol}{IMG_PATH_EXT}")
+
+    # Player frames, door, falling tile and pages
+    paths.extend(PLAYER_TEXTURE_PATHS)
+    for walk_frames in PLAYER_WALK_TEXTURE_PATHS:
+        paths.extend(walk_frames)
+    paths.append(DOOR_TEXTURE)
+    paths.append(FALLING_TILE_PATH)
+    paths.append(CORRIDOR_WALL_PATH)
+    paths.extend(PAGE_TEXTURE_PATHS)
+
+    # Scale-matched variants, if build_scaled_variants() has made them
+    for path, scale in scaled_images():
+        if os.path.exists(variant_path(path, scale)):
+            paths.append(variant_path(path, scale))
+
+    # Keep the order stable but drop duplicates (e.g. TRANSPARENT_BOX_PATH is also a page)
+    return list(dict.fromkeys(paths))
+
+
+def scaled_images():
+    """
+    (path, scale) for every image that's always drawn at the same scale through load_scaled_texture().
+    Images drawn at scale 1 are in here too, but they don't get a variant.
+    """
+    from numbers_and_math import BlockType, BlockGroupPosition
+
+    images = []
+    for block_type in BlockType:
+        for group_position in BlockGroupPosition:
+            images.append((f"{CRATE_BASE_PATH}{block_type.value}{group_position.value}{IMG_PATH_EXT}",
+                           NUMBER_BLOCK_SCALING))
+    images.append((TARGET_BOX, NUMBER_BLOCK_SCALING))
+    images.append((TRANSPARENT_BOX_PATH, NUMBER_BLOCK_SCALING * 1.1))
+    for symbol in [str(digit) for digit in range(10)] + ["add", "subtract", "multiply", "divide2", "equals"]:
+        images.append((f"{NUM_BASE_PATH}{symbol}{IMG_PATH_EXT}", NUMBER_SCALING))
+    images.append((DOOR_TEXTURE, TILE_SCALING))
+    return images
+
+
+def variant_path(path, scale):
+    """Where the variant of path for the given scale is stored, e.g. "Crates/crate_01@0.5x.png"."""
+    root, ext = os.path.splitext(path)
+    return f"{root}@{scale:g}x{ext}"
+
+
+def read_atlas_index(index_path):
+    """
+    Parse a TextureAtlas XML file into {name: (x, y, width, height)}.
+    """
+    root = ElementTree.parse(index_path).getroot()
+    regions = {}
+    for sub_texture in root.iter("SubTexture"):
+        regions[sub_texture.get("name")] = (
+            int(sub_texture.get("x")),
+            int(sub_texture.get("y")),
+            int(sub_texture.get("width")),
+            int(sub_texture.get("height"))
+        )
+    return regions
+
+
+def write_atlas_index(index_path, image_name, regions):
+    root = ElementTree.Element("TextureAtlas", imagePath=image_name)
+    for name, (x, y, width, height) in regions.items():
+        ElementTree.SubElement(root, "SubTexture", name=name,
+                               x=str(x), y=str(y), width=str(width), height=str(height))
+    ElementTree.ElementTree(root).write(index_path, encoding="utf-8", xml_declaration=True)
+
+
+def pack_regions(sizes, max_width=ATLAS_MAX_WIDTH, padding=ATLAS_PADDING):
+    """
+    Simple shelf packer. Takes {name: (width, height)} and returns ({name: (x, y, width, height)}, atlas_size).
+    Tallest images are placed first, left to right, starting a new shelf when a row is full.
+    """
+    regions = {}
+    x = 0
+    y = 0
+    shelf_height = 0
+    atlas_width = 0
+    for name, (width, height) in sorted(sizes.items(), key=lambda item: (-item[1][1], item[0])):
+        if x > 0 and x + width > max_width:
+            # Start a new shelf
+            y += shelf_height + padding
+            x = 0
+            shelf_height = 0
+        regions[name] = (x, y, width, height)
+        x += width + padding
+        shelf_height = max(shelf_height, height)
+        atlas_width = max(atlas_width, x - padding)
+    return regions, (atlas_width, y + shelf_height)
+
+
+def build_scaled_variants(images=None):
+    """
+    Offline build step. Writes a pre-resized copy of every image in images (scaled_images() by default)
+    that isn't drawn at scale 1.
+    """
+    import PIL.Image
+
+    count = 0
+    for path, scale in scaled_images() if images is None else images:
+        if scale == 1:
+            continue
+        if not os.path.exists(path):
+            print(f"Skipping missing image {path}")
+            continue
+        image = PIL.Image.open(path).convert("RGBA")
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image.resize(size, PIL.Image.LANCZOS).save(variant_path(path, scale))
+        count += 1
+    print(f"Wrote {count} scale-matched variants")
+
+
+def build_atlas(image_path=ATLAS_IMAGE_PATH, index_path=ATLAS_INDEX_PATH):
+    """
+    Offline build step. Packs every referenced image into image_path and writes its index to index_path.
+    """
+    import PIL.Image
+
+    images = {}
+    for path in referenced_images():
+        if not os.path.exists(path):
+            print(f"Skipping missing image {path}")
+            continue
+        images[path] = PIL.Image.open(path).convert("RGBA")
+
+    regions, atlas_size = pack_regions({path: image.size for path, image in images.items()})
+    atlas_image = PIL.Image.new("RGBA", atlas_size, (0, 0, 0, 0))
+    for path, (x, y, width, height) in regions.items():
+        atlas_image.paste(images[path], (x, y))
+
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    atlas_image.save(image_path)
+    write_atlas_index(index_path, os.path.basename(image_path), regions)
+    print(f"Packed {len(regions)} images into {image_path} ({atlas_size[0]}x{atlas_size[1]})")
+
+
+def load_texture(path, hit_box_algorithm="Simple"):
+    """
+    Drop-in replacement for arcade.load_texture(path). Slices the texture out of the packed atlas when it's
+    in there, so the atlas image is only opened once; otherwise loads the file on its own.
+    The hit box comes from hit_box_cache, so each distinct texture's pixels are only scanned once.
+    """
+    global _atlas_index
+    if _atlas_index is None:
+        _atlas_index = read_atlas_index(ATLAS_INDEX_PATH) if os.path.exists(ATLAS_INDEX_PATH) else {}
+
+    region = _atlas_index.get(path)
+    if region is None:
+        texture = arcade.load_texture(path, hit_box_algorithm=hit_box_algorithm)
+        return hit_box_cache.cache.apply(texture, path, hit_box_algorithm)
+    x, y, width, height = region
+    texture = arcade.load_texture(ATLAS_IMAGE_PATH, x=x, y=y, width=width, height=height,
+                                  hit_box_algorithm=hit_box_algorithm)
+    return hit_box_cache.cache.apply(texture, ATLAS_IMAGE_PATH, hit_box_algorithm)
+
+
+def load_scaled_texture(path, scale, hit_box_algorithm="Simple"):
+    """
+    Like load_texture(), for a sprite that's drawn at scale. Returns (texture, scale to draw it at): the
+    pre-resized variant at scale 1 if build_scaled_variants() has made one, otherwise the original at scale.
+    """
+    if scale == 1:
+        return load_texture(path, hit_box_algorithm), scale
+    key = (path, scale)
+    if key not in _variant_paths:
+        variant = variant_path(path, scale)
+        load_texture(path, hit_box_algorithm)  # Makes sure the atlas index is loaded
+        _variant_paths[key] = variant if variant in _atlas_index or os.path.exists(variant) else None
+
+    variant = _variant_paths[key]
+    if variant is None:
+        return load_texture(path, hit_box_algorithm), scale
+    return load_texture(variant, hit_box_algorithm), 1
+
+
+if __name__ == "__main__":
+    build_scaled_variants()
+    build_atlas()
@@ -0,0 +1,133 @@
+"""
+Benchmark for carrying a NumberBlock around.
+
+Compares the old approach with the current one:
+
+- old: grabbing moves the block out of its sprite lists into the player layer, and releasing moves it back.
+  While it's carried, arcade's own PhysicsEngineSimple moves the player, since the block isn't in Numbers.
+- current: the block stays in Numbers the whole time, so grab and release don't touch the sprite lists, but
+  while it's carried PlayerPhysicsEngine has to move the player itself and skip the block in a Python-side
+  collision loop.
+
+Both grab/drop paths go through the same auto_move() (with its snap()) and interaction invalidation, so the
+difference between them is the sprite list moves. Scoring after a drop is left out, since it's the same either way.
+
+Run from the repo root:
+
+    python -m benchmarks.grab_release
+"""
+import timeit
+
+import arcade
+
+from constant import *
+from game_scene import GameScene
+from numbers_and_math import NumberBlock
+from physics import PlayerPhysicsEngine
+from player import Player
+
+BLOCK_COUNT = 500
+CYCLES = 2000
+# Simulation steps of carrying per grab, i.e. holding a block for STEPS / SIMULATION_RATE seconds
+STEPS = 600
+
+
+class BenchWindow:
+    """The parts of MyGame that grabbing and dropping a block use."""
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    def set_drawing_caption(self, displaying):
+        pass
+
+    def update_score(self):
+        pass
+
+
+def make_scene():
+    scene = GameScene()
+    # Blocks on every other tile in rows across the map, so dropping one never snaps it onto another
+    index = scene.block_index
+    blocks = []
+    for number in range(BLOCK_COUNT):
+        block = NumberBlock(scene, number % 10)
+        block.move_to(*index.cell_center((number % 50 * 2, number // 50 * 4)))
+        blocks.append(block)
+    player = Player(BenchWindow(scene))
+    # Walking back and forth between the first two rows of blocks
+    player.center_x, player.center_y = index.cell_center((0, 2))
+    scene.players.append(player)
+    return scene, blocks, player
+
+
+def grab_release_moving_lists(scene, blocks, player):
+    """What Player.grab_block()/release_block() used to do."""
+    for cycle in range(CYCLES):
+        block = blocks[cycle % len(blocks)]
+        player.block = player.carrying = block
+        block.remove_from_sprite_lists()
+        scene.players.append(block)
+        player.window.set_drawing_caption(False)
+        player.interaction.invalidate()
+
+        block.auto_move()
+        block.remove_from_sprite_lists()
+        scene.numbers.append(block)
+        player.block = player.carrying = None
+        player.window.update_score()
+        player.interaction.invalidate()
+
+
+def grab_release_in_place(blocks, player):
+    """What Player.grab_block()/release_block() do now."""
+    for cycle in range(CYCLES):
+        player.grab_block(blocks[cycle % len(blocks)])
+        player.release_block()
+
+
+def walk(engine, player, carried):
+    """STEPS physics steps while carrying, walking right and then back left."""
+    for step in range(STEPS):
+        player.change_x = PLAYER_MOVEMENT_SPEED if step < STEPS // 2 else -PLAYER_MOVEMENT_SPEED
+        player.change_y = 0
+        engine.update()
+        carried.move_to(player.center_x, player.center_y + 64)
+
+
+def carry_old(scene, blocks, player):
+    """The carried block is in the player layer, so arcade's engine can move the player."""
+    block = blocks[0]
+    block.remove_from_sprite_lists()
+    scene.players.append(block)
+    walk(arcade.PhysicsEngineSimple(player, [scene.walls, scene.numbers]), player, block)
+    block.remove_from_sprite_lists()
+    scene.numbers.append(block)
+
+
+def carry_current(scene, blocks, player):
+    """The carried block stays in Numbers, and PlayerPhysicsEngine skips it."""
+    player.block = player.carrying = blocks[0]
+    walk(PlayerPhysicsEngine(player, [scene.walls, scene.numbers]), player, blocks[0])
+    player.block = player.carrying = None
+
+
+def main():
+    window = arcade.Window(200, 200, "grab/release benchmark")
+    scene, blocks, player = make_scene()
+    old = min(timeit.repeat(lambda: grab_release_moving_lists(scene, blocks, player), number=1, repeat=5))
+    current = min(timeit.repeat(lambda: grab_release_in_place(blocks, player), number=1, repeat=5))
+    print(f"{CYCLES} grab/drop cycles with {BLOCK_COUNT} blocks in the scene:")
+    print(f"  old, moving between sprite lists: {old * 1000:.2f} ms ({old / CYCLES * 1e6:.1f} us per cycle)")
+    print(f"  current, carried in place:        {current * 1000:.2f} ms ({current / CYCLES * 1e6:.1f} us per cycle)")
+
+    old = min(timeit.repeat(lambda: carry_old(scene, blocks, player), number=1, repeat=5))
+    current = min(timeit.repeat(lambda: carry_current(scene, blocks, player), number=1, repeat=5))
+    print(f"{STEPS} physics steps while carrying a block, {BLOCK_COUNT} blocks in the scene:")
+    print(f"  old, PhysicsEngineSimple:         {old * 1000:.2f} ms ({old / STEPS * 1e6:.1f} us per step)")
+    print(f"  current, PlayerPhysicsEngine:     {current * 1000:.2f} ms ({current / STEPS * 1e6:.1f} us per step)")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Generates big synthetic .tmx maps for performance testing, using the same tileset and layer names as the
+real maps (background, walls, math_problems), so they load through the normal Level.make_scene() path.
+Point a room's map_name at the output to measure scene building, collisions and drawing at scale.
+
+Run from the repo root, e.g.:
+
+    python -m benchmarks.stress_map --width 500 --height 500 --wall-density 0.2 --problems 200
+"""
+import argparse
+import os
+import random
+
+from constant import *
+
+# Tile IDs from tilesets/roguelikeSheet_transparent_32px.tsx (firstgid 1), matching what the real maps use
+STRESS_TILESET = "roguelikeSheet_transparent_32px.tsx"
+GRASS_TILE = 63
+WALL_TILE = 1482
+PROBLEM_TILE = 1766
+
+MAX_STRESS_MAP_SIZE = 500
+# Room each math problem needs, in tiles: the problem row plus the movable blocks above it.
+# VisualMathProblem.draw() gives every digit or symbol a tile, with a tile between lhs, operator, rhs, "=" and
+# the answer. The widest problem has the biggest operands and the biggest answer they can make (a product).
+# The movable blocks above it fit in 12 tiles, so the problem row is the wider one.
+PROBLEM_ROW_PARTS = [
+    len(str(PROBLEM_MAX_OPERAND)),
+    1,
+    len(str(PROBLEM_MAX_OPERAND)),
+    1,
+    len(str(PROBLEM_MAX_OPERAND * PROBLEM_MAX_OPERAND)),
+]
+PROBLEM_WIDTH = sum(PROBLEM_ROW_PARTS) + len(PROBLEM_ROW_PARTS) - 1
+PROBLEM_HEIGHT = 4
+
+
+def generate_tiles(width, height, wall_density, problem_count, seed=None):
+    """
+    Returns (walls, problems) as lists of rows of tile IDs (0 = empty), top row first like Tiled stores them.
+    The map is walled in, random walls are scattered at wall_density, and each problem gets a clear area.
+    """
+    assert (0 < width <= MAX_STRESS_MAP_SIZE and 0 < height <= MAX_STRESS_MAP_SIZE)
+    assert (0 <= wall_density <= 1)
+    rng = random.Random(seed)
+
+    walls = [[0] * width for _ in range(height)]
+    for row in range(height):
+        for column in range(width):
+            border = row in (0, height - 1) or column in (0, width - 1)
+            if border or rng.random() < wall_density:
+                walls[row][column] = WALL_TILE
+
+    # Lay the problems out on a grid of slots so they never overlap, in a random order
+    problems = [[0] * width for _ in range(height)]
+    slots = [(row, column)
+             for row in range(1 + PROBLEM_HEIGHT - 1, height - 1, PROBLEM_HEIGHT + 1)
+             for column in range(1, width - PROBLEM_WIDTH, PROBLEM_WIDTH + 1)]
+    rng.shuffle(slots)
+    if problem_count > len(slots):
+        print(f"Only room for {len(slots)} problems on a {width}x{height} map")
+    for row, column in slots[:problem_count]:
+        problems[row][column] = PROBLEM_TILE
+        # Clear the walls out of the problem's area (it grows upwards from the marker)
+        for clear_row in range(row - PROBLEM_HEIGHT + 1, row + 1):
+            for clear_column in range(column, column + PROBLEM_WIDTH):
+                walls[clear_row][clear_column] = 0
+
+    return walls, problems
+
+
+def _layer_xml(layer_id, name, rows):
+    width = len(rows[0])
+    csv = ",\n".join(",".join(str(tile) for tile in row) for row in rows)
+    return (f' <layer id="{layer_id}" name="{name}" width="{width}" height="{len(rows)}">\n'
+            f'  <data encoding="csv">\n{csv}\n</data>\n'
+            f' </layer>\n')
+
+
+def write_stress_map(path, width, height, wall_density, problem_count, seed=None):
+    walls, problems = generate_tiles(width, height, wall_density, problem_count, seed)
+    background = [[GRASS_TILE] * width for _ in range(height)]
+
+    # Tileset paths in a .tmx are relative to the map file
+    tileset_path = os.path.relpath(os.path.join("maps", "tilesets", STRESS_TILESET), os.path.dirname(path) or ".")
+    with open(path, "w") as tmx:
+        tmx.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        tmx.write(f'<map version="1.8" tiledversion="1.8.0" orientation="orthogonal" renderorder="right-down" '
+                  f'width="{width}" height="{height}" tilewidth="{TILE_SIZE}" tileheight="{TILE_SIZE}" '
+                  f'infinite="0" nextlayerid="4" nextobjectid="1">\n')
+        tmx.write(f' <tileset firstgid="1" source="{tileset_path.replace(os.sep, "/")}"/>\n')
+        tmx.write(_layer_xml(1, LAYER_NAME_BACKGROUND, background))
+        tmx.write(_layer_xml(2, LAYER_NAME_WALLS, walls))
+        tmx.write(_layer_xml(3, LAYER_NAME_MATH_PROBLEM_ORIGIN, problems))
+        tmx.write('</map>\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic .tmx map for stress testing.")
+    parser.add_argument("--width", type=int, default=100)
+    parser.add_argument("--height", type=int, default=100)
+    parser.add_argument("--wall-density", type=float, default=0.1)
+    parser.add_argument("--problems", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None, help="defaults to maps/stress-WIDTHxHEIGHT.tmx")
+    args = parser.parse_args()
+
+    output = args.output or f"maps/stress-{args.width}x{args.height}.tmx"
+    write_stress_map(output, args.width, args.height, args.wall_density, args.problems, args.seed)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Streaming map mode for worlds too big to load whole. arcade.load_tilemap() builds a sprite for every tile in
+the map up front, so memory and load time grow with the size of the world. A chunked map is instead split
+offline into CHUNK_SIZE x CHUNK_SIZE tile chunks, and ChunkStreamer only keeps the chunks around the player
+in the scene. Chunk files are read on a background thread, and the sprites are built (and taken down again)
+a few chunks per frame, so paging never stalls the game loop.
+
+Build a chunked map from a .tmx, e.g. one made by benchmarks/stress_map.py:
+
+    python chunked_map.py maps/stress-500x500.tmx
+
+That writes maps/stress-500x500.chunks/ with an index.json and one .bin file per chunk that has any tiles in
+it (the tile IDs of every layer, bottom row first). Then point a RoomSpec at the directory with streamed=True.
+
+Only the layers in CHUNK_STREAMED_LAYERS are paged. The math_problems layer is only a few markers, so the
+build stores their positions in the index and the Level creates them up front like a normal map would.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import xml.etree.ElementTree as ElementTree
+from array import array
+
+from constant import *
+from game_log import fields, get_logger
+
+log = get_logger("chunks")
+
+# Tiled keeps the flip flags in the top three bits of a tile ID. Streamed tiles are never flipped.
+GID_MASK = 0x1FFFFFFF
+CHUNK_INDEX_NAME = "index.json"
+
+
+def chunk_file_name(chunk):
+    return f"{chunk[0]}_{chunk[1]}.bin"
+
+
+def chunks_within(chunk, radius):
+    """Every chunk at most radius chunks away from chunk, diagonals included."""
+    column, row = chunk
+    return {(column + x, row + y) for x in range(-radius, radius + 1) for y in range(-radius, radius + 1)}
+
+
+def read_tileset(map_name, root):
+    """The map's tileset as the index stores it. Chunked maps support one spritesheet tileset, like all our maps use."""
+    tilesets = root.findall("tileset")
+    if len(tilesets) != 1:
+        raise ValueError(f"{map_name} has {len(tilesets)} tilesets, chunked maps support exactly one")
+    element = tilesets[0]
+    first_gid = int(element.get("firstgid"))
+    base_directory = os.path.dirname(map_name)
+    if element.get("source") is not None:
+        tileset_path = os.path.join(base_directory, element.get("source"))
+        element = ElementTree.parse(tileset_path).getroot()
+        base_directory = os.path.dirname(tileset_path)
+    image = element.find("image")
+    if image is None:
+        raise ValueError(f"{map_name}'s tileset is an image collection, chunked maps need a spritesheet")
+    return {
+        "first_gid": first_gid,
+        "image": os.path.normpath(os.path.join(base_directory, image.get("source"))).replace(os.sep, "/"),
+        "tile_width": int(element.get("tilewidth")),
+        "tile_height": int(element.get("tileheight")),
+        "spacing": int(element.get("spacing", 0)),
+        "margin": int(element.get("margin", 0)),
+        "columns": int(element.get("columns")),
+    }
+
+
+def read_layers(map_name, root):
+    """{layer name: rows of tile IDs, top row first like Tiled stores them}."""
+    layers = {}
+    for layer in root.iter("layer"):
+        data = layer.find("data")
+        if data.get("encoding") != "csv":
+            raise ValueError(f"Layer {layer.get('name')} in {map_name} isn't CSV encoded")
+        layers[layer.get("name")] = [[int(gid) for gid in line.rstrip(",").split(",")]
+                                     for line in data.text.strip().splitlines()]
+    return layers
+
+
+def build_chunks(map_name, chunk_directory=None, chunk_size=CHUNK_SIZE):
+    """
+    Offline build step. Splits map_name into chunk files in chunk_directory (next to the map by default).
+    Returns the directory.
+    """
+    if chunk_directory is None:
+        chunk_directory = os.path.splitext(map_name)[0] + ".chunks"
+    root = ElementTree.parse(map_name).getroot()
+    width = int(root.get("width"))
+    height = int(root.get("height"))
+    layers = read_layers(map_name, root)
+    tile_pixels = TILE_SIZE * TILE_SCALING
+
+    # Math problem markers are stored as positions, the rest of the layers are chunked
+    problem_origins = []
+    for row_index, row in enumerate(layers.pop(LAYER_NAME_MATH_PROBLEM_ORIGIN, [])):
+        for column, gid in enumerate(row):
+            if gid != 0:
+                problem_origins.append([(column + 0.5) * tile_pixels, (height - row_index - 0.5) * tile_pixels])
+
+    os.makedirs(chunk_directory, exist_ok=True)
+    chunks = []
+    for chunk_column in range((width + chunk_size - 1) // chunk_size):
+        for chunk_row in range((height + chunk_size - 1) // chunk_size):
+            gids = array("I")
+            for rows in layers.values():
+                for local_row in range(chunk_size):
+                    # Chunks count rows up from the bottom of the map, like arcade does
+                    row = height - 1 - (chunk_row * chunk_size + local_row)
+                    for local_column in range(chunk_size):
+                        column = chunk_column * chunk_size + local_column
+                        inside = 0 <= row and column < width
+                        gids.append(rows[row][column] if inside else 0)
+            if any(gids):
+                with open(os.path.join(chunk_directory, chunk_file_name((chunk_column, chunk_row))), "wb") as file:
+                    gids.tofile(file)
+                chunks.append([chunk_column, chunk_row])
+
+    index = {
+        "width": width,
+        "height": height,
+        "chunk_size": chunk_size,
+        "tileset": read_tileset(map_name, root),
+        "layers": list(layers),
+        "chunks": chunks,
+        "problem_origins": problem_origins,
+    }
+    with open(os.path.join(chunk_directory, CHUNK_INDEX_NAME), "w") as file:
+        json.dump(index, file)
+    return chunk_directory
+
+
+def read_chunk(chunk_directory, chunk, layer_count, chunk_size):
+    """A chunk's tile IDs, one array per layer. Runs on ChunkStreamer's loader thread."""
+    gids = array("I")
+    with open(os.path.join(chunk_directory, chunk_file_name(chunk)), "rb") as file:
+        gids.frombytes(file.read())
+    cells = chunk_size * chunk_size
+    return [gids[index * cells:(index + 1) * cells] for index in range(layer_count)]
+
+
+class ChunkedMap:
+    """A chunked map's index: its size, tileset, layers, and which chunks have any tiles."""
+
+    def __init__(self, chunk_directory):
+        self.directory = chunk_directory
+        with open(os.path.join(chunk_directory, CHUNK_INDEX_NAME)) as file:
+            index = json.load(file)
+        self.width = index["width"]
+        self.height = index["height"]
+        self.chunk_size = index["chunk_size"]
+        self.tileset = index["tileset"]
+        self.layers = index["layers"]
+        self.chunks = {tuple(chunk) for chunk in index["chunks"]}
+        self.problem_origins = [tuple(origin) for origin in index["problem_origins"]]
+        self.chunk_pixels = self.chunk_size * TILE_SIZE * TILE_SCALING
+        # {tile ID: texture}, so every copy of a tile shares one texture
+        self._textures = {}
+
+    def chunk_of(self, x, y):
+        return int(x // self.chunk_pixels), int(y // self.chunk_pixels)
+
+    def texture(self, gid):
+        texture = self._textures.get(gid)
+        if texture is None:
+            tileset = self.tileset
+            tile = gid - tileset["first_gid"]
+            column, row = tile % tileset["columns"], tile // tileset["columns"]
+            # Tiles are solid squares, so a plain box is the right hit box and there's no need to scan pixels
+            texture = arcade.load_texture(
+                tileset["image"],
+                x=tileset["margin"] + column * (tileset["tile_width"] + tileset["spacing"]),
+                y=tileset["margin"] + row * (tileset["tile_height"] + tileset["spacing"]),
+                width=tileset["tile_width"],
+                height=tileset["tile_height"],
+                hit_box_algorithm="None"
+            )
+            self._textures[gid] = texture
+        return texture
+
+
+class ChunkStreamer:
+
+    def __init__(self, scene, chunked_map: ChunkedMap, layers=CHUNK_STREAMED_LAYERS, radius=CHUNK_LOAD_RADIUS):
+        self.map = chunked_map
+        self.radius = radius
+        # The scene's sprite list for each layer in the chunk files, or None for layers that aren't streamed
+        self._sprite_lists = []
+        for name in chunked_map.layers:
+            if name not in layers:
+                self._sprite_lists.append(None)
+                continue
+            if name not in scene.name_mapping:
+                # Usually the background, which GameScene doesn't add. It goes under everything else.
+                scene.add_sprite_list(name)
+                scene.sprite_lists.insert(0, scene.sprite_lists.pop())
+            self._sprite_lists.append(scene.name_mapping[name])
+
+        # {chunk: [(sprite list, sprite), ...]} for every chunk that's in the scene
+        self._loaded = {}
+        # Chunks asked for but not read yet
+        self._pending = set()
+        # Chunks out of range, waiting for their turn to be taken down
+        self._unloading = []
+        # Sprites from unloaded chunks, reused for the next chunks instead of making new ones
+        self._free_sprites = []
+        self.center_chunk = None
+        # Goes up whenever chunks appear or disappear, so MyGame knows to redraw
+        self.generation = 0
+
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="chunk-loader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._requests.put(None)
+
+    def loaded_chunks(self):
+        return set(self._loaded)
+
+    def load_around(self, x, y):
+        """Load every chunk in range right now, e.g. when the player enters the room, so there are no gaps."""
+        self._recenter(self.map.chunk_of(x, y))
+        for chunk in self._wanted() - set(self._loaded):
+            self._build(chunk, read_chunk(self.map.directory, chunk, len(self.map.layers), self.map.chunk_size))
+
+    def update(self, x, y):
+        """Called every frame with the player's position. Asks for new chunks and builds or unloads a few."""
+        chunk = self.map.chunk_of(x, y)
+        if chunk != self.center_chunk:
+            self._recenter(chunk)
+
+        budget = CHUNK_BUILDS_PER_UPDATE
+        while budget > 0 and len(self._unloading) > 0:
+            chunk = self._unloading.pop()
+            # The player may have turned back before it came down
+            if chunk in self._loaded and chunk not in self._kept():
+                self._unload(chunk)
+                budget -= 1
+        while budget > 0:
+            try:
+                chunk, layers = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending.discard(chunk)
+            if layers is not None and chunk not in self._loaded and chunk in self._kept():
+                self._build(chunk, layers)
+                budget -= 1
+
+    def _wanted(self):
+        return self.map.chunks & chunks_within(self.center_chunk, self.radius)
+
+    def _kept(self):
+        # One chunk of slack, so walking back and forth over a chunk edge doesn't page the same chunk in and out
+        return chunks_within(self.center_chunk, self.radius + 1)
+
+    def _recenter(self, chunk):
+        self.center_chunk = chunk
+        for wanted in self._wanted() - set(self._loaded) - self._pending:
+            self._pending.add(wanted)
+            self._requests.put(wanted)
+        kept = self._kept()
+        self._unloading = [loaded for loaded in self._loaded if loaded not in kept]
+
+    def _build(self, chunk, layers):
+        tile_pixels = TILE_SIZE * TILE_SCALING
+        size = self.map.chunk_size
+        left = chunk[0] * size
+        bottom = chunk[1] * size
+        sprites = []
+        for sprite_list, gids in zip(self._sprite_lists, layers):
+            if sprite_list is None:
+                continue
+            for index, gid in enumerate(gids):
+                gid &= GID_MASK
+                if gid == 0:
+                    continue
+                sprite = self._free_sprites.pop() if len(self._free_sprites) > 0 else arcade.Sprite()
+                sprite.texture = self.map.texture(gid)
+                sprite.scale = TILE_SCALING
+                sprite.center_x = (left + index % size + 0.5) * tile_pixels
+                sprite.center_y = (bottom + index // size + 0.5) * tile_pixels
+                sprite_list.append(sprite)
+                sprites.append((sprite_list, sprite))
+        self._loaded[chunk] = sprites
+        self.generation += 1
+
+    def _unload(self, chunk):
+        for sprite_list, sprite in self._loaded.pop(chunk):
+            sprite_list.remove(sprite)
+            self._free_sprites.append(sprite)
+        self.generation += 1
+
+    def _run(self):
+        layer_count = len(self.map.layers)
+        while True:
+            chunk = self._requests.get()
+            if chunk is None:
+                return
+            try:
+                layers = read_chunk(self.map.directory, chunk, layer_count, self.map.chunk_size)
+            except OSError as e:
+                log.warning("Couldn't read chunk", extra=fields(chunk=chunk, error=e))
+                layers = None
+            self._results.put((chunk, layers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a .tmx map into chunks for the streaming map mode.")
+    parser.add_argument("map", help="the .tmx map to split")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="tiles per side of a chunk")
+    parser.add_argument("--output", default=None, help="defaults to the map's path with .chunks instead of .tmx")
+    args = parser.parse_args()
+
+    directory = build_chunks(args.map, args.output, args.chunk_size)
+    print(f"Wrote {len(ChunkedMap(directory).chunks)} chunks to {directory}")
+
+
+if __name__ == "__main__":
+    main()
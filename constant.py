@@ -10,11 +10,15 @@ SCREEN_TITLE = "RUNTIME TERROR"
 MAP = ""
 MAP_SIZE = 1550
 
-# Movement speed of player, in pixels per frame
+# Simulation speed (see fixed_timestep.py). Everything "per step" below happens this many times a second.
+SIMULATION_RATE = 60
+MAX_SIMULATION_STEPS = 8  # Most steps to catch up on in one frame; anything past this is dropped
+
+# Movement speed of player, in pixels per simulation step
 PLAYER_MOVEMENT_SPEED = 5
 PLAYER_RUN_MULTIPLIER = 1.5
 
-CAMERA_SPEED = 0.1
+CAMERA_SPEED = 0.1  # Fraction of the distance to its goal the camera moves each simulation step
 VIEWPORT_MARGIN = 300
 
 # Constants used to scale our sprites from their original size
@@ -55,6 +59,21 @@ PLAYER_TEXTURES = []
 PAGE_TEXTURE = []
 IMG_PATH_EXT = ".png"
 
+PLAYER_TEXTURE_PATHS = [
+    "assets/kenney_sokobanpack/PNG/Default size/Player/player_02.png",
+    "assets/kenney_sokobanpack/PNG/Default size/Player/player_05.png",
+    "assets/kenney_sokobanpack/PNG/Default size/Player/player_08.png",
+    "assets/kenney_sokobanpack/PNG/Default size/Player/player_11.png",
+    "assets/kenney_sokobanpack/PNG/Default size/Player/player_17.png",
+    "assets/kenney_sokobanpack/PNG/Default size/Player/player_20.png",
+]
+# Walk animation frames, indexed by PlayerOrientation value (up, down, left, right)
+PLAYER_WALK_TEXTURE_PATHS = [
+    [f"assets/kenney_sokobanpack/PNG/Default size/Player/player_{frame:02}.png" for frame in frames]
+    for frames in [(8, 9, 10), (5, 6, 7), (20, 21, 22), (17, 18, 19)]
+]
+PAGE_TEXTURE_PATHS = ["assets/start.png", "assets/end.png", "assets/transparent.png"]
+
 CRATE_BASE_PATH = "assets/kenney_sokobanpack/PNG/Default size/Crates/"
 CRATE_BLUE_PATH = "assets/kenney_sokobanpack/PNG/Default size/Crates/crate_09.png"
 CRATE_BROWN_PATH = "assets/kenney_sokobanpack/PNG/Default size/Crates/crate_07.png"
@@ -64,6 +83,10 @@ TILE_SIZE = 32
 
 NUM_BASE_PATH = "assets/kenney_sokobanpack/PNG/Default size/Numbers/"
 
+# Range the operands of a generated math problem are rolled from (see numbers_and_math.py)
+PROBLEM_MIN_OPERAND = 1
+PROBLEM_MAX_OPERAND = 10
+
 # ******* DANGER ZONE *******
 # Brother Helfrich says to never do this stuff but I'm doing it anyway, sorry james
 GLOBAL_SCENE = None
@@ -71,9 +94,110 @@ GLOBAL_SCENE = None
 # Falling tile
 FALLING_TILE_PATH = "assets/kenney_sokobanpack/PNG/Default size/Ground/ground_03.png"
 FALLING_TILE_BASE_PATH = "assets/kenney_sokobanpack/PNG/Default size/Ground/"
+FALLING_TILE_SPEED = 2  # Pixels per simulation step
+CORRIDOR_WALL_PATH = "assets/kenney_sokobanpack/PNG/Default size/Blocks/block_05.png"
 
 DOOR_TEXTURE = "assets/roguelike-pack/IndividualTextures/Door.png"
 
+# Sprite atlas (built offline by running atlas.py)
+ATLAS_IMAGE_PATH = "assets/atlas/sprites.png"
+ATLAS_INDEX_PATH = "assets/atlas/sprites.xml"
+ATLAS_MAX_WIDTH = 2048
+ATLAS_PADDING = 2
+
+# Hit-box polygons, computed once per texture (see hit_box_cache.py)
+HIT_BOX_CACHE_PATH = "hitboxes.json"
+HIT_BOX_CACHE_PERSIST = True  # Keep the polygons on disk between runs
+# Hit boxes for tiles loaded from a map, unless a layer's options say otherwise. Tiles are solid squares, so
+# a plain box is right, and arcade doesn't have to scan the pixels of every tile image in the tileset.
+TILE_HIT_BOX_ALGORITHM = "None"
+
+# Save file for resuming the game (see save_state.py)
+SAVE_FILE_PATH = "savegame.dat"
+SNAPSHOT_INTERVAL = 10  # Seconds between background snapshots
+
+# Most rooms kept loaded at once; the least recently visited are evicted to a snapshot (see room_cache.py)
+MAX_LOADED_ROOMS = 2
+
+# Rooms are built ahead of time once the player is this many pixels from their door (see prefetch.py)
+PREFETCH_ENABLED = True
+PREFETCH_RADIUS = 192
+PREFETCH_ROWS_PER_STAGE = 16  # Tile rows of a map layer built per stage (simulation step) of a room's build
+
+# Map hot-reloading for map authors (see hot_reload.py)
+HOT_RELOAD_MAPS = False
+HOT_RELOAD_POLL_INTERVAL = 0.5  # Seconds between checks for changed .tmx files
+
+# On-demand rendering and idle throttling (see frame_throttle.py)
+RENDER_ON_DEMAND = True
+UPDATE_RATE = 1 / 60  # Seconds per update while playing
+IDLE_UPDATE_RATE = 1 / 10  # Seconds per update while idle or unfocused
+IDLE_TIMEOUT = 5  # Seconds without changes before the game counts as idle
+FRAME_BUFFER_COUNT = 2  # Frames to keep drawing after a change so every buffer is up to date
+
+# Dynamic resolution scaling (see render_scale.py)
+DYNAMIC_RESOLUTION = True
+RENDER_TIME_BUDGET = 0.010  # Seconds of GPU time per frame for drawing the world
+RENDER_TIME_SMOOTHING = 0.1  # How quickly the averaged draw time follows each new frame
+RENDER_SCALE_MIN = 0.5  # Lowest fraction of the window's resolution the world is drawn at
+RENDER_SCALE_MAX = 1.0
+RENDER_SCALE_STEP = 0.1
+RENDER_SCALE_HEADROOM = 0.8  # Only scale back up if the predicted draw time is this far under budget
+RENDER_SCALE_COOLDOWN = 30  # Frames drawn after a change before the scale can change again
+RENDER_TIME_QUERIES = 3  # Timer queries used in turn, so each result is read a couple of frames after it ends
+
+# Answer attempt telemetry (see telemetry.py)
+TELEMETRY_DB_PATH = "telemetry.sqlite3"
+TELEMETRY_BUFFER_SIZE = 1000  # Most attempts kept in memory while waiting to be written
+TELEMETRY_BATCH_SIZE = 50  # Attempts written per INSERT batch
+TELEMETRY_FLUSH_INTERVAL = 5  # Seconds between writes when the buffer isn't filling up
+
+# Interaction checks (see interaction.py)
+INTERACTION_CELL_SIZE = 8  # The player looks for nearby blocks each time they move this many pixels
+
+# Sprite animation (see animation.py)
+ANIMATION_FRAME_DURATION = 0.15  # Seconds each frame of an animation is shown by default
+
+# Endless falling-tile corridors (see FallingTileStuff/corridor.py)
+CORRIDOR_WIDTH = 5  # Tiles across, which is also how many answers each problem offers
+CORRIDOR_CHUNK_LENGTH = 8  # Rows per chunk: floor, then a row of answers, then the gate
+CORRIDOR_RING_SIZE = 4  # Chunks kept built at once; the one furthest behind is reused for the next one ahead
+CORRIDOR_FALL_DISTANCE = 128  # Pixels a tile falls before it's gone
+
+# Guidance arrow toward the nearest door or unsolved problem (see guidance.py)
+GUIDANCE_ENABLED = True
+GUIDANCE_ARROW_LENGTH = 48
+GUIDANCE_ARROW_COLOR = arcade.color.YELLOW
+
+# Logging (see game_log.py)
+LOG_DEFAULT_LEVEL = "INFO"
+# Per-subsystem overrides, e.g. set "falling_tile" to "DEBUG" to see every tile's position
+LOG_LEVELS = {
+    "falling_tile": "WARNING",
+    "math": "WARNING",
+    "score": "INFO",
+    "rooms": "INFO",
+}
+LOG_HOT_PATHS = False  # Per-frame log calls are skipped entirely unless this is on (and gone under python -O)
+LOG_SAMPLE_INTERVAL = 1.0  # Seconds between repeats of the same message; the ones in between are counted
+LOG_QUEUE_SIZE = 10000  # Records buffered for the writer thread before new ones are dropped
+
+# Memory profiling across room transitions (see memory_profile.py)
+MEMORY_PROFILING = False
+MEMORY_PROFILE_FRAMES = 10  # Stack frames tracemalloc keeps per allocation
+MEMORY_PROFILE_TOP = 10  # Modules listed in each transition's report
+
+# Garbage collection policy (see gc_policy.py)
+GC_POLICY_ENABLED = True
+GC_PLAY_THRESHOLDS = (10000, 20, 100)  # gc.set_threshold() while playing, well above Python's defaults
+GC_SLOW_PAUSE = 0.004  # Collections during play longer than this many seconds are logged as hitches
+
+# Streaming map mode for very large worlds (see chunked_map.py)
+CHUNK_SIZE = 32  # Tiles per side of a chunk
+CHUNK_LOAD_RADIUS = 1  # Chunks kept loaded on each side of the player's chunk
+CHUNK_BUILDS_PER_UPDATE = 2  # Chunks built or taken down per frame, so paging never stalls a frame
+CHUNK_STREAMED_LAYERS = [LAYER_NAME_BACKGROUND, LAYER_NAME_WALLS]
+
 def pick_nearest_collision(subject: arcade.Sprite, collision_list):
     target = None
     if len(collision_list) > 1:
@@ -1,4 +1,5 @@
 from constant import *
+from atlas import load_scaled_texture
 
 class Door(arcade.Sprite):
 
@@ -10,8 +11,7 @@ class Door(arcade.Sprite):
 
         self.target_room_string = target_room_string
 
-        self.texture = arcade.load_texture(DOOR_TEXTURE)
-        self.scale = TILE_SCALING
+        self.texture, self.scale = load_scaled_texture(DOOR_TEXTURE, TILE_SCALING)
 
 
     # These should probably be required parameters in the initializer.
@@ -0,0 +1,38 @@
+"""
+Fixed-timestep simulation. Game logic (physics, falling tiles, the camera) always advances in steps of
+1 / SIMULATION_RATE seconds, no matter how fast or slow the machine draws frames, so the game plays at
+the same speed everywhere. Drawing interpolates between the last two steps using FixedTimestep.alpha.
+"""
+from constant import *
+
+
+class FixedTimestep:
+
+    def __init__(self, rate=SIMULATION_RATE, max_steps=MAX_SIMULATION_STEPS):
+        self.step_duration = 1 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0
+        # How far we are between the previous step and the next one, from 0 to 1
+        self.alpha = 0
+        self.dropped_time = 0
+
+    def advance(self, delta_time) -> int:
+        """
+        Add a frame's worth of time and return how many simulation steps should run for it.
+        Never returns more than max_steps; if a frame stalled for longer than that, the extra
+        time is dropped rather than making every following frame try to catch up.
+        """
+        self.accumulator += delta_time
+        steps = int(self.accumulator / self.step_duration)
+        if steps > self.max_steps:
+            self.dropped_time += (steps - self.max_steps) * self.step_duration
+            steps = self.max_steps
+            self.accumulator = 0
+        else:
+            self.accumulator -= steps * self.step_duration
+        self.alpha = self.accumulator / self.step_duration
+        return steps
+
+
+def lerp(start, end, alpha):
+    return start + (end - start) * alpha
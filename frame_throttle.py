@@ -0,0 +1,82 @@
+"""
+On-demand rendering and idle throttling, so the game doesn't keep classroom laptops busy while nobody is playing.
+
+Every update, the window hands FrameThrottle a small "render signature" (see MyGame.render_signature()) that
+covers everything visible on screen. If it hasn't changed, on_draw can skip drawing. After a change we still
+draw FRAME_BUFFER_COUNT frames so every back buffer holds the up-to-date picture before we stop drawing.
+
+When the window loses focus, or nothing has changed for IDLE_TIMEOUT seconds, the update rate drops to
+IDLE_UPDATE_RATE until the next input.
+"""
+from constant import *
+from game_log import fields, get_logger
+
+log = get_logger("render")
+
+
+class FrameThrottle:
+
+    def __init__(self, window):
+        self.window = window
+        self._signature = None
+        self._frames_to_draw = FRAME_BUFFER_COUNT
+        self._idle_time = 0
+        self._focused = True
+        self._sleeping = False
+
+        # Stats for report()
+        self.frames_drawn = 0
+        self.frames_skipped = 0
+        self.slow_updates = 0
+
+    def mark_dirty(self):
+        """Force the next few frames to be drawn, e.g. after a resize."""
+        self._frames_to_draw = FRAME_BUFFER_COUNT
+
+    def notify_input(self):
+        """Called on every key press/release. Wakes the game back up to full speed."""
+        self.mark_dirty()
+        self._idle_time = 0
+        self._set_sleeping(False)
+
+    def set_focused(self, focused: bool):
+        self._focused = focused
+        self.mark_dirty()
+        if focused:
+            self._idle_time = 0
+        self._set_sleeping(not focused)
+
+    def update(self, delta_time):
+        """Called at the end of MyGame.on_update() once the frame's game logic is done."""
+        if self._sleeping:
+            self.slow_updates += 1
+
+        signature = self.window.render_signature()
+        if signature != self._signature:
+            self._signature = signature
+            self.mark_dirty()
+            self._idle_time = 0
+        else:
+            self._idle_time += delta_time
+
+        self._set_sleeping(not self._focused or self._idle_time >= IDLE_TIMEOUT)
+
+    def should_draw(self) -> bool:
+        if not RENDER_ON_DEMAND or self._frames_to_draw > 0:
+            self._frames_to_draw = max(0, self._frames_to_draw - 1)
+            self.frames_drawn += 1
+            return True
+        self.frames_skipped += 1
+        return False
+
+    def report(self):
+        total = self.frames_drawn + self.frames_skipped
+        if total > 0:
+            log.info("Frames drawn", extra=fields(
+                drawn=self.frames_drawn, total=total, skipped=self.frames_skipped,
+                skipped_percent=int(self.frames_skipped / total * 100), idle_updates=self.slow_updates))
+
+    def _set_sleeping(self, sleeping: bool):
+        if sleeping != self._sleeping:
+            self._sleeping = sleeping
+            self.window.set_update_rate(IDLE_UPDATE_RATE if sleeping else UPDATE_RATE)
@@ -0,0 +1,125 @@
+"""
+Logging for the game, built on the standard logging module.
+
+Each subsystem gets its own logger from get_logger() ("game.rooms", "game.falling_tile", ...) with its level
+taken from LOG_LEVELS in constant.py. Records carry key=value fields via fields(), are rate-limited per message
+so a per-frame call can't flood the output, and are handed to a background thread through a bounded queue, so
+logging never blocks a frame on a slow terminal. If that queue fills up, new records are dropped and counted.
+
+Call sites that run every frame should also be wrapped in
+
+    if __debug__ and LOG_HOT_PATHS:
+        log.debug(...)
+
+With LOG_HOT_PATHS off that costs one global lookup, and under python -O the compiler removes the block.
+"""
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+from constant import *
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s%(field_text)s"
+
+
+def get_logger(subsystem):
+    logger = logging.getLogger(f"game.{subsystem}")
+    logger.setLevel(LOG_LEVELS.get(subsystem, LOG_DEFAULT_LEVEL))
+    return logger
+
+
+def fields(**values):
+    """Structured values for a record, e.g. log.info("Entered room", extra=fields(room="addition"))."""
+    return {"fields": values}
+
+
+class FieldFormatter(logging.Formatter):
+    """Appends a record's fields to the message as key=value pairs."""
+
+    def format(self, record):
+        values = getattr(record, "fields", None)
+        record.field_text = "" if not values else " " + " ".join(f"{key}={value}" for key, value in values.items())
+        return super().format(record)
+
+
+class SampleFilter(logging.Filter):
+    """
+    Lets each message (by logger and format string, not the filled-in values) through at most once every
+    interval seconds. The next one that gets through says how many were skipped in between.
+    Only records at max_level or below are sampled, since that's where the per-frame calls log.
+    """
+
+    def __init__(self, interval=LOG_SAMPLE_INTERVAL, max_level=logging.DEBUG, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.max_level = max_level
+        self.clock = clock
+        # {(logger name, msg): [time last let through, skipped since then]}
+        self._seen = {}
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        key = (record.name, record.msg)
+        now = self.clock()
+        seen = self._seen.get(key)
+        if seen is not None and now - seen[0] < self.interval:
+            seen[1] += 1
+            return False
+        if seen is not None and seen[1] > 0:
+            record.fields = dict(getattr(record, "fields", None) or {}, skipped=seen[1])
+        self._seen[key] = [now, 0]
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that drops records instead of raising when the writer thread falls behind."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler = None
+_listener = None
+
+
+def start(stream=None):
+    """Start the writer thread and send every game.* logger to it. Safe to call more than once."""
+    global _handler, _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.addFilter(SampleFilter())
+
+    sink = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    sink.setFormatter(FieldFormatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(log_queue, sink)
+    _listener.start()
+
+    root = logging.getLogger("game")
+    root.addHandler(_handler)
+    # Don't also hand records to the root logger, which would write them synchronously
+    root.propagate = False
+
+
+def stop():
+    """Flush everything still queued and stop the writer thread."""
+    global _handler, _listener
+    if _listener is None:
+        return
+    logging.getLogger("game").removeHandler(_handler)
+    _listener.stop()
+    if _handler.dropped > 0:
+        print(f"Dropped {_handler.dropped} log records because the log writer fell behind", file=sys.stderr)
+    _handler = None
+    _listener = None
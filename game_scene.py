@@ -0,0 +1,68 @@
+"""
+The Scene every map is loaded into, the hub and the rooms alike.
+
+arcade.Scene only knows its layers by name, so every lookup is a dictionary access (and a typo is a KeyError at
+runtime). GameScene makes sure all the layers the game uses exist, in the same draw order everywhere, and
+resolves them once into attributes. Code that runs every frame should use those instead of get_sprite_list().
+"""
+import arcade
+
+from adjacency import AdjacencyIndex
+from constant import *
+
+# Layers the game needs from every map. Missing ones are added empty, underneath everything else.
+MAP_LAYERS = [
+    LAYER_NAME_WALLS,
+    LAYER_NAME_MATH_PROBLEM_ORIGIN,
+    LAYER_NAME_FALLING_TILE,
+]
+# Layers that are collided with every step but hardly ever change, so lookups go through a spatial hash
+SPATIAL_HASH_LAYERS = {LAYER_NAME_WALLS}
+# Layers the game fills in itself, added on top of the map's layers in this order
+GAME_LAYERS = [
+    LAYER_NAME_NUMBER_TARGETS,
+    LAYER_NAME_PLAYER,
+    LAYER_NAME_NUMBER,
+    LAYER_NAME_NUMBER_SYMBOLS,
+    LAYER_NAME_NUMBER_HITBOX,
+    LAYER_NAME_DOORS,
+    LAYER_NAME_PAGE,
+]
+
+
+class GameScene(arcade.Scene):
+
+    def __init__(self, tile_map=None):
+        super().__init__()
+        if tile_map is not None:
+            for name, sprite_list in tile_map.sprite_lists.items():
+                self.add_sprite_list(name=name, sprite_list=sprite_list)
+
+        added = 0
+        for name in MAP_LAYERS:
+            if name not in self.name_mapping:
+                self.add_sprite_list(name, use_spatial_hash=name in SPATIAL_HASH_LAYERS)
+                # Keep the empty layer under the map's own layers
+                self.sprite_lists.insert(added, self.sprite_lists.pop())
+                added += 1
+        for name in GAME_LAYERS:
+            if name not in self.name_mapping:
+                self.add_sprite_list(name)
+
+        self.walls: arcade.SpriteList = self.name_mapping[LAYER_NAME_WALLS]
+        self.math_problems: arcade.SpriteList = self.name_mapping[LAYER_NAME_MATH_PROBLEM_ORIGIN]
+        self.falling_tiles: arcade.SpriteList = self.name_mapping[LAYER_NAME_FALLING_TILE]
+        self.number_targets: arcade.SpriteList = self.name_mapping[LAYER_NAME_NUMBER_TARGETS]
+        self.players: arcade.SpriteList = self.name_mapping[LAYER_NAME_PLAYER]
+        self.numbers: arcade.SpriteList = self.name_mapping[LAYER_NAME_NUMBER]
+        self.number_symbols: arcade.SpriteList = self.name_mapping[LAYER_NAME_NUMBER_SYMBOLS]
+        self.number_hitboxes: arcade.SpriteList = self.name_mapping[LAYER_NAME_NUMBER_HITBOX]
+        self.doors: arcade.SpriteList = self.name_mapping[LAYER_NAME_DOORS]
+        self.pages: arcade.SpriteList = self.name_mapping[LAYER_NAME_PAGE]
+
+        # Which tile each NumberBlock is in, kept up to date by NumberBlock.move_to()
+        self.block_index = AdjacencyIndex()
+
+    @classmethod
+    def from_tilemap(cls, tile_map):
+        return cls(tile_map)
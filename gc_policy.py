@@ -0,0 +1,126 @@
+"""
+Keeps garbage collection pauses out of gameplay.
+
+Python's cyclic garbage collector runs whenever enough objects have been allocated, and a full collection has
+to walk every object alive, which after a room is built is tens of thousands of sprites, textures and
+problems. That's a visible hitch if it lands mid-play. GCPolicy instead:
+
+- raises the collection thresholds (GC_PLAY_THRESHOLDS) while playing, so collections are rarer,
+- does a full collection at each room transition, where a pause isn't noticed, and then
+- freezes everything still alive (gc.freeze()), so later collections skip the loaded rooms entirely.
+
+Objects are unfrozen again before the next transition's collection, so evicted rooms can still be collected.
+Rooms built ahead of time during play (see prefetch.py) go through build_ahead(), which holds collections off
+while they're built and freezes the result, so prefetching doesn't cause collections mid-play either.
+Every collection is timed through gc.callbacks, and report() logs the pauses during play separately from the
+ones at transitions, so it's easy to check the hitches are gone.
+"""
+import gc
+import time
+from contextlib import contextmanager
+
+from constant import *
+from game_log import fields, get_logger
+
+log = get_logger("gc")
+
+
+class PauseStats:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.longest = 0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.longest = max(self.longest, duration)
+
+
+class GCPolicy:
+
+    def __init__(self, thresholds=GC_PLAY_THRESHOLDS, clock=time.perf_counter):
+        self.thresholds = thresholds
+        self.clock = clock
+        self._default_thresholds = None
+        self._started_at = None
+        self._in_transition = False
+        # {("play" or "transition", generation): PauseStats}
+        self.pauses = {}
+
+    def start(self):
+        self._default_thresholds = gc.get_threshold()
+        gc.set_threshold(*self.thresholds)
+        gc.callbacks.append(self._on_gc)
+
+    def stop(self):
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        if self._default_thresholds is not None:
+            gc.set_threshold(*self._default_thresholds)
+        gc.unfreeze()
+
+    def transition(self, label):
+        """Call once a room transition is done: collects everything that's garbage now, then freezes the rest."""
+        started_at = self.clock()
+        gc.unfreeze()
+        self._in_transition = True
+        try:
+            gc.collect()
+        finally:
+            self._in_transition = False
+        gc.freeze()
+        log.debug("Collected at transition", extra=fields(
+            label=label, ms=round((self.clock() - started_at) * 1000, 2), frozen=gc.get_freeze_count()))
+
+    @contextmanager
+    def build_ahead(self, label):
+        """
+        Wrap work during play that allocates a lot, like a stage of building a room ahead of time. There are no
+        collections while it runs, and everything alive afterwards is frozen, so what it made doesn't trigger or
+        lengthen collections during play. It's unfrozen and collected at the next transition like everything else.
+        """
+        started_at = self.clock()
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            yield
+        finally:
+            gc.freeze()
+            if enabled:
+                gc.enable()
+        log.debug("Built ahead of time", extra=fields(
+            label=label, ms=round((self.clock() - started_at) * 1000, 2), frozen=gc.get_freeze_count()))
+
+    def play_pauses(self):
+        """Every collection that happened during play, as one PauseStats."""
+        stats = PauseStats()
+        for (phase, _), phase_stats in self.pauses.items():
+            if phase == "play":
+                stats.count += phase_stats.count
+                stats.total += phase_stats.total
+                stats.longest = max(stats.longest, phase_stats.longest)
+        return stats
+
+    def report(self):
+        for (phase, generation), stats in sorted(self.pauses.items()):
+            log.info("GC pauses", extra=fields(
+                phase=phase, generation=generation, count=stats.count,
+                total_ms=round(stats.total * 1000, 2), longest_ms=round(stats.longest * 1000, 2)))
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._started_at = self.clock()
+            return
+        if self._started_at is None:
+            return
+        duration = self.clock() - self._started_at
+        self._started_at = None
+        key = ("transition" if self._in_transition else "play", info["generation"])
+        if key not in self.pauses:
+            self.pauses[key] = PauseStats()
+        self.pauses[key].add(duration)
+        if key[0] == "play" and duration > GC_SLOW_PAUSE:
+            log.warning("Slow collection during play", extra=fields(
+                generation=info["generation"], ms=round(duration * 1000, 2), collected=info["collected"]))
@@ -0,0 +1,224 @@
+"""
+The guidance arrow, which points the player toward the nearest door or unsolved math problem.
+
+A FlowField is built once per scene: the walls layer is rasterized onto a grid of map tiles, and a breadth-first
+search out from every goal gives each tile its distance to the nearest goal and the step to take toward it.
+Looking up the arrow for the player's position is then a single array index.
+
+When a problem is solved (or unsolved again) only the tiles whose nearest goal changed are searched again.
+"""
+import heapq
+from collections import deque
+
+import numpy as np
+
+from constant import *
+
+UNREACHABLE = np.iinfo(np.int32).max
+NO_GOAL = -1
+# (column, row) steps to the four neighbours of a tile
+NEIGHBOURS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+def rasterize_walls(walls, columns, rows, cell_size):
+    """A (rows, columns) bool array that's True for every tile a wall sprite covers. Row 0 is the bottom."""
+    blocked = np.zeros((rows, columns), dtype=bool)
+    for wall in walls:
+        left = max(0, int(wall.left // cell_size))
+        right = min(columns, int((wall.right - 1) // cell_size) + 1)
+        bottom = max(0, int(wall.bottom // cell_size))
+        top = min(rows, int((wall.top - 1) // cell_size) + 1)
+        blocked[bottom:top, left:right] = True
+    return blocked
+
+
+class FlowField:
+
+    def __init__(self, blocked, cell_size=TILE_SIZE * TILE_SCALING):
+        """
+        Params:
+        :blocked: a (rows, columns) bool array of the tiles the player can't walk through, from rasterize_walls().
+        """
+        self.blocked = blocked.copy()
+        self.cell_size = cell_size
+        rows, columns = blocked.shape
+        self.distance = np.full((rows, columns), UNREACHABLE, dtype=np.int32)
+        # Which goal each tile is closest to, as an index into _goal_cells
+        self.owner = np.full((rows, columns), NO_GOAL, dtype=np.int32)
+        # (step_x, step_y) toward the nearest goal for each tile, each -1, 0 or 1
+        self.steps = np.zeros((rows, columns, 2), dtype=np.int8)
+        self._goal_ids = {}
+        self._goal_cells = []
+
+    def cell_at(self, x, y):
+        """(row, column) of the tile at a world position, or None if it's off the map."""
+        row = int(y // self.cell_size)
+        column = int(x // self.cell_size)
+        rows, columns = self.blocked.shape
+        if 0 <= row < rows and 0 <= column < columns:
+            return row, column
+        return None
+
+    def set_goals(self, goals):
+        """Replace every goal at once with a full search. goals is {key: (x, y)}."""
+        self.distance.fill(UNREACHABLE)
+        self.owner.fill(NO_GOAL)
+        self._goal_ids = {}
+        self._goal_cells = []
+        queue = deque()
+        for key, (x, y) in goals.items():
+            cell = self._register_goal(key, x, y)
+            if cell is not None and self.distance[cell] != 0:
+                self.distance[cell] = 0
+                self.owner[cell] = self._goal_ids[key]
+                queue.append(cell)
+        self._search(queue)
+        self._update_steps()
+
+    def add_goal(self, key, x, y):
+        """Add one goal. Only the tiles that end up closer to it than to any other goal are touched."""
+        if key in self._goal_ids:
+            return
+        cell = self._register_goal(key, x, y)
+        if cell is None:
+            return
+        self.distance[cell] = 0
+        self.owner[cell] = self._goal_ids[key]
+        self._search(deque([cell]))
+        self._update_steps()
+
+    def remove_goal(self, key):
+        """Remove one goal. Only the tiles that were closest to it are searched again."""
+        goal_id = self._goal_ids.pop(key, None)
+        if goal_id is None:
+            return
+        region = self.owner == goal_id
+        self.distance[region] = UNREACHABLE
+        self.owner[region] = NO_GOAL
+
+        # Refill the region from its edges, where the neighbouring tiles already know their distance
+        # to some other goal. Those start at different distances, so this needs a priority queue.
+        heap = []
+        for other_id in self._goal_ids.values():
+            # Another goal on the same tile
+            row, column = self._goal_cells[other_id]
+            if region[row, column]:
+                self.distance[row, column] = 0
+                self.owner[row, column] = other_id
+                heapq.heappush(heap, (0, row, column))
+        rows, columns = self.blocked.shape
+        for row, column in zip(*np.nonzero(region)):
+            for step_x, step_y in NEIGHBOURS:
+                neighbour_row, neighbour_column = row + step_y, column + step_x
+                if 0 <= neighbour_row < rows and 0 <= neighbour_column < columns \
+                        and not region[neighbour_row, neighbour_column] \
+                        and self.distance[neighbour_row, neighbour_column] != UNREACHABLE:
+                    heapq.heappush(heap, (int(self.distance[neighbour_row, neighbour_column]),
+                                          int(neighbour_row), int(neighbour_column)))
+        while heap:
+            distance, row, column = heapq.heappop(heap)
+            if distance > self.distance[row, column]:
+                continue
+            for neighbour in self._open_neighbours(row, column):
+                if distance + 1 < self.distance[neighbour]:
+                    self.distance[neighbour] = distance + 1
+                    self.owner[neighbour] = self.owner[row, column]
+                    heapq.heappush(heap, (distance + 1, neighbour[0], neighbour[1]))
+        self._update_steps()
+
+    def direction_at(self, x, y):
+        """(step_x, step_y) toward the nearest goal from a world position. (0, 0) at a goal or nowhere near one."""
+        cell = self.cell_at(x, y)
+        if cell is None:
+            return 0, 0
+        step = self.steps[cell]
+        return int(step[0]), int(step[1])
+
+    def _register_goal(self, key, x, y):
+        cell = self.cell_at(x, y)
+        if cell is None:
+            return None
+        # Doors and problems can sit on wall tiles, but they still have to be reachable
+        self.blocked[cell] = False
+        self._goal_ids[key] = len(self._goal_cells)
+        self._goal_cells.append(cell)
+        return cell
+
+    def _open_neighbours(self, row, column):
+        rows, columns = self.blocked.shape
+        for step_x, step_y in NEIGHBOURS:
+            neighbour_row, neighbour_column = row + step_y, column + step_x
+            if 0 <= neighbour_row < rows and 0 <= neighbour_column < columns \
+                    and not self.blocked[neighbour_row, neighbour_column]:
+                yield neighbour_row, neighbour_column
+
+    def _search(self, queue):
+        """Breadth-first search out from the tiles in queue, keeping any shorter distance already found."""
+        while queue:
+            row, column = queue.popleft()
+            distance = self.distance[row, column] + 1
+            for neighbour in self._open_neighbours(row, column):
+                if distance < self.distance[neighbour]:
+                    self.distance[neighbour] = distance
+                    self.owner[neighbour] = self.owner[row, column]
+                    queue.append(neighbour)
+
+    def _update_steps(self):
+        """Point each tile at its closest neighbour, using whole-array operations."""
+        padded = np.pad(self.distance, 1, constant_values=UNREACHABLE)
+        rows, columns = self.distance.shape
+        neighbour_distances = np.stack([
+            padded[1 + step_y:1 + step_y + rows, 1 + step_x:1 + step_x + columns] for step_x, step_y in NEIGHBOURS
+        ])
+        best = np.argmin(neighbour_distances, axis=0)
+        closer = np.take_along_axis(neighbour_distances, best[np.newaxis], axis=0)[0] < self.distance
+        directions = np.array(NEIGHBOURS, dtype=np.int8)
+        self.steps[...] = np.where(closer[..., np.newaxis], directions[best], 0)
+
+
+def goals_for_scene(scene, problems):
+    """{key: (x, y)} for every door in a scene and every unsolved problem in problems."""
+    goals = {door: (door.center_x, door.center_y) for door in scene.doors}
+    for problem in problems:
+        if not problem.is_solved():
+            goals[problem] = (problem.center_x, problem.center_y)
+    return goals
+
+
+class Guidance:
+    """
+    The guidance arrow for one scene. Call refresh() when problems may have been solved or unsolved.
+    """
+
+    def __init__(self, scene, problems, columns, rows):
+        self.problems = problems
+        blocked = rasterize_walls(scene.walls, columns, rows, TILE_SIZE * TILE_SCALING)
+        self.field = FlowField(blocked)
+        self.field.set_goals(goals_for_scene(scene, problems))
+        self._solved = {problem: problem.is_solved() for problem in problems}
+
+    def refresh(self):
+        for problem in self.problems:
+            solved = problem.is_solved()
+            if solved == self._solved[problem]:
+                continue
+            self._solved[problem] = solved
+            if solved:
+                self.field.remove_goal(problem)
+            else:
+                self.field.add_goal(problem, problem.center_x, problem.center_y)
+
+    def draw(self, player):
+        step_x, step_y = self.field.direction_at(player.center_x, player.center_y)
+        if step_x == 0 and step_y == 0:
+            return
+        start_x = player.center_x + step_x * player.width / 2
+        start_y = player.center_y + step_y * player.height / 2
+        end_x = start_x + step_x * GUIDANCE_ARROW_LENGTH
+        end_y = start_y + step_y * GUIDANCE_ARROW_LENGTH
+        arcade.draw_line(start_x, start_y, end_x, end_y, GUIDANCE_ARROW_COLOR, 4)
+        # Arrowhead
+        side_x, side_y = -step_y * 8, step_x * 8
+        arcade.draw_triangle_filled(end_x + step_x * 12, end_y + step_y * 12,
+                                    end_x + side_x, end_y + side_y,
+                                    end_x - side_x, end_y - side_y, GUIDANCE_ARROW_COLOR)
@@ -0,0 +1,81 @@
+"""
+Hit-box polygons kept on disk between launches, keyed by texture and hit box algorithm.
+
+arcade works out a texture's hit box from its pixels ("Simple" walks the image looking for the opaque edges).
+Within one run it already shares a single Texture per file and region, so every distinct texture is scanned
+only once. Across launches, though, every texture is scanned again. Textures loaded through atlas.load_texture()
+(blocks, targets, doors, pages, the player) are handed to apply() here, which fills in the polygon from
+HIT_BOX_CACHE_PATH instead, and stores newly scanned ones there when the game closes (with HIT_BOX_CACHE_PERSIST
+on). Each entry remembers the modification time of the image it was computed from, and is ignored once that
+image changes (e.g. after rebuilding the atlas).
+
+Map tiles don't go through here: they're loaded with TILE_HIT_BOX_ALGORITHM, a plain box, so there's nothing
+to scan in the first place.
+"""
+import json
+import os
+
+from constant import *
+from game_log import fields, get_logger
+
+log = get_logger("hit_box")
+
+
+class HitBoxCache:
+
+    def __init__(self, path=HIT_BOX_CACHE_PATH, persist=HIT_BOX_CACHE_PERSIST):
+        self.path = path
+        self.persist = persist
+        # {"texture name|algorithm": {"mtime": source image mtime, "points": [[x, y], ...]}}
+        self._entries = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def apply(self, texture, source_path, hit_box_algorithm):
+        """Give texture its hit box from the cache, computing and storing it on a miss."""
+        # "None" is just the image's bounding box, which is cheaper to make than to look up
+        if hit_box_algorithm in (None, "None") or not hasattr(texture, "_hit_box_points"):
+            return texture
+        if texture._hit_box_points is not None:
+            # Already worked out for this texture object (arcade caches textures by file and region)
+            return texture
+
+        entries = self._load()
+        key = f"{texture.name}|{hit_box_algorithm}"
+        mtime = os.path.getmtime(source_path) if os.path.exists(source_path) else None
+        entry = entries.get(key)
+        if entry is not None and entry["mtime"] == mtime:
+            texture._hit_box_points = tuple(tuple(point) for point in entry["points"])
+            self.hits += 1
+            return texture
+
+        entries[key] = {"mtime": mtime, "points": [list(point) for point in texture.hit_box_points]}
+        self._dirty = True
+        self.misses += 1
+        return texture
+
+    def save(self):
+        """Write the cache to disk if it's persistent and anything new was computed."""
+        if not self.persist or not self._dirty:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self._entries, file)
+        os.replace(temp_path, self.path)
+        self._dirty = False
+        log.info("Saved hit boxes", extra=fields(count=len(self._entries), hits=self.hits, computed=self.misses))
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.persist and os.path.exists(self.path):
+                try:
+                    with open(self.path) as file:
+                        self._entries = json.load(file)
+                except (OSError, ValueError):
+                    log.warning("Ignoring unreadable hit box cache", extra=fields(path=self.path))
+        return self._entries
+
+
+cache = HitBoxCache()
@@ -0,0 +1,152 @@
+"""
+Hot-reloading of Tiled maps for map authors. Turn it on with HOT_RELOAD_MAPS in constant.py.
+
+MapWatcher polls the modification time of every map that has a live Scene. When one changes, the
+.tmx is parsed with ElementTree and each tile layer is compared against the last version we saw. Only
+the layers that actually changed are built into new sprites, and they're patched into the existing SpriteList
+objects so the physics engine, the player and the math problems all keep their references and state.
+"""
+import hashlib
+import os
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+
+import pytiled_parser
+
+from constant import *
+from game_log import fields, get_logger
+
+log = get_logger("hot_reload")
+
+# Layers that own game state. Reloading them would regenerate problems, so they're left alone.
+HOT_RELOAD_SKIPPED_LAYERS = [LAYER_NAME_MATH_PROBLEM_ORIGIN]
+
+
+def read_layer_hashes(map_name):
+    """
+    Returns {layer name: hash of that layer's XML} for every tile layer in a .tmx file.
+    Tilesets are hashed under the key None, since changing them affects every layer.
+    """
+    root = ElementTree.parse(map_name).getroot()
+    hashes = {}
+    tilesets = b"".join(ElementTree.tostring(tileset) for tileset in root.iter("tileset"))
+    hashes[None] = hashlib.md5(tilesets).hexdigest()
+    for layer in root.iter("layer"):
+        hashes[layer.get("name")] = hashlib.md5(ElementTree.tostring(layer)).hexdigest()
+    return hashes
+
+
+def changed_layers(old_hashes, new_hashes):
+    """
+    Names of the tile layers that were added, removed or edited between two read_layer_hashes() results.
+    """
+    names = (set(old_hashes) | set(new_hashes)) - {None}
+    if old_hashes.get(None) != new_hashes.get(None):
+        # A tileset changed, so every layer could look different
+        return sorted(names)
+    return sorted(name for name in names if old_hashes.get(name) != new_hashes.get(name))
+
+
+def build_layers(map_name, layer_names, layer_options):
+    """
+    Loads a map with sprites for only the named layers. The whole file is still parsed, but building the
+    sprites (and their hit boxes) is the slow part, so the layers that didn't change are dropped before that.
+    """
+    tiled_map = pytiled_parser.parse_map(Path(map_name))
+    tiled_map.layers = [layer for layer in tiled_map.layers if layer.name in layer_names]
+    return arcade.TileMap(scaling=TILE_SCALING, layer_options=layer_options,
+                          hit_box_algorithm=TILE_HIT_BOX_ALGORITHM, tiled_map=tiled_map)
+
+
+class WatchedMap:
+    def __init__(self, map_name, scene, layer_options):
+        self.map_name = map_name
+        self.scene = scene
+        self.layer_options = layer_options
+        self.mtime = os.path.getmtime(map_name)
+        self.layer_hashes = read_layer_hashes(map_name)
+
+
+class MapWatcher:
+    """
+    Keeps track of which .tmx files back which live Scenes, and patches those scenes when a file changes.
+    """
+
+    def __init__(self):
+        self._watched = {}
+        self._timer = 0
+
+    def watch(self, map_name, scene, layer_options):
+        """Start watching a map. Watching the same map again (e.g. after MyGame.setup()) replaces its scene."""
+        self._watched[map_name] = WatchedMap(map_name, scene, layer_options)
+
+    def unwatch(self, map_name):
+        self._watched.pop(map_name, None)
+
+    def update(self, delta_time):
+        """
+        Called every frame; only actually checks the files every HOT_RELOAD_POLL_INTERVAL seconds.
+        Returns the names of the layers that were reloaded, so the caller knows to redraw.
+        """
+        reloaded = []
+        self._timer += delta_time
+        if self._timer < HOT_RELOAD_POLL_INTERVAL:
+            return reloaded
+        self._timer = 0
+        for watched in self._watched.values():
+            try:
+                mtime = os.path.getmtime(watched.map_name)
+            except OSError:
+                # Tiled replaces the file when saving, so it can briefly not exist
+                continue
+            if mtime != watched.mtime:
+                watched.mtime = mtime
+                reloaded.extend(self.reload(watched))
+        return reloaded
+
+    def reload(self, watched: WatchedMap):
+        """Patch the changed layers of a map into its scene. Returns the names of the layers it patched."""
+        try:
+            new_hashes = read_layer_hashes(watched.map_name)
+        except ElementTree.ParseError:
+            # Caught the file half-written; the next poll will see it again once it's done
+            watched.mtime = None
+            return []
+
+        layer_names = changed_layers(watched.layer_hashes, new_hashes)
+        watched.layer_hashes = new_hashes
+        if len(layer_names) == 0:
+            return []
+
+        for name in layer_names:
+            if name in HOT_RELOAD_SKIPPED_LAYERS:
+                log.warning("Not reloading layer, restart the game to see that change",
+                            extra=fields(layer=name, map=watched.map_name))
+        layer_names = [name for name in layer_names if name not in HOT_RELOAD_SKIPPED_LAYERS]
+        if len(layer_names) == 0:
+            return []
+        tile_map = build_layers(watched.map_name, layer_names, watched.layer_options)
+        for name in layer_names:
+            self._patch_layer(watched.scene, name, tile_map.sprite_lists.get(name))
+        log.info("Reloaded map", extra=fields(map=watched.map_name, layers=",".join(layer_names)))
+        return layer_names
+
+    @staticmethod
+    def _patch_layer(scene, name, new_sprite_list):
+        """
+        Swap the sprites of a layer in place, keeping the same SpriteList object (and its draw order).
+        """
+        old_sprite_list = scene.name_mapping.get(name)
+        if old_sprite_list is None:
+            if new_sprite_list is not None:
+                # Brand-new layer; it'll draw on top until the game is restarted
+                scene.add_sprite_list(name, sprite_list=new_sprite_list)
+            return
+
+        old_sprite_list.clear()
+        if new_sprite_list is not None:
+            old_sprite_list.extend(new_sprite_list)
+
+        if name == LAYER_NAME_FALLING_TILE:
+            for tile in old_sprite_list:
+                tile.setup(scene)
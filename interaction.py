@@ -0,0 +1,55 @@
+"""
+Event-driven interaction checks. Instead of testing for collisions every frame, InteractionTracker only looks
+for a new target when its subject moves into a different grid cell (or when told something changed), and
+turns the result into enter/exit events. A player standing still costs nothing.
+"""
+from constant import *
+
+
+class InteractionTracker:
+
+    def __init__(self, subject: arcade.Sprite, find_target, on_enter, on_exit, cell_size=INTERACTION_CELL_SIZE):
+        """
+        Params:
+        :find_target: called with no arguments, returns whatever the subject is currently touching (or None).
+        :on_enter: called with the new target when the subject starts touching something.
+        :on_exit: called with the old target when the subject stops touching it.
+        """
+        self.subject = subject
+        self.find_target = find_target
+        self.on_enter = on_enter
+        self.on_exit = on_exit
+        self.cell_size = cell_size
+
+        self.target = None
+        self._cell = None
+        self._stale = True
+
+    def invalidate(self):
+        """
+        Forget the current target and check again on the next update(), e.g. after the scene changed or
+        a block was grabbed or dropped. The forgotten target gets its exit event, so nothing is left showing
+        for a block in a scene the subject has left.
+        """
+        previous = self.target
+        self.target = None
+        self._stale = True
+        if previous is not None:
+            self.on_exit(previous)
+
+    def update(self):
+        cell = (int(self.subject.center_x // self.cell_size), int(self.subject.center_y // self.cell_size))
+        if cell == self._cell and not self._stale:
+            return
+        self._cell = cell
+        self._stale = False
+
+        target = self.find_target()
+        if target is self.target:
+            return
+        previous = self.target
+        self.target = target
+        if previous is not None:
+            self.on_exit(previous)
+        if target is not None:
+            self.on_enter(target)
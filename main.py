@@ -1,20 +1,40 @@
-from distutils.core import setup
 import arcade
+from functools import partial
 from FallingTileStuff.falling_tile import FallingTile
 from numbers_and_math import VisualMathProblem, NumberBlock, VisualMathProblemLocation
 from pyglet.math import Vec2
 from math import sqrt
 from constant import *
+from game_log import fields, get_logger
 from numbers_and_math import VisualMathProblem
 from pyglet.math import Vec2
 import constant
 from player import Player
+from physics import PlayerPhysicsEngine
 from door import Door
-from Rooms.addition_room import AdditionRoom
-from Rooms.subtraction_room import SubtractionRoom
-from Rooms.multiplication_room import MultiplicationRoom
-from Rooms.division_room import DivisionRoom
+from Rooms.manifest import ROOM_MANIFEST
+from Rooms.room import Room
 from page import Page
+from prefetch import RoomPrefetcher
+from render_scale import ScaledRenderer
+from atlas import load_texture
+from animation import Animator
+from fixed_timestep import FixedTimestep, lerp
+from frame_throttle import FrameThrottle
+from game_scene import GameScene
+from guidance import Guidance
+from hot_reload import MapWatcher
+from memory_profile import MemoryProfiler
+import game_log
+from gc_policy import GCPolicy
+import hit_box_cache
+import telemetry
+from room_cache import RoomCache
+from save_state import SnapshotWriter, load_snapshot, pack_snapshot, take_snapshot
+
+log = get_logger("rooms")
+falling_tile_log = get_logger("falling_tile")
+score_log = get_logger("score")
 
 
 class MyGame(arcade.Window):
@@ -31,25 +51,59 @@ class MyGame(arcade.Window):
         self.exit_list = None
         self.problem = None
         self.scene = None
+        self.animator = Animator()
         self.player = Player(self)
         self.page = Page(self)
+        self.drawing_caption = False
+        self.throttle = FrameThrottle(self)
+        self.timestep = FixedTimestep()
+        self._previous_player_position = (self.player.center_x, self.player.center_y)
+
+        # Saved progress from the last time the game was played, if there is any
+        self.snapshot = load_snapshot()
+        self.snapshot_writer = SnapshotWriter()
+        self.snapshot_writer.start()
+        self.snapshot_timer = 0
+
+        # Memory use across room transitions, when MEMORY_PROFILING is on
+        self.memory_profiler = MemoryProfiler()
+        self.memory_profiler.start()
+
+        game_log.start()
+
+        # Garbage collection happens at room transitions instead of mid-play
+        self.gc_policy = GCPolicy() if GC_POLICY_ENABLED else None
+        if self.gc_policy is not None:
+            self.gc_policy.start()
+
+        # Answer attempts get written to a local database in the background
+        telemetry.recorder.start()
+
+        # Reload maps when they're edited in Tiled
+        self.map_watcher = MapWatcher() if HOT_RELOAD_MAPS else None
 
         # Some game status/logic
         self.is_falling_tile_map = False
         self.current_level = None
-        self.all_levels = {
-            "home": None,
-            "addition": AdditionRoom(),
-            "subtraction": SubtractionRoom(),
-            "multiplication": MultiplicationRoom(),
-            "division": DivisionRoom()
-        }
+        # Arrow toward the nearest door or unsolved problem in the current scene
+        self.guidance = None
+        # Rooms are built when first entered, and only a few are kept loaded at once
+        self.rooms = RoomCache(
+            {name: partial(Room, name) for name in ROOM_MANIFEST},
+            snapshots=self.snapshot.levels if self.snapshot is not None else None,
+            on_load=self._on_level_loaded,
+            on_evict=self._on_level_evicted
+        )
+        # Builds rooms as the player walks up to their doors, instead of when they go through
+        self.prefetcher = None
+        if PREFETCH_ENABLED:
+            self.prefetcher = RoomPrefetcher(self.rooms, on_prefetch=self._warm_level, gc_policy=self.gc_policy)
 
         # Load Textures
-        PLAYER_TEXTURES.append(arcade.load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_02.png"))
-        PLAYER_TEXTURES.append(arcade.load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_05.png"))
-        PLAYER_TEXTURES.append(arcade.load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_20.png"))
-        PLAYER_TEXTURES.append(arcade.load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_11.png"))
+        PLAYER_TEXTURES.append(load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_02.png"))
+        PLAYER_TEXTURES.append(load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_05.png"))
+        PLAYER_TEXTURES.append(load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_20.png"))
+        PLAYER_TEXTURES.append(load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_11.png"))
 
         # Our physics engine
         self.physics_engine = None
@@ -60,20 +114,17 @@ class MyGame(arcade.Window):
         self.camera = arcade.Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
         position = Vec2(680, 1375)
         self.camera.position = position
+        # Where the simulation has the camera, before interpolation (see on_draw)
+        self.camera_position = position
+        self._previous_camera_position = position
         self.gui_camera = arcade.Camera(SCREEN_WIDTH, SCREEN_HEIGHT)
+        # Draws the world at a lower resolution when the GPU can't keep up (see render_scale.py)
+        self.renderer = ScaledRenderer(self, self.camera) if DYNAMIC_RESOLUTION else None
         self.view_bottom = 0
         self.view_left = 0
 
         arcade.set_background_color(arcade.csscolor.CORNFLOWER_BLUE)
 
-        # Room dictionary (make sure to add new rooms to this so the doors know which room to point to)
-        self.room_map = dict()
-        self.room_map["home"] = setup
-        self.room_map["addition"] = AdditionRoom
-        self.room_map["subtraction"] = SubtractionRoom
-        self.room_map["multiplication"] = MultiplicationRoom
-        self.room_map["division"] = DivisionRoom
-
     def setup(self):
         """Set up the current map/scene/stage/level here. Call this function to restart the game.
         The map file must be loaded first, then the scene object can be initialized from that.
@@ -93,62 +144,99 @@ class MyGame(arcade.Window):
                 "use_spatial_hash": True
             },
         }
-        self.tile_map = arcade.load_tilemap(MAPS[self.map_index], TILE_SCALING, layer_options)
+        self.tile_map = arcade.load_tilemap(MAPS[self.map_index], TILE_SCALING, layer_options,
+                                            hit_box_algorithm=TILE_HIT_BOX_ALGORITHM)
 
         # Initialize Scene from the tilemap
-        self.scene = arcade.Scene.from_tilemap(self.tile_map)
-        # Create the Sprite lists
-        self.scene.add_sprite_list(LAYER_NAME_NUMBER_TARGETS)
-        self.scene.add_sprite_list(LAYER_NAME_PLAYER)
-        self.scene.add_sprite_list(LAYER_NAME_NUMBER)
-        self.scene.add_sprite_list(LAYER_NAME_NUMBER_SYMBOLS)
-        self.scene.add_sprite_list(LAYER_NAME_NUMBER_HITBOX)
-        self.scene.add_sprite_list(LAYER_NAME_DOORS)
-        self.scene.add_sprite(LAYER_NAME_PLAYER, self.player)
-
-        # Initialize Doors for map!
-        addition_door = Door("addition")
-        addition_door.setCoordinates(2016, 414)
-        addition_door.setTargetPlayerCoordinates(1696, 790)
-        self.scene.add_sprite(LAYER_NAME_DOORS, addition_door)
-
-        # Not sure why, but when I add this door the game will only ever start in this room.
-        # I think it has something to do with the actual subtraction room setup function, but
-        # I don't know what inside that would be causing this to happen
-        subtraction_door = Door("subtraction")
-        subtraction_door.setCoordinates(2050, 2718)
-        subtraction_door.setTargetPlayerCoordinates(513, 106)
-        self.scene.add_sprite(LAYER_NAME_DOORS, subtraction_door)
-
-        multiplication_door = Door("multiplication")
-        multiplication_door.setCoordinates(322, 1182)
-        multiplication_door.setTargetPlayerCoordinates(1312, 1500)
-        self.scene.add_sprite(LAYER_NAME_DOORS, multiplication_door)
-
-        division_door = Door("division")
-        division_door.setCoordinates(2976, 1182)
-        division_door.setTargetPlayerCoordinates(544, 1547)
-        self.scene.add_sprite(LAYER_NAME_DOORS, division_door)
-        self.scene.add_sprite_list(LAYER_NAME_PAGE)
-
-        self.scene.add_sprite(LAYER_NAME_PAGE, self.page)
+        self.scene = GameScene.from_tilemap(self.tile_map)
+        if self.map_watcher is not None:
+            self.map_watcher.watch(MAPS[self.map_index], self.scene, layer_options)
+        self.scene.players.append(self.player)
+        self.player.interaction.invalidate()
+
+        # Initialize Doors for map! One per room in the manifest
+        for name, spec in ROOM_MANIFEST.items():
+            door = Door(name)
+            door.setCoordinates(*spec.entrance)
+            door.setTargetPlayerCoordinates(*spec.entrance_spawn)
+            self.scene.doors.append(door)
+
+        self.scene.pages.append(self.page)
 
         # Create the 'physics engine'
-        self.physics_engine = arcade.PhysicsEngineSimple(
-            self.player, [
-                self.scene.get_sprite_list(LAYER_NAME_WALLS),
-                self.scene.get_sprite_list(LAYER_NAME_NUMBER)
-            ]
+        self.physics_engine = PlayerPhysicsEngine(
+            self.player, [self.scene.walls, self.scene.numbers]
         )
 
         # Set up the math problems
-        for prob in self.scene.get_sprite_list(LAYER_NAME_MATH_PROBLEM_ORIGIN):
+        self.problem_list = []
+        for prob in self.scene.math_problems:
             assert (isinstance(prob, VisualMathProblemLocation))
             prob.setup(self.scene)
             self.problem_list.append(prob.vmp)
 
+        if GUIDANCE_ENABLED:
+            self.guidance = Guidance(self.scene, self.problem_list, self.tile_map.width, self.tile_map.height)
+
+        self.memory_profiler.checkpoint("home", self.scene)
+        if self.gc_policy is not None:
+            self.gc_policy.transition("home")
+
+    def _on_level_loaded(self, level):
+        # Streamed maps aren't a single .tmx to watch
+        if self.map_watcher is not None and level.streamer is None:
+            self.map_watcher.watch(level.map_name, level.scene, level.layer_options)
+
+    def _on_level_evicted(self, level):
+        if self.map_watcher is not None:
+            self.map_watcher.unwatch(level.map_name)
+        if self.prefetcher is not None:
+            self.prefetcher.evicted(level.name)
+
+    def _warm_level(self, level, door):
+        """
+        Everything a level needs before it can be played that isn't part of building it. Done when the level is
+        entered, or earlier by self.prefetcher when the player gets close to the door.
+        """
+        # A streamed map only has the walls near the player loaded, so there's nothing to build a flow field from
+        if GUIDANCE_ENABLED and level.guidance is None and level.streamer is None:
+            level.guidance = Guidance(level.scene, level.problem_list, *level.grid_size)
+        if level.streamer is not None and door is not None:
+            level.streamer.load_around(door.player_center_x, door.player_center_y)
+
+    def resume_from_snapshot(self):
+        """
+        Put the player back in the room and position they were in when the game was last saved.
+        The rooms themselves get rebuilt from the snapshot as they're entered.
+        """
+        if self.snapshot is None:
+            return
+        if self.snapshot.current_room in self.rooms:
+            self.setup_scene_from_level(self.snapshot.current_room, None)
+        self.player.center_x = self.snapshot.player_x
+        self.player.center_y = self.snapshot.player_y
+        self.reset_interpolation()
+
+    def save_snapshot(self):
+        self.snapshot_writer.submit(pack_snapshot(take_snapshot(self)))
+
+    def on_close(self):
+        self.throttle.report()
+        self.save_snapshot()
+        self.snapshot_writer.stop()
+        telemetry.recorder.stop()
+        self.memory_profiler.report()
+        if self.prefetcher is not None:
+            self.prefetcher.report()
+        hit_box_cache.cache.save()
+        if self.gc_policy is not None:
+            self.gc_policy.report()
+            self.gc_policy.stop()
+        game_log.stop()
+        super().on_close()
+
     def player_hit_door(self):
-        for door in self.scene.get_sprite_list(LAYER_NAME_DOORS):
+        for door in self.scene.doors:
             if arcade.check_for_collision(self.player, door):
                 target = door.target_room_string
 
@@ -157,54 +245,79 @@ class MyGame(arcade.Window):
                     self.current_level = None
                     self.player.center_x = door.player_center_x
                     self.player.center_y = door.player_center_y
-                    print("We have returned home.")
+                    self.reset_interpolation()
+                    log.info("Returned to the hub")
                 else:
                     self.setup_scene_from_level(target, door)
 
     def setup_scene_from_level(self, target, door):
 
-        target_level = self.all_levels[target]
+        if self.prefetcher is not None:
+            self.prefetcher.entered(target)
+        target_level = self.rooms.get(target)
         # If the last level we were in is the same as the one we're going to, we don't need to
         # re-do all the setup stuff.
         if self.current_level != target_level:
             # Set the current level to the one we're trying to go into
             self.current_level = target_level
             self.scene = self.current_level.scene
+            self.is_falling_tile_map = self.current_level.is_falling_tile_map
             try:
-                self.scene.add_sprite(LAYER_NAME_PLAYER, self.player)
+                self.scene.players.append(self.player)
             except ValueError as e:
                 pass
-            self.player.center_x = door.player_center_x
-            self.player.center_y = door.player_center_y
-            print(f"We are now in the {target} room")
-
-            self.physics_engine = arcade.PhysicsEngineSimple(
-                self.player, [
-                    self.scene.get_sprite_list(LAYER_NAME_WALLS),
-                    self.scene.get_sprite_list(LAYER_NAME_NUMBER)
-                ]
+            self.player.interaction.invalidate()
+            self.current_level.mark_problems_shown()
+            self._warm_level(self.current_level, door)
+            self.guidance = self.current_level.guidance
+            if door is not None:
+                self.player.center_x = door.player_center_x
+                self.player.center_y = door.player_center_y
+                self.reset_interpolation()
+            if self.current_level.streamer is not None:
+                self.current_level.streamer.load_around(self.player.center_x, self.player.center_y)
+            if self.current_level.corridor is not None:
+                # The player comes back in at the bottom, so the corridor has to start over from there
+                self.current_level.corridor.restart()
+            log.info("Entered room", extra=fields(room=target))
+            self.memory_profiler.checkpoint(target, self.scene)
+            if self.gc_policy is not None:
+                self.gc_policy.transition(target)
+
+            self.physics_engine = PlayerPhysicsEngine(
+                self.player, [self.scene.walls, self.scene.numbers]
             )
 
     def update_score(self):
+        if self.guidance is not None:
+            self.guidance.refresh()
         if self.current_level is not None:
             self.current_level.update_score()
         else:
-            print("No level to update the score for")
+            score_log.debug("No level to update the score for")
 
     def on_draw(self):
         """Render the screen."""
 
+        # Nothing on screen has changed since the last frame, so don't bother drawing it again
+        if not self.throttle.should_draw():
+            return
+
         # Clear the screen to the background color
         arcade.start_render()
 
-        # Use the main camera for the scene
-        self.camera.use()
-
-        # Draw our Scene
-        self.scene.draw()
+        # Draw the player and camera part of the way between the last two simulation steps
+        alpha = self.timestep.alpha
+        self.camera.move_to(self._previous_camera_position.lerp(self.camera_position, alpha), 1)
+        previous_x, previous_y = self._previous_player_position
+        offset_x = lerp(previous_x, self.player.center_x, alpha) - self.player.center_x
+        offset_y = lerp(previous_y, self.player.center_y, alpha) - self.player.center_y
 
-        # Draw Math Layer
-        self.scene.get_sprite_list(LAYER_NAME_NUMBER).update_animation()
+        if self.renderer is not None:
+            if self.renderer.draw(partial(self._draw_world, offset_x, offset_y)):
+                self.throttle.mark_dirty()
+        else:
+            self._draw_world(offset_x, offset_y)
 
         # Use the GUI Camera for the score and stuff
         self.gui_camera.use()
@@ -213,13 +326,69 @@ class MyGame(arcade.Window):
         if self.drawing_caption:
             self.caption()
 
+    def _draw_world(self, offset_x, offset_y):
+        """Draw everything that scrolls with the camera, with the player shifted to their interpolated position."""
+        # Use the main camera for the scene
+        self.camera.use()
+
+        # Draw our Scene
+        self._offset_player(offset_x, offset_y)
+        self.scene.draw()
+        self._offset_player(-offset_x, -offset_y)
+        if self.current_level is not None and self.current_level.corridor is not None:
+            self.current_level.corridor.draw()
+        if self.guidance is not None:
+            self.guidance.draw(self.player)
+
+    def _offset_player(self, offset_x, offset_y):
+        """Shift the player, and any block they're holding, for drawing at an interpolated position."""
+        self.player.center_x += offset_x
+        self.player.center_y += offset_y
+        carrying = self.player.carrying
+        if carrying is not None:
+            carrying.move_to(carrying.center_x + offset_x, carrying.center_y + offset_y)
+
+    def reset_interpolation(self):
+        """Call after teleporting the player so they aren't drawn sliding across the map."""
+        self._previous_player_position = (self.player.center_x, self.player.center_y)
+
     def on_update(self, delta_time):
 
         """Movement and game logic"""
 
+        # Run as many fixed-length simulation steps as this frame's time covers
+        for _ in range(self.timestep.advance(delta_time)):
+            self.simulation_step()
+
+        # Advance only the sprites that are actually animating
+        self.animator.update(delta_time)
+
+        # Periodically hand a snapshot of every room to the background writer
+        self.snapshot_timer += delta_time
+        if self.snapshot_timer >= SNAPSHOT_INTERVAL:
+            self.snapshot_timer = 0
+            self.save_snapshot()
+
+        if self.current_level is not None and self.current_level.streamer is not None:
+            self.current_level.streamer.update(self.player.center_x, self.player.center_y)
+
+        if self.map_watcher is not None and self.map_watcher.update(delta_time):
+            # Patched layers don't change the render signature, so the edit has to be drawn by hand
+            self.throttle.mark_dirty()
+
+        self.throttle.update(delta_time)
+
+    def simulation_step(self):
+        """One fixed-length step of game logic. See fixed_timestep.py."""
+        self._previous_player_position = (self.player.center_x, self.player.center_y)
+        self._previous_camera_position = self.camera_position
+
         # Move the player with the physics engine
         self.physics_engine.update()
 
+        if self.prefetcher is not None:
+            current = self.current_level.name if self.current_level is not None else None
+            self.prefetcher.update(self.player, self.scene.doors, current)
         self.player_hit_door()
 
         # Update the player object
@@ -228,15 +397,59 @@ class MyGame(arcade.Window):
 
         # Call update on the fallable tiles in the scene if necessary
         if self.is_falling_tile_map:
-            for tile in self.scene.get_sprite_list(LAYER_NAME_FALLING_TILE).sprite_list:
-                print("falling tile being updated")
+            for tile in self.scene.falling_tiles.sprite_list:
+                if __debug__ and LOG_HOT_PATHS:
+                    falling_tile_log.debug("Updating falling tile", extra=fields(x=tile.center_x, y=tile.center_y))
                 tile.update()
+        if self.current_level is not None and self.current_level.corridor is not None:
+            self.current_level.corridor.update(self.player)
+
+    def render_signature(self):
+        """
+        Everything that can change what's on screen, rounded to what's actually visible.
+        If this is the same as last frame, the frame doesn't need to be drawn again.
+        """
+        camera_position = self.camera_position
+        falling_tiles = ()
+        if self.is_falling_tile_map:
+            falling_tiles = tuple(tile.center_y for tile in self.scene.falling_tiles if tile.isFalling)
+        score = self.current_level.score if self.current_level is not None else None
+        corridor = None
+        if self.current_level is not None and self.current_level.corridor is not None:
+            corridor = self.current_level.corridor.signature()
+        chunks = None
+        if self.current_level is not None and self.current_level.streamer is not None:
+            chunks = self.current_level.streamer.generation
+        return (
+            id(self.scene),
+            round(self.player.center_x), round(self.player.center_y), self.player.texture,
+            round(camera_position.x * 2), round(camera_position.y * 2),
+            self.page.texture, self.drawing_caption, score, falling_tiles, corridor, chunks
+        )
+
+    def on_resize(self, width: int, height: int):
+        super().on_resize(width, height)
+        # Show more of the world in a bigger window, rather than stretching it
+        self.gui_camera.resize(width, height)
+        if self.renderer is not None:
+            self.renderer.resize()
+        else:
+            self.camera.resize(width, height)
+        self.throttle.mark_dirty()
+
+    def on_activate(self):
+        self.throttle.set_focused(True)
+
+    def on_deactivate(self):
+        self.throttle.set_focused(False)
 
     def on_key_press(self, symbol: int, modifiers: int):
+        self.throttle.notify_input()
         self.player.on_key_press(symbol, modifiers)
         self.page.on_key_press(symbol, modifiers)
 
     def on_key_release(self, symbol: int, modifiers: int):
+        self.throttle.notify_input()
         self.player.on_key_release(symbol, modifiers)
 
     def set_drawing_caption(self, displaying: bool):
@@ -251,7 +464,7 @@ class MyGame(arcade.Window):
             cap,
             # self.view_left + SCREEN_WIDTH * 0.3,
             # self.view_bottom + SCREEN_HEIGHT * 0.8,
-            start_x=SCREEN_WIDTH - 100,
+            start_x=self.width - 100,
             start_y=100,
             width=600,
             align="right",
@@ -286,15 +499,17 @@ class MyGame(arcade.Window):
         if self.player.bottom < bottom_boundary:
             self.view_bottom -= bottom_boundary - self.player.bottom
 
-        # Scroll to the proper location
+        # Ease towards the proper location. This runs once per simulation step; on_draw()
+        # interpolates between steps and moves the actual camera.
         position = Vec2(self.view_left, self.view_bottom)
-        self.camera.move_to(position, CAMERA_SPEED)
+        self.camera_position = self.camera_position.lerp(position, CAMERA_SPEED)
 
 
 def main():
     """Main function"""
     window = MyGame()
     window.setup()
+    window.resume_from_snapshot()
     # Christian's version
     # window.setupFallingTileRoom()
     arcade.run()
@@ -0,0 +1,122 @@
+"""
+Opt-in memory profiling for room transitions. Turn it on with MEMORY_PROFILING in constant.py.
+
+MyGame calls checkpoint() every time it builds the hub (setup()) or enters a room (setup_scene_from_level()).
+Each checkpoint takes a tracemalloc snapshot and logs how much memory each module gained or lost since the
+last one, along with how many sprites and textures the new scene holds. On exit, report() lists the modules
+that kept growing every time the same transition happened, which is what a leak looks like here.
+"""
+import gc
+import os
+import tracemalloc
+
+from constant import *
+from game_log import fields, get_logger
+
+log = get_logger("memory")
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+# Third-party packages worth telling apart from each other; everything else outside the repo is "other"
+KNOWN_PACKAGES = ["arcade", "pyglet", "PIL", "pytiled_parser", "pymunk"]
+
+
+def module_for_file(filename, project_root=PROJECT_ROOT):
+    """
+    The name an allocation is grouped under: the module name for files in this repo (e.g. numbers_and_math,
+    Rooms.room), the package name for the libraries in KNOWN_PACKAGES, and "other" for anything else.
+    """
+    filename = os.path.abspath(filename)
+    if filename.startswith(project_root + os.sep):
+        relative = os.path.relpath(filename, project_root)
+        return os.path.splitext(relative)[0].replace(os.sep, ".")
+    parts = filename.split(os.sep)
+    for package in KNOWN_PACKAGES:
+        if package in parts:
+            return package
+    return "other"
+
+
+def totals_by_module(snapshot):
+    """{module name: bytes allocated} for a tracemalloc snapshot, using each allocation's innermost frame."""
+    totals = {}
+    for stat in snapshot.statistics("filename"):
+        module = module_for_file(stat.traceback[0].filename)
+        totals[module] = totals.get(module, 0) + stat.size
+    return totals
+
+
+def scene_counts(scene):
+    """(sprites, distinct textures) in a scene."""
+    sprites = 0
+    textures = set()
+    for sprite_list in scene.sprite_lists:
+        sprites += len(sprite_list)
+        for sprite in sprite_list:
+            if sprite.texture is not None:
+                textures.add(sprite.texture.name)
+    return sprites, len(textures)
+
+
+def leak_suspects(history, min_visits=3):
+    """
+    Modules whose memory went up on every visit to the same transition.
+    history is {transition label: [totals_by_module() at each visit, in order]}.
+    Returns a list of (label, module, bytes grown from first to last visit), biggest first.
+    """
+    suspects = []
+    for label, visits in history.items():
+        if len(visits) < min_visits:
+            continue
+        for module in visits[-1]:
+            sizes = [visit.get(module, 0) for visit in visits]
+            if all(later > earlier for earlier, later in zip(sizes, sizes[1:])):
+                suspects.append((label, module, sizes[-1] - sizes[0]))
+    suspects.sort(key=lambda suspect: suspect[2], reverse=True)
+    return suspects
+
+
+class MemoryProfiler:
+
+    def __init__(self, enabled=MEMORY_PROFILING):
+        self.enabled = enabled
+        self._last_totals = None
+        self._history = {}
+
+    def start(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_PROFILE_FRAMES)
+
+    def checkpoint(self, label, scene=None):
+        """Snapshot memory right after a transition into label (e.g. "home" or a room name)."""
+        if not self.enabled:
+            return
+        # Whatever the transition dropped should be gone before we measure
+        gc.collect()
+        totals = totals_by_module(tracemalloc.take_snapshot())
+        self._history.setdefault(label, []).append(totals)
+
+        log.info("Entered", extra=fields(label=label, traced_kib=round(sum(totals.values()) / 1024)))
+        if scene is not None:
+            sprites, textures = scene_counts(scene)
+            log.info("Scene size", extra=fields(label=label, sprites=sprites, textures=textures))
+        if self._last_totals is not None:
+            deltas = [(module, size - self._last_totals.get(module, 0)) for module, size in totals.items()]
+            deltas.sort(key=lambda delta: abs(delta[1]), reverse=True)
+            for module, delta in deltas[:MEMORY_PROFILE_TOP]:
+                if delta != 0:
+                    log.info("Module memory changed", extra=fields(
+                        label=label, module=module, delta_kib=round(delta / 1024, 1)))
+        self._last_totals = totals
+
+    def report(self):
+        """Log the leak-suspect summary. Called on exit."""
+        if not self.enabled:
+            return
+        suspects = leak_suspects(self._history)
+        if len(suspects) == 0:
+            log.info("No module grew on every repeat of a transition")
+        for label, module, growth in suspects[:MEMORY_PROFILE_TOP]:
+            log.info("Module grew every time a transition was repeated", extra=fields(
+                label=label, module=module, growth_kib=round(growth / 1024, 1), visits=len(self._history[label])))
+        log.info("Player textures", extra=fields(count=len(PLAYER_TEXTURES)))
+        tracemalloc.stop()
@@ -2,14 +2,22 @@ import random
 import operator
 from enum import Enum
 import copy
+import time
 from constant import *
+from atlas import load_scaled_texture
+from game_log import fields, get_logger
+import telemetry
+
+log = get_logger("math")
 
 
 class NumberBlockHitbox(arcade.Sprite):
     def __init__(self, parent_block):
-        super().__init__(TRANSPARENT_BOX_PATH,
-                         scale=NUMBER_BLOCK_SCALING * 1.1,
-                         hit_box_algorithm="None",  # This is important
+        texture, scale = load_scaled_texture(TRANSPARENT_BOX_PATH, NUMBER_BLOCK_SCALING * 1.1,
+                                             hit_box_algorithm="None")
+        super().__init__(texture=texture,  # This is important
+                         scale=scale,
+                         hit_box_algorithm="None",
                          center_x=parent_block.center_x,
                          center_y=parent_block.center_y)
         self.parent_block = parent_block
@@ -54,22 +62,25 @@ class NumberBlock(arcade.Sprite):
         # This determines whether it is a left, right, middle, or standalone block.
         self.block_group_position: BlockGroupPosition = BlockGroupPosition.STANDALONE
         self.configure_texture()
-        self.scale = NUMBER_BLOCK_SCALING
         self._hit_box_algorithm = "None"
         # A reference to a TargetLocation that this block might be placed on
         self.target_location = None
+        # The NumberBlockGroup this block has been snapped into by the player, if any
+        self.group = None
         # Auxiliary sprites. One for the hitbox, another for the number/symbol.
         self.hit_box_sprite = NumberBlockHitbox(self)
-        self.symbol_sprite = arcade.Sprite(self._get_symbol_path(),
-                                           scale=NUMBER_SCALING,
+        symbol_texture, symbol_scale = load_scaled_texture(self._get_symbol_path(), NUMBER_SCALING,
+                                                           hit_box_algorithm="None")
+        self.symbol_sprite = arcade.Sprite(texture=symbol_texture,
+                                           scale=symbol_scale,
                                            hit_box_algorithm="None")
 
         # Add myself to a sprite list
-        scene.get_sprite_list(LAYER_NAME_NUMBER).append(self)
+        scene.numbers.append(self)
         # Add my hit box sprite to the other one
-        scene.get_sprite_list(LAYER_NAME_NUMBER_HITBOX).append(self.hit_box_sprite)
+        scene.number_hitboxes.append(self.hit_box_sprite)
         # And finally, add my symbol sprite list to that top layer
-        scene.get_sprite_list(LAYER_NAME_NUMBER_SYMBOLS).append(self.symbol_sprite)
+        scene.number_symbols.append(self.symbol_sprite)
 
     def move_to(self, x, y):
         """
@@ -84,10 +95,16 @@ class NumberBlock(arcade.Sprite):
         self.hit_box_sprite.center_y = y
         self.symbol_sprite.center_x = x
         self.symbol_sprite.center_y = y
+        self.scene.block_index.move(self)
+
+    def can_join_group(self) -> bool:
+        """Whether the player can snap this block together with others: a movable digit that isn't on a target."""
+        return isinstance(self.value, int) and self.target_location is None \
+            and (self.block_type == BlockType.MOVABLE or self.block_type == BlockType.INCORRECT)
 
     def auto_move(self):
         collision_list = arcade.check_for_collision_with_list(self,
-                                                              self.scene.get_sprite_list(LAYER_NAME_NUMBER_TARGETS))
+                                                              self.scene.number_targets)
         if len(collision_list) != 0:  # Player dropped the block on top of a Target Location
             assert (isinstance(collision_list[0], TargetLocation))
             self.target_location = pick_nearest_collision(self, collision_list)
@@ -95,19 +112,24 @@ class NumberBlock(arcade.Sprite):
         else:  # Player dropped the block out in the open
             if self.target_location is not None:
                 self.target_location.clear_number_block()
+                self.target_location = None
+            # Snap onto any digits it was dropped next to
+            NumberBlockGroup.of(self).snap()
 
     def set_block_type(self, block_type: BlockType):
-        self.block_type = block_type
-        self.configure_texture()
+        if block_type != self.block_type:
+            self.block_type = block_type
+            self.configure_texture()
 
     def set_block_group_position(self, pos: BlockGroupPosition):
-        self.block_group_position = pos
-        self.configure_texture()
+        if pos != self.block_group_position:
+            self.block_group_position = pos
+            self.configure_texture()
 
     def configure_texture(self):
         path = f"{CRATE_BASE_PATH}{self.block_type.value}{self.block_group_position.value}{IMG_PATH_EXT}"
         # print(path)  # For debugging purposes
-        self.texture = arcade.load_texture(path)
+        self.texture, self.scale = load_scaled_texture(path, NUMBER_BLOCK_SCALING)
 
     def _get_symbol_path(self):
         filename = ""
@@ -143,17 +165,28 @@ class NumberBlockGroup:
         self.center_x = x
         self.center_y = y
         self.block_template = block_template
+        # Dirty flags so move_to() and friends only redo the work that's actually out of date
+        self._layout_dirty = True
+        self._textures_dirty = True
+        self._value_dirty = False
         if from_number is None:
             self._blocks = blocks
-            self.value = self._compute_value()
+            self._value_dirty = True
         else:
             assert (blocks is None)
             try:
-                self.value = int(from_number)
+                self._value = int(from_number)
             except ValueError:
-                self.value = from_number
+                self._value = from_number
             self._blocks = self._make_blocks_from_number()
 
+    @property
+    def value(self):
+        if self._value_dirty:
+            self._value = self._compute_value()
+            self._value_dirty = False
+        return self._value
+
     def _compute_value(self):
         value = 0
         multiplier = 1
@@ -164,7 +197,7 @@ class NumberBlockGroup:
 
     def _make_blocks_from_number(self):
         blocks = []
-        temp_val = self.value
+        temp_val = self._value
 
         if isinstance(temp_val, str):
             blocks.append(self.block_template(self.scene, temp_val))
@@ -181,21 +214,176 @@ class NumberBlockGroup:
 
         return blocks
 
+    @classmethod
+    def of(cls, block: NumberBlock):
+        """
+        The group a movable block has been snapped into, or a new group of just that block at its current position.
+        Blocks only keep a group while it has more than one block in it (see _forget_if_single()), since a lone
+        block gets carried on its own and its group's position would go stale.
+        """
+        if block.group is None:
+            return cls(scene=block.scene, x=block.center_x, y=block.center_y, blocks=[block])
+        group = block.group
+        # Nothing should move a grouped block without its group, but the blocks are what's actually on screen
+        first = group._blocks[0]
+        group.center_x = first.center_x
+        group.center_y = first.center_y
+        return group
+
+    @classmethod
+    def rejoin(cls, blocks):
+        """Put blocks that were snapped together back into one group, left to right, e.g. after a restore."""
+        blocks = sorted(blocks, key=lambda block: block.center_x)
+        group = cls(scene=blocks[0].scene, x=blocks[0].center_x, y=blocks[0].center_y, blocks=blocks)
+        group._claim_blocks()
+        group.apply_changes()
+        return group
+
+    def _forget_if_single(self):
+        """A group that's down to one block is just that block again."""
+        if self.get_size() == 1 and self._blocks[0].group is self:
+            self._blocks[0].group = None
+
+    def _claim_blocks(self):
+        """Point every block at this group, if there's more than one of them."""
+        if self.get_size() > 1:
+            for block in self._blocks:
+                block.group = self
+
     def place_left(self, number_block):
         self._blocks.insert(0, number_block)
-        self._update_value()
-        self._update_textures()
+        self._blocks_changed()
+        if not self._value_dirty:
+            self._value += number_block.value * 10 ** (len(self._blocks) - 1)
+        self.apply_changes()
 
     def detach_right(self) -> NumberBlock:
-        return self._blocks.pop()
+        block = self._blocks.pop()
+        self._blocks_changed()
+        if not self._value_dirty:
+            self._value //= 10
+        self.apply_changes()
+        self._release(block)
+        return block
+
+    def detach_left(self) -> NumberBlock:
+        block = self._blocks.pop(0)
+        self._blocks_changed()
+        if not self._value_dirty:
+            self._value %= 10 ** len(self._blocks)
+        self.center_x += TILE_SIZE * TILE_SCALING
+        self.apply_changes()
+        self._release(block)
+        return block
+
+    def _release(self, block):
+        if block.group is self:
+            block.group = None
+        self._forget_if_single()
 
     def place_right(self, number_block):
         self._blocks.append(number_block)
-        self._update_value()
-        self._update_textures()
+        self._blocks_changed()
+        if not self._value_dirty:
+            self._value = self._value * 10 + number_block.value
+        self.apply_changes()
+
+    def merge_right(self, other):
+        """Move every block of other onto the right end of this group."""
+        if not self._value_dirty:
+            self._value = self._value * 10 ** other.get_size() + other.value
+        self._blocks.extend(other._blocks)
+        other._blocks = []
+        self._claim_blocks()
+        self._layout_dirty = True
+        self._textures_dirty = True
+        self.apply_changes()
+
+    def split_off(self, block: NumberBlock):
+        """
+        Take one block out of the group. If it was in the middle, the blocks to its right become a group of
+        their own. The block is left on its own, as a standalone block.
+        """
+        index = self._blocks.index(block)
+        if index == 0:
+            self.detach_left()
+        elif index == self.get_size() - 1:
+            self.detach_right()
+        else:
+            right = NumberBlockGroup(scene=self.scene, x=self._blocks[index + 1].center_x, y=self.center_y,
+                                     blocks=self._blocks[index + 1:])
+            right._claim_blocks()
+            right._forget_if_single()
+            right.apply_changes()
+            if not self._value_dirty:
+                self._value //= 10 ** (self.get_size() - index)
+            del self._blocks[index:]
+            self._blocks_changed()
+            self.apply_changes()
+            self._forget_if_single()
+        block.group = None
+        block.set_block_group_position(BlockGroupPosition.STANDALONE)
+
+    def snap(self):
+        """
+        Line the group up with the tile it was dropped on, and join up with any movable digits directly to its
+        left or right. Finding them is a lookup in the scene's AdjacencyIndex, not a collision check.
+        """
+        index = self.scene.block_index
+        self.move_to(*index.cell_center(index.cell_of(self.center_x, self.center_y)))
+
+        column, row = index.cell_of(self.center_x, self.center_y)
+        left = self._neighbour_group(index.at((column - 1, row)))
+        if left is not None:
+            left.merge_right(self)
+            return left.snap_right()
+        return self.snap_right()
+
+    def snap_right(self):
+        index = self.scene.block_index
+        column, row = index.cell_of(self.center_x, self.center_y)
+        right = self._neighbour_group(index.at((column + self.get_size(), row)))
+        if right is not None:
+            self.merge_right(right)
+        self._forget_if_single()
+        return self
+
+    def _neighbour_group(self, blocks):
+        for block in blocks:
+            if isinstance(block, NumberBlock) and block.group is not self and block.can_join_group():
+                return NumberBlockGroup.of(block)
+        return None
+
+    def drop(self, picked_up_at):
+        """
+        The player let go of this group, which they picked up at picked_up_at (x, y). If its leftmost digit landed
+        on an answer target with room for every digit, the digits go onto the targets one each. If it landed on
+        targets without room for it, it goes back where it was picked up instead of being left on top of them.
+        Otherwise it snaps in place like a single block would.
+        """
+        first = self._blocks[0]
+        collision_list = arcade.check_for_collision_with_list(first, self.scene.number_targets)
+        if len(collision_list) != 0:
+            target: TargetLocation = pick_nearest_collision(first, collision_list)
+            targets = target.problem.answer_target._blocks if target.problem is not None else [target]
+            start = targets.index(target)
+            slots = targets[start:start + self.get_size()]
+            if len(slots) == self.get_size() and all(slot.number_attempt is None for slot in slots):
+                blocks = list(self._blocks)
+                self._blocks = []
+                for block, slot in zip(blocks, slots):
+                    block.group = None
+                    block.set_block_group_position(BlockGroupPosition.STANDALONE)
+                    block.target_location = slot
+                    slot.place_number_block(block)
+                return
+        if any(arcade.check_for_collision_with_list(block, self.scene.number_targets) for block in self._blocks):
+            self.move_to(*picked_up_at)
+        self.snap()
 
-    def _update_value(self):
-        self.value = self._compute_value()
+    def _blocks_changed(self):
+        self._layout_dirty = True
+        self._textures_dirty = True
 
     def _update_locations(self):
         """
@@ -212,8 +400,8 @@ class NumberBlockGroup:
         so they appear as a single number rather than separate digits.
         """
         if self.block_template == NumberBlock:
+            size = self.get_size()
             for index, block in enumerate(self._blocks):
-                size = self.get_size()
                 if size == 1:
                     block.set_block_group_position(BlockGroupPosition.STANDALONE)
                 else:
@@ -229,20 +417,42 @@ class NumberBlockGroup:
             for block in self._blocks:
                 block.set_block_type(block_type)
 
+    def set_position(self, x, y):
+        """
+        Change where the group should be without moving the blocks yet. Call apply_changes()
+        afterwards, e.g. once a whole problem has been laid out.
+        """
+        if x != self.center_x or y != self.center_y:
+            self.center_x = x
+            self.center_y = y
+            self._layout_dirty = True
+
+    def apply_changes(self):
+        """
+        Bring the child blocks up to date with the group, redoing only what's dirty.
+        """
+        if self._layout_dirty:
+            self._update_locations()
+            self._layout_dirty = False
+        if self._textures_dirty:
+            self._update_textures()
+            self._textures_dirty = False
+
     def move_to(self, x, y):
         """
         Use this when trying to move the block group rather than editing center_x
         and center_y directly. This ensures the child blocks get moved along properly
         as well.
         """
-        self.center_x = x
-        self.center_y = y
-        self._update_locations()
-        self._update_textures()
+        self.set_position(x, y)
+        self.apply_changes()
 
     def get_size(self):
         return len(self._blocks)
 
+    def get_blocks(self):
+        return list(self._blocks)
+
     def is_correct(self):
         assert (self.block_template == TargetLocation)
         for target in self._blocks:
@@ -253,7 +463,7 @@ class NumberBlockGroup:
 
     def log(self):
         for block in self._blocks:
-            print(str(block))
+            log.debug(str(block))
 
 
 class TargetLocation(arcade.Sprite):
@@ -264,11 +474,12 @@ class TargetLocation(arcade.Sprite):
     def __init__(self, scene, expected_value):
         super().__init__()
 
-        self.texture = arcade.load_texture(TARGET_BOX)
-        self.scale = NUMBER_BLOCK_SCALING
+        self.texture, self.scale = load_scaled_texture(TARGET_BOX, NUMBER_BLOCK_SCALING)
         self.expected_value = expected_value
         self.number_attempt = None
-        scene.get_sprite_list(LAYER_NAME_NUMBER_TARGETS).append(self)
+        # The VisualMathProblem this target belongs to, for recording attempts
+        self.problem = None
+        scene.number_targets.append(self)
 
     def move_to(self, x, y):
         """
@@ -295,11 +506,13 @@ class TargetLocation(arcade.Sprite):
             block.move_to(self.center_x, self.center_y)
             self.number_attempt = block
 
-            if self.is_correct():
+            correct = self.is_correct()
+            if correct:
                 self.number_attempt.set_block_type(BlockType.CORRECT)
             else:
-                # If we wanted to keep track of failed attempts for a score, this would be where we'd do it
                 self.number_attempt.set_block_type(BlockType.INCORRECT)
+            if self.problem is not None:
+                self.problem.record_attempt(block.value, correct)
         else:
             pass
 
@@ -314,13 +527,19 @@ class SimpleMathProblem:
     operation.
     """
 
-    def __init__(self, min_value=1, max_value=10, operator_str=None):
+    def __init__(self, min_value=PROBLEM_MIN_OPERAND, max_value=PROBLEM_MAX_OPERAND, operator_str=None, values=None):
         self.operators = {
             "+": operator.add,
             "-": operator.sub,
             "*": operator.mul,
             "/": operator.truediv,
         }
+        if values is not None:
+            # Rebuilding a problem that was already generated (e.g. from a save file), so don't roll new numbers
+            self.min_value = min_value
+            self.max_value = max_value
+            self.lhs, self.rhs, self.operator, self.answer = values
+            return
         finished = False
         while not finished:
             self.setup(operator_str)
@@ -329,14 +548,14 @@ class SimpleMathProblem:
                 finished = True
 
     def setup(self, operator_str):
-        self.min_value = 1
-        self.max_value = 10
+        self.min_value = PROBLEM_MIN_OPERAND
+        self.max_value = PROBLEM_MAX_OPERAND
         self.lhs = random.randint(self.min_value, self.max_value)
         self.rhs = random.randint(self.min_value, self.max_value)
         if operator_str is None:
             self.operator = self.get_random_operator()
         else:
-            print(operator_str)
+            log.debug("Setting up problem", extra=fields(operator=operator_str))
             assert (operator_str in self.operators.keys())
             self.operator = operator_str
         self.answer = self.get_answer()
@@ -375,16 +594,20 @@ class VisualMathProblem:
     the result are all represented.
     """
 
-    def __init__(self, scene, center_x=0, center_y=0, min=None, max=None, operator_str=None):
+    def __init__(self, scene, center_x=0, center_y=0, min=None, max=None, operator_str=None, snapshot=None):
         """
         Params:
         :operator_str: a string with a math operator. Either "+", "-", "*", or "/".
+        :snapshot: a ProblemSnapshot (see save_state.py) to rebuild this problem from instead of generating one.
         """
         self.scene = scene
         self.center_x = center_x
         self.center_y = center_y
-        self.sprite_list = self.scene.get_sprite_list(LAYER_NAME_NUMBER)
-        self.problem = get_clean_problem(min, max, operator_str)
+        self.sprite_list = self.scene.numbers
+        if snapshot is None:
+            self.problem = get_clean_problem(min, max, operator_str)
+        else:
+            self.problem = SimpleMathProblem(values=(snapshot.lhs, snapshot.rhs, snapshot.operator, snapshot.answer))
 
         # Number Block Groups
         self.lhs = NumberBlockGroup(scene=self.scene, from_number=self.problem.lhs)
@@ -403,14 +626,26 @@ class VisualMathProblem:
 
         self.answer_target = NumberBlockGroup(block_template=TargetLocation, scene=self.scene,
                                               from_number=self.problem.answer)
+        for target in self.answer_target._blocks:
+            target.problem = self
 
-        self.answer_blocks = NumberBlockGroup(block_template=NumberBlock, scene=self.scene,
-                                              from_number=self.problem.answer)
+        # For telemetry. room_name is filled in by Level.setup_problems()
+        self.room_name = None
+        self.shown_at = None
 
-        self.movable_blocks = self.answer_blocks._blocks
+        if snapshot is None:
+            self.answer_blocks = NumberBlockGroup(block_template=NumberBlock, scene=self.scene,
+                                                  from_number=self.problem.answer)
 
-        for i in range(0, 5):
-            self.movable_blocks.append(NumberBlock(scene=self.scene, value=random.randint(0, 9)))
+            self.movable_blocks = self.answer_blocks._blocks
+
+            for i in range(0, 5):
+                self.movable_blocks.append(NumberBlock(scene=self.scene, value=random.randint(0, 9)))
+        else:
+            self.answer_blocks = NumberBlockGroup(block_template=NumberBlock, scene=self.scene,
+                                                  blocks=[NumberBlock(scene=self.scene, value=block.value)
+                                                          for block in snapshot.blocks])
+            self.movable_blocks = self.answer_blocks._blocks
 
         # Configure The Problem
         self.lhs.set_block_type(BlockType.IMMOVABLE)
@@ -429,19 +664,28 @@ class VisualMathProblem:
         self.answer_range_x_offset = 320
         self.answer_row_selection_padding = 100
 
-    def draw(self):
+    def draw(self, shuffle=True):
+        """
+        Lay the problem out, with the movable blocks in a row above it. They're shuffled first unless shuffle
+        is False, which restoring from a snapshot needs so each block still lines up with its BlockSnapshot.
+        """
         x = self.center_x
         y = self.center_y
         space = TILE_SIZE * TILE_SCALING
         for chunk in self.draw_order:
             size = chunk.get_size()
-            chunk.move_to(x, y)
+            chunk.set_position(x, y)
 
             # Move over to the next space
             x += space * size + space
 
+        # Now that the whole problem is laid out, move all the blocks in one go
+        for chunk in self.draw_order:
+            chunk.apply_changes()
+
         current_x_increment = 0
-        random.shuffle(self.movable_blocks)
+        if shuffle:
+            random.shuffle(self.movable_blocks)
         for block in self.movable_blocks:
             block.move_to(
                 self.center_x + current_x_increment, 
@@ -449,10 +693,36 @@ class VisualMathProblem:
             )
             current_x_increment += self.answer_row_selection_padding
 
+    def restore_blocks(self, snapshot):
+        """
+        Put the movable blocks back where a ProblemSnapshot says they were, including
+        their block types and whichever TargetLocation each one was sitting on.
+        """
+        targets = self.answer_target._blocks
+        for block, block_snapshot in zip(self.movable_blocks, snapshot.blocks):
+            block.move_to(block_snapshot.x, block_snapshot.y)
+            block.set_block_type(list(BlockType)[block_snapshot.block_type])
+            if 0 <= block_snapshot.target_index < len(targets):
+                block.target_location = targets[block_snapshot.target_index]
+                block.target_location.number_attempt = block
+
     def log(self):
         for block in self.draw_order:
             block.log()
 
+    def mark_shown(self):
+        """Remember when the player first saw this problem."""
+        if self.shown_at is None:
+            self.shown_at = time.monotonic()
+
+    def record_attempt(self, value, correct):
+        seconds_since_shown = None
+        if self.shown_at is not None:
+            seconds_since_shown = time.monotonic() - self.shown_at
+        problem = self.problem
+        telemetry.recorder.record(self.room_name, f"{problem.lhs}{problem.operator}{problem.rhs}",
+                                  value, correct, seconds_since_shown)
+
     def is_solved(self) -> bool:
         """
         Function will check if the problem has been solved and will return True/False.
@@ -486,6 +756,9 @@ class VisualMathProblemLocation(arcade.Sprite):
         self.vmp = None
         self.operator = operator_str
 
-    def setup(self, scene):
-        self.vmp = VisualMathProblem(scene, self.center_x, self.center_y, operator_str=self.operator)
-        self.vmp.draw()
+    def setup(self, scene, snapshot=None):
+        self.vmp = VisualMathProblem(scene, self.center_x, self.center_y, operator_str=self.operator,
+                                     snapshot=snapshot)
+        self.vmp.draw(shuffle=snapshot is None)
+        if snapshot is not None:
+            self.vmp.restore_blocks(snapshot)
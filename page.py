@@ -1,6 +1,7 @@
 import arcade
 
-from constant import PAGE_TEXTURE, PLAYER_TEXTURES, SCREEN_HEIGHT, SCREEN_WIDTH
+from atlas import load_texture
+from constant import PAGE_TEXTURE, PAGE_TEXTURE_PATHS, PLAYER_TEXTURES, SCREEN_HEIGHT, SCREEN_WIDTH
 
 
 class Page(arcade.Sprite):
@@ -14,13 +15,13 @@ class Page(arcade.Sprite):
         self.texture = None
 
         PAGE_TEXTURE.append(
-            arcade.load_texture("assets/start.png")
+            load_texture(PAGE_TEXTURE_PATHS[0])
         )
         PAGE_TEXTURE.append(
-            arcade.load_texture("assets/end.png")
+            load_texture(PAGE_TEXTURE_PATHS[1])
         )
         PAGE_TEXTURE.append(
-            arcade.load_texture("assets/transparent.png")
+            load_texture(PAGE_TEXTURE_PATHS[2])
         )
         self.texture = PAGE_TEXTURE[0]
 
@@ -0,0 +1,40 @@
+"""
+Physics for the player that knows about carried blocks.
+
+Blocks the player is carrying stay in the Numbers sprite list (which the physics engine treats as walls)
+instead of being moved to another sprite list on every grab and drop, so the engine has to skip them itself.
+"""
+from constant import *
+
+
+class PlayerPhysicsEngine(arcade.PhysicsEngineSimple):
+
+    def update(self):
+        carried = self.player_sprite.carried_blocks()
+        if len(carried) == 0:
+            # Nothing to ignore, so arcade's own movement works fine
+            return super().update()
+
+        player = self.player_sprite
+        self._move_axis(player.change_x, 0, carried)
+        self._move_axis(0, player.change_y, carried)
+
+    def _move_axis(self, change_x, change_y, ignored):
+        """Move the player along one axis and snap them back against anything they ran into."""
+        if change_x == 0 and change_y == 0:
+            return
+        player = self.player_sprite
+        player.center_x += change_x
+        player.center_y += change_y
+
+        for item in arcade.check_for_collision_with_lists(player, self.walls):
+            if item in ignored:
+                continue
+            if change_x > 0:
+                player.right = min(item.left, player.right)
+            elif change_x < 0:
+                player.left = max(item.right, player.left)
+            elif change_y > 0:
+                player.top = min(item.bottom, player.top)
+            else:
+                player.bottom = max(item.top, player.bottom)
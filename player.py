@@ -2,6 +2,9 @@ from enum import Enum
 
 from constant import *
 from numbers_and_math import NumberBlock, BlockType, NumberBlockHitbox
+from animation import AnimationClip
+from atlas import load_texture
+from interaction import InteractionTracker
 
 
 class PlayerOrientation(Enum):
@@ -15,6 +18,8 @@ class Player(arcade.Sprite):
     def __init__(self, window):
         super().__init__()
         self._block_position_offset = None
+        # Where the carried block or group was grabbed, to put it back if it can't be dropped
+        self._picked_up_at = None
         self.window = window
 
         self.left_pressed = False
@@ -26,16 +31,26 @@ class Player(arcade.Sprite):
 
         self.orientation: PlayerOrientation = PlayerOrientation.DOWN
         self.block = None
+        # What moves with the player: the grabbed block, or the whole NumberBlockGroup it's snapped into
+        self.carrying = None
+        # Sends on_block_enter/on_block_exit when the player walks up to or away from a NumberBlock
+        self.interaction = InteractionTracker(self, self.find_nearby_block, self.on_block_enter, self.on_block_exit)
 
         # Load Textures
         PLAYER_TEXTURES.append(
-            arcade.load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_08.png"))  # Up
+            load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_08.png"))  # Up
         PLAYER_TEXTURES.append(
-            arcade.load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_05.png"))  # Down
+            load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_05.png"))  # Down
         PLAYER_TEXTURES.append(
-            arcade.load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_20.png"))  # Left
+            load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_20.png"))  # Left
         PLAYER_TEXTURES.append(
-            arcade.load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_17.png"))  # Right
+            load_texture("assets/kenney_sokobanpack/PNG/Default size/Player/player_17.png"))  # Right
+
+        # Walk animations, one per orientation
+        self.walk_clips = {
+            orientation: AnimationClip([load_texture(path) for path in PLAYER_WALK_TEXTURE_PATHS[orientation.value]])
+            for orientation in PlayerOrientation
+        }
 
         # Set up the player, specifically placing it at these coordinates.
         self.center_x = 1860
@@ -51,17 +66,12 @@ class Player(arcade.Sprite):
 
     def update(self):
         """
-        Frame-by-frame logic for the player object. Called by window.on_update().
+        Step-by-step logic for the player object. Called by window.simulation_step().
         """
         self.update_player_speed()
         self.texture_update()
-        try:
-            self.check_for_block_collisions()
-        except AttributeError:
-            pass
+        self.interaction.update()
         self._move_block()
-        if self.block is not None and not self.space_pressed:
-            self.release_block()
 
     def update_player_speed(self):
         """
@@ -99,6 +109,8 @@ class Player(arcade.Sprite):
             self.right_pressed = True
         elif key == arcade.key.SPACE:
             self.space_pressed = True
+            if self.block is None and self.interaction.target is not None:
+                self.grab_block(self.interaction.target)
         elif key == arcade.key.LSHIFT or key == arcade.key.RSHIFT:
             self.shift_pressed = True
 
@@ -115,11 +127,16 @@ class Player(arcade.Sprite):
             self.right_pressed = False
         elif key == arcade.key.SPACE:
             self.space_pressed = False
+            if self.block is not None:
+                self.release_block()
         elif key == arcade.key.LSHIFT or key == arcade.key.RSHIFT:
             self.shift_pressed = False
 
     def texture_update(self):
-        """Change the player's texture based on Orientation."""
+        """
+        Change the player's texture based on Orientation, playing the walk animation
+        for that orientation while the player is moving.
+        """
 
         if self.up_pressed:
             self.orientation = PlayerOrientation.UP
@@ -129,61 +146,90 @@ class Player(arcade.Sprite):
             self.orientation = PlayerOrientation.LEFT
         if self.right_pressed:
             self.orientation = PlayerOrientation.RIGHT
-        self.texture = PLAYER_TEXTURES[self.orientation.value]
+        if self.change_x != 0 or self.change_y != 0:
+            self.window.animator.play(self, self.walk_clips[self.orientation])
+        else:
+            self.window.animator.stop(self)
+            self.texture = PLAYER_TEXTURES[self.orientation.value]
 
     def grab_block(self, block: NumberBlock):
         """
         Grab a given NumberBlock if it is movable. This will set the
         relative block offset at the moment the player grabbed it.
+        The block stays in its sprite lists (the Numbers layer already draws above the player),
+        and PlayerPhysicsEngine ignores it while it's being carried.
         """
         if block.block_type == BlockType.MOVABLE \
                 or block.block_type == BlockType.INCORRECT:
             self.block = block
+            # Digits the player snapped together are carried together, unless shift is held to pull one off
+            self.carrying = block
+            if block.group is not None and block.group.get_size() > 1:
+                if self.shift_pressed:
+                    block.group.split_off(block)
+                else:
+                    self.carrying = block.group
+            self._picked_up_at = (self.carrying.center_x, self.carrying.center_y)
             self._block_position_offset = self._get_block_position_offset()
-            block.remove_from_sprite_lists()
-            self.window.scene.get_sprite_list(LAYER_NAME_PLAYER).append(block)
+            self.window.set_drawing_caption(False)
+            self.interaction.invalidate()
 
     def release_block(self):
         """
         Let go of whatever block the player is holding by setting self.block to None.
-        Called every time the space bar is released.
+        Called when the space bar is released while holding a block.
         """
         # Moved the call to NumberBlock.auto_move() here instead of inside move_block.
         # This makes it so the player only drops off the block once the space bar is released.
         # Reduces the amount of collision checking that has to happen which should improve performance.
-        self.block.auto_move()
-        self.block.remove_from_sprite_lists()
-        self.window.scene.get_sprite_list(LAYER_NAME_NUMBER).append(self.block)
+        if self.carrying is self.block:
+            self.block.auto_move()
+        else:
+            self.carrying.drop(self._picked_up_at)
         self.block = None
+        self.carrying = None
         self.window.update_score()
+        # The dropped block may have snapped somewhere else, so look again
+        self.interaction.invalidate()
 
-    def check_for_block_collisions(self):
-        """
-        This is the function that checks if this (the player object) is colliding
-        with the hitboxes of any NumberBlocks. It also handles displaying the caption.
-        """
-        if self.block is None:
-            blocks = arcade.check_for_collision_with_list(self,
-                                                          self.window.scene.get_sprite_list(LAYER_NAME_NUMBER_HITBOX))
-            if len(blocks) != 0:
-                assert (isinstance(blocks[0], NumberBlockHitbox))
-                hitbox: NumberBlockHitbox = pick_nearest_collision(self, blocks)
-                try:
-                    block: NumberBlock = hitbox.parent_block
-                except AttributeError:
-                    print("Hitbox has no attached parent_block for some reason")
-                    raise AttributeError
-                # Make sure this block is actually a NumberBlock
-                assert (isinstance(block, NumberBlock))
-                if self.space_pressed:
-                    self.grab_block(block)
-                    self.window.set_drawing_caption(False)
-                else:
-                    if block.block_type == BlockType.MOVABLE \
-                            or block.block_type == BlockType.INCORRECT:
-                        self.window.set_drawing_caption(True)
-            else:
-                self.window.set_drawing_caption(False)
+    def carried_blocks(self):
+        """Every block moving along with the player."""
+        if self.carrying is None:
+            return []
+        if self.carrying is self.block:
+            return [self.block]
+        return self.carrying.get_blocks()
+
+    def find_nearby_block(self):
+        """
+        Returns the NumberBlock whose hitbox this (the player object) is touching, or None.
+        Only called by self.interaction when the player has moved to a new cell.
+        """
+        if self.block is not None:
+            return None
+        blocks = arcade.check_for_collision_with_list(self,
+                                                      self.window.scene.number_hitboxes)
+        if len(blocks) == 0:
+            return None
+        assert (isinstance(blocks[0], NumberBlockHitbox))
+        hitbox: NumberBlockHitbox = pick_nearest_collision(self, blocks)
+        if hitbox is None:
+            return None
+        block: NumberBlock = hitbox.parent_block
+        # Make sure this block is actually a NumberBlock
+        assert (isinstance(block, NumberBlock))
+        return block
+
+    def on_block_enter(self, block: NumberBlock):
+        """The player walked up to a block. Grab it if space is held, otherwise show the caption."""
+        if self.space_pressed:
+            self.grab_block(block)
+        elif block.block_type == BlockType.MOVABLE \
+                or block.block_type == BlockType.INCORRECT:
+            self.window.set_drawing_caption(True)
+
+    def on_block_exit(self, block: NumberBlock):
+        self.window.set_drawing_caption(False)
 
     def _move_block(self):
         """
@@ -193,7 +239,7 @@ class Player(arcade.Sprite):
         the player is grabbing gets moved along with the player.
         """
         if self.block is not None:
-            self.block.move_to(
+            self.carrying.move_to(
                 self.center_x + self._block_position_offset[0],
                 self.center_y + self._block_position_offset[1]
             )
@@ -204,8 +250,8 @@ class Player(arcade.Sprite):
         a given instant in time.
         """
         assert (self.block is not None)
-        offset_x = self.block.center_x - self.center_x
-        offset_y = self.block.center_y - self.center_y
+        offset_x = self.carrying.center_x - self.center_x
+        offset_y = self.carrying.center_y - self.center_y
         offset = 1
         if self.orientation == PlayerOrientation.UP:
             offset_y += offset
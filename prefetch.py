@@ -0,0 +1,101 @@
+"""
+Builds rooms before the player walks into them. Building a room (loading its map, generating its problems and
+working out its guidance flow field) takes long enough to drop frames, and it used to happen in the frame the
+player touched the door. RoomPrefetcher watches how close the player is to each door, and once they're within
+PREFETCH_RADIUS it has the RoomCache build the door's room ahead of time, so going through the door only has
+to swap scenes. The build is spread out one stage per simulation step (parsing the map, a band of rows of each
+layer's sprites, the problems, then on_prefetch), so no single step takes long enough to drop frames.
+
+Counts how well that works: a hit is entering a room that was prefetched, a miss is entering a room that still
+had to be built (or finished) at the door, and a wasted prefetch is a room that was evicted again before the
+player went in.
+"""
+from constant import *
+from game_log import fields, get_logger
+from room_cache import RoomCache
+
+log = get_logger("rooms")
+
+
+class RoomPrefetcher:
+
+    def __init__(self, rooms: RoomCache, radius=PREFETCH_RADIUS, on_prefetch=None, gc_policy=None):
+        """
+        Params:
+        :on_prefetch: called with each prefetched Level and the door leading to it, to warm anything
+        else that would otherwise be done on entry.
+        :gc_policy: a GCPolicy to run each stage of the build under (see GCPolicy.build_ahead()), if any.
+        """
+        self.rooms = rooms
+        self.radius = radius
+        self.on_prefetch = on_prefetch
+        self.gc_policy = gc_policy
+        # The door whose room is being built, and (name, Level, door) for a built room waiting for on_prefetch
+        self._door = None
+        self._warming = None
+        # Rooms built ahead of time that the player hasn't entered yet
+        self._prefetched = set()
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+
+    def update(self, player, doors, current=None):
+        """
+        Called every simulation step, with the name of the room the player is in (None in the hub). Does at most
+        one stage of building per call.
+        """
+        if self._warming is not None:
+            _, level, door = self._warming
+            self._warming = None
+            self._build_ahead(lambda: self.on_prefetch(level, door))
+            return
+        if self._door is not None:
+            level = self._build_ahead(lambda: self.rooms.prefetch_step(current))
+            if level is not None:
+                name = self._door.target_room_string
+                self._prefetched.add(name)
+                if self.on_prefetch is not None:
+                    self._warming = (name, level, self._door)
+                self._door = None
+            return
+
+        radius_squared = self.radius ** 2
+        for door in doors:
+            name = door.target_room_string
+            if name not in self.rooms or self.rooms.is_loaded(name):
+                continue
+            if (player.center_x - door.center_x) ** 2 + (player.center_y - door.center_y) ** 2 > radius_squared:
+                continue
+            log.debug("Prefetching room", extra=fields(room=name))
+            self.rooms.prefetch(name)
+            self._door = door
+            return
+
+    def entered(self, name):
+        """Call just before entering a room, while it's still known whether it had to be built."""
+        if self._warming is not None and self._warming[0] == name:
+            # Entering does the warming anyway
+            self._warming = None
+        if self._door is not None and self._door.target_room_string == name:
+            # The rest of the build happens on the way in
+            self._door = None
+            self.misses += 1
+        elif name in self._prefetched:
+            self._prefetched.discard(name)
+            self.hits += 1
+        elif name in self.rooms and not self.rooms.is_loaded(name):
+            self.misses += 1
+
+    def evicted(self, name):
+        if name in self._prefetched:
+            self._prefetched.discard(name)
+            self.wasted += 1
+
+    def _build_ahead(self, work):
+        if self.gc_policy is None:
+            return work()
+        with self.gc_policy.build_ahead("prefetch"):
+            return work()
+
+    def report(self):
+        log.info("Room prefetch", extra=fields(hits=self.hits, misses=self.misses, wasted=self.wasted))
@@ -0,0 +1,145 @@
+"""
+Dynamic resolution scaling, so slow classroom GPUs keep a steady frame rate however big the window is.
+
+The world is drawn into an offscreen framebuffer at a fraction of the window's resolution, then stretched over
+the window. ResolutionScaler times how long the GPU spends drawing the world each frame and picks that
+fraction: lower when the frame goes over RENDER_TIME_BUDGET, higher again once the predicted cost at the next
+step up fits. The GUI (score, caption) is drawn straight to the window afterwards, so text stays sharp.
+"""
+import arcade
+from arcade.gl import geometry
+from pyglet.math import Mat4
+
+from constant import *
+from game_log import fields, get_logger
+
+log = get_logger("render")
+
+UPSCALE_VERTEX_SHADER = """
+#version 330
+in vec2 in_vert;
+in vec2 in_uv;
+out vec2 uv;
+
+void main() {
+    gl_Position = vec4(in_vert, 0.0, 1.0);
+    uv = in_uv;
+}
+"""
+UPSCALE_FRAGMENT_SHADER = """
+#version 330
+uniform sampler2D source;
+in vec2 uv;
+out vec4 color;
+
+void main() {
+    color = texture(source, uv);
+}
+"""
+
+
+class ResolutionScaler:
+
+    def __init__(self, budget=RENDER_TIME_BUDGET, minimum=RENDER_SCALE_MIN, maximum=RENDER_SCALE_MAX,
+                 step=RENDER_SCALE_STEP, cooldown=RENDER_SCALE_COOLDOWN):
+        self.budget = budget
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.cooldown = cooldown
+        self.scale = maximum
+        # Smoothed draw time, so one slow frame doesn't change the resolution
+        self.average = None
+        self._frames_until_change = cooldown
+
+    def record(self, draw_time):
+        """Called with each frame's draw time in seconds. Returns True if the scale changed."""
+        if self.average is None:
+            self.average = draw_time
+        else:
+            self.average += (draw_time - self.average) * RENDER_TIME_SMOOTHING
+        if self._frames_until_change > 0:
+            self._frames_until_change -= 1
+            return False
+
+        scale = self.scale
+        if self.average > self.budget:
+            scale = max(self.minimum, scale - self.step)
+        else:
+            # Drawing cost goes with the number of pixels, so with the square of the scale
+            larger = min(self.maximum, scale + self.step)
+            if self.average * (larger / scale) ** 2 < self.budget * RENDER_SCALE_HEADROOM:
+                scale = larger
+        scale = round(scale, 2)
+        if scale == self.scale:
+            return False
+
+        self.scale = scale
+        self._frames_until_change = self.cooldown
+        log.debug("Render scale changed", extra=fields(scale=scale, draw_ms=round(self.average * 1000, 2)))
+        return True
+
+
+class ScaledRenderer:
+
+    def __init__(self, window: arcade.Window, camera: arcade.Camera, scaler=None):
+        """
+        Params:
+        :camera: the camera the world is drawn with. Its viewport follows the framebuffer size, and its
+        projection the window size, so the same part of the world is shown at any scale.
+        """
+        self.window = window
+        self.camera = camera
+        self.scaler = scaler if scaler is not None else ResolutionScaler()
+        ctx = window.ctx
+        self._program = ctx.program(vertex_shader=UPSCALE_VERTEX_SHADER, fragment_shader=UPSCALE_FRAGMENT_SHADER)
+        self._quad = geometry.quad_2d_fs()
+        # Reading a query the frame it ends waits for the GPU to finish, so each frame's draw time is read
+        # RENDER_TIME_QUERIES - 1 frames later, when the query is about to be reused
+        self._queries = [ctx.query(samples=False, time=True, primitives=False) for _ in range(RENDER_TIME_QUERIES)]
+        self._frames = 0
+        self._texture = None
+        self._framebuffer = None
+        self.resize()
+
+    def render_size(self):
+        scale = self.scaler.scale
+        return max(1, round(self.window.width * scale)), max(1, round(self.window.height * scale))
+
+    def resize(self):
+        """Call when the window or the scale changes. Remakes the framebuffer if its size changed."""
+        size = self.render_size()
+        if self._texture is None or self._texture.size != size:
+            ctx = self.window.ctx
+            self._texture = ctx.texture(size, components=4)
+            # Smooth out the stretch instead of showing blocky pixels
+            self._texture.filter = ctx.LINEAR, ctx.LINEAR
+            self._framebuffer = ctx.framebuffer(color_attachments=[self._texture])
+        # Camera.resize() would set the projection to the framebuffer size too, so set the two separately
+        self.camera.viewport_width, self.camera.viewport_height = size
+        self.camera.projection_matrix = Mat4.orthogonal_projection(
+            0, self.window.width, 0, self.window.height, self.camera.near, self.camera.far)
+
+    def draw(self, draw_world):
+        """
+        Calls draw_world() with the offscreen framebuffer bound, then stretches it over the window.
+        Returns True if the resolution changed, in which case the next frame needs drawing too.
+        """
+        self._framebuffer.use()
+        self._framebuffer.clear(self.window.background_color)
+        with self._queries[self._frames % len(self._queries)]:
+            draw_world()
+        self._frames += 1
+
+        self.window.ctx.screen.use()
+        self._texture.use(0)
+        self._quad.render(self._program)
+
+        if self._frames < len(self._queries):
+            return False
+        # The oldest query, which is the one the next frame reuses
+        oldest = self._queries[self._frames % len(self._queries)]
+        if self.scaler.record(oldest.time_elapsed / 1e9):
+            self.resize()
+            return True
+        return False
@@ -0,0 +1,120 @@
+"""
+Keeps at most MAX_LOADED_ROOMS rooms loaded at once. Rooms are built the first time they're entered, and the
+least-recently-visited ones are evicted down to a LevelSnapshot (see save_state.py) once the budget is
+exceeded. Going back into an evicted room rebuilds its scene from that snapshot, so no progress is lost.
+
+Rooms can also be prefetched: built a stage at a time ahead of a visit (see prefetch.py). That isn't a visit, so
+a prefetched room is the first in line to be evicted until the player actually goes in.
+"""
+from collections import OrderedDict
+
+from constant import *
+from save_state import snapshot_level
+
+
+class RoomCache:
+
+    def __init__(self, room_classes, budget=MAX_LOADED_ROOMS, snapshots=None, on_load=None, on_evict=None):
+        """
+        Params:
+        :room_classes: {room name: callable returning a Level}. Each is called with an optional LevelSnapshot,
+        and for prefetch() with staged=True as well.
+        :snapshots: {room name: LevelSnapshot} to start from, e.g. from a save file.
+        :on_load: called with each Level right after it's built or rehydrated.
+        :on_evict: called with each Level right before it's evicted.
+        """
+        assert (budget >= 1)
+        self.room_classes = room_classes
+        self.budget = budget
+        self.on_load = on_load
+        self.on_evict = on_evict
+        # Most recently visited room last
+        self._loaded = OrderedDict()
+        self._evicted = dict(snapshots) if snapshots is not None else {}
+        # (room name, Level) being built a stage at a time by prefetch_step(), or None
+        self._building = None
+
+    def __contains__(self, name):
+        return name in self.room_classes
+
+    def get(self, name):
+        """
+        Returns the Level for a room, building or rehydrating it if it isn't loaded.
+        Counts as a visit, so it may evict other rooms.
+        """
+        level = self._loaded.get(name)
+        if level is None and self.is_building(name):
+            # Got here before the prefetch was done, so finish it now
+            level = self._building[1]
+            self._building = None
+            level.finish_building()
+            self._evicted.pop(name, None)
+            self._loaded[name] = level
+            if self.on_load is not None:
+                self.on_load(level)
+        elif level is None:
+            level = self.room_classes[name](self._evicted.pop(name, None))
+            self._loaded[name] = level
+            if self.on_load is not None:
+                self.on_load(level)
+        self._loaded.move_to_end(name)
+        self._evict_over_budget()
+        return level
+
+    def prefetch(self, name):
+        """
+        Starts building a room ahead of a visit; prefetch_step() does the actual building. Does nothing if the room
+        is already loaded or another one is being built.
+        """
+        if name in self._loaded or self._building is not None:
+            return
+        self._building = (name, self.room_classes[name](self._evicted.get(name), staged=True))
+
+    def prefetch_step(self, current=None):
+        """
+        Runs the next stage of the room being prefetched. Once it's built it joins the loaded rooms as the least
+        recently visited one, without counting as a visit. Making room for it never evicts the room current
+        (the one the player is in) or the prefetched room itself. Returns the Level once it's built, else None.
+        """
+        if self._building is None:
+            return None
+        name, level = self._building
+        if not level.build_step():
+            return None
+        self._building = None
+        # The snapshot stays in _evicted until now, so a room that's still building never loses its progress
+        self._evicted.pop(name, None)
+        self._loaded[name] = level
+        self._loaded.move_to_end(name, last=False)
+        if self.on_load is not None:
+            self.on_load(level)
+        self._evict_over_budget(keep={name, current})
+        return level
+
+    def is_building(self, name=None):
+        """Whether a prefetch is in progress, or with a name, whether it's for that room."""
+        return self._building is not None and (name is None or self._building[0] == name)
+
+    def is_loaded(self, name):
+        return name in self._loaded
+
+    def loaded_levels(self):
+        return list(self._loaded.values())
+
+    def snapshot_all(self):
+        """{room name: LevelSnapshot} for every room that has any state, loaded or not."""
+        snapshots = dict(self._evicted)
+        for name, level in self._loaded.items():
+            snapshots[name] = snapshot_level(level)
+        return snapshots
+
+    def _evict_over_budget(self, keep=()):
+        while len(self._loaded) > self.budget:
+            name = next((name for name in self._loaded if name not in keep), None)
+            if name is None:
+                return
+            level = self._loaded.pop(name)
+            if self.on_evict is not None:
+                self.on_evict(level)
+            self._evicted[name] = snapshot_level(level)
+            level.unload()
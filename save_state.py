@@ -0,0 +1,226 @@
+"""
+Compact save/restore of every room's state so the game can resume where the student left off.
+
+A snapshot is packed with struct into a small binary file:
+
+    header:  magic, version, level count, current room, player x/y
+    level:   name, score, problem count                      (one per room)
+    problem: operator, lhs, rhs, answer, block count          (one per math problem, in map order)
+    block:   value, block type, x, y, target index, group     (one per movable block, -1 = not on a target/in a group)
+
+Snapshots are taken on the main thread (packing is cheap) and handed to a SnapshotWriter thread, which does
+the actual disk write so the game loop never waits on it. Restoring goes through the normal room constructors,
+but with the snapshot passed in so problems and blocks are rebuilt instead of generated.
+"""
+import os
+import struct
+import threading
+
+from constant import *
+from game_log import fields, get_logger
+from numbers_and_math import BlockType, NumberBlockGroup
+
+log = get_logger("save")
+
+SNAPSHOT_MAGIC = b"RTSV"
+SNAPSHOT_VERSION = 2
+
+_HEADER = struct.Struct("<4sBB16sff")
+_LEVEL = struct.Struct("<16sHH")
+_PROBLEM = struct.Struct("<chhhB")
+_BLOCK = struct.Struct("<BBffbh")
+
+
+class BlockSnapshot:
+    def __init__(self, value, block_type, x, y, target_index, group=-1):
+        self.value = value
+        # Index into list(BlockType)
+        self.block_type = block_type
+        self.x = x
+        self.y = y
+        # Index into the problem's answer_target blocks, or -1 if the block isn't on a target
+        self.target_index = target_index
+        # Which NumberBlockGroup the player snapped it into, numbered across the whole level (digits from
+        # different problems can be snapped together), or -1 if it's on its own
+        self.group = group
+
+
+class ProblemSnapshot:
+    def __init__(self, operator, lhs, rhs, answer, blocks):
+        self.operator = operator
+        self.lhs = lhs
+        self.rhs = rhs
+        self.answer = answer
+        self.blocks = blocks
+
+
+class LevelSnapshot:
+    def __init__(self, score, problems):
+        self.score = score
+        self.problems = problems
+
+
+class GameSnapshot:
+    def __init__(self, current_room, player_x, player_y, levels):
+        self.current_room = current_room
+        self.player_x = player_x
+        self.player_y = player_y
+        # {room name: LevelSnapshot}
+        self.levels = levels
+
+
+def snapshot_problem(vmp, group_ids=None) -> ProblemSnapshot:
+    """
+    Params:
+    :group_ids: {NumberBlockGroup: number}, shared by every problem in a level. Groups not in it yet are added.
+    """
+    if group_ids is None:
+        group_ids = {}
+    targets = vmp.answer_target._blocks
+    block_types = list(BlockType)
+    blocks = []
+    for block in vmp.movable_blocks:
+        target_index = -1
+        if block.target_location is not None and block.target_location.number_attempt is block:
+            target_index = targets.index(block.target_location)
+        group = -1
+        if block.group is not None:
+            group = group_ids.setdefault(block.group, len(group_ids))
+        blocks.append(BlockSnapshot(block.value, block_types.index(block.block_type),
+                                    block.center_x, block.center_y, target_index, group))
+    problem = vmp.problem
+    return ProblemSnapshot(problem.operator, problem.lhs, problem.rhs, problem.answer, blocks)
+
+
+def snapshot_level(level) -> LevelSnapshot:
+    group_ids = {}
+    return LevelSnapshot(level.score or 0, [snapshot_problem(vmp, group_ids) for vmp in level.problem_list])
+
+
+def restore_groups(problem_list, snapshot: LevelSnapshot):
+    """
+    Snap the blocks of a rebuilt level back into the groups they were in. Call once every problem has
+    restored its blocks (see VisualMathProblem.restore_blocks()).
+    """
+    groups = {}
+    for vmp, problem_snapshot in zip(problem_list, snapshot.problems):
+        for block, block_snapshot in zip(vmp.movable_blocks, problem_snapshot.blocks):
+            if block_snapshot.group >= 0:
+                groups.setdefault(block_snapshot.group, []).append(block)
+    for blocks in groups.values():
+        NumberBlockGroup.rejoin(blocks)
+
+
+def take_snapshot(window) -> GameSnapshot:
+    """
+    Capture the state of every room, loaded or evicted. Must be called on the main thread.
+    """
+    current_room = window.current_level.name if window.current_level is not None else "home"
+    return GameSnapshot(current_room, window.player.center_x, window.player.center_y, window.rooms.snapshot_all())
+
+
+def _pack_name(name):
+    return name.encode("utf-8")[:16]
+
+
+def _unpack_name(raw):
+    return raw.rstrip(b"\0").decode("utf-8")
+
+
+def pack_snapshot(snapshot: GameSnapshot) -> bytes:
+    parts = [_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(snapshot.levels),
+                          _pack_name(snapshot.current_room), snapshot.player_x, snapshot.player_y)]
+    for name, level in snapshot.levels.items():
+        parts.append(_LEVEL.pack(_pack_name(name), level.score, len(level.problems)))
+        for problem in level.problems:
+            parts.append(_PROBLEM.pack(problem.operator.encode("ascii"), problem.lhs, problem.rhs,
+                                       problem.answer, len(problem.blocks)))
+            for block in problem.blocks:
+                parts.append(_BLOCK.pack(block.value, block.block_type, block.x, block.y, block.target_index,
+                                         block.group))
+    return b"".join(parts)
+
+
+def unpack_snapshot(data: bytes) -> GameSnapshot:
+    magic, version, level_count, current_room, player_x, player_y = _HEADER.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("Not a save file this version of the game can read")
+    offset = _HEADER.size
+
+    levels = {}
+    for _ in range(level_count):
+        name, score, problem_count = _LEVEL.unpack_from(data, offset)
+        offset += _LEVEL.size
+        problems = []
+        for _ in range(problem_count):
+            operator_str, lhs, rhs, answer, block_count = _PROBLEM.unpack_from(data, offset)
+            offset += _PROBLEM.size
+            blocks = []
+            for _ in range(block_count):
+                blocks.append(BlockSnapshot(*_BLOCK.unpack_from(data, offset)))
+                offset += _BLOCK.size
+            problems.append(ProblemSnapshot(operator_str.decode("ascii"), lhs, rhs, answer, blocks))
+        levels[_unpack_name(name)] = LevelSnapshot(score, problems)
+
+    return GameSnapshot(_unpack_name(current_room), player_x, player_y, levels)
+
+
+def load_snapshot(path=SAVE_FILE_PATH):
+    """
+    Read a snapshot from disk. Returns None if there isn't a usable save file, in which case
+    the game just starts fresh.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as save_file:
+            return unpack_snapshot(save_file.read())
+    except (ValueError, struct.error, UnicodeDecodeError) as e:
+        log.warning("Ignoring unreadable save file", extra=fields(path=path, error=e))
+        return None
+
+
+class SnapshotWriter(threading.Thread):
+    """
+    Background thread that writes packed snapshots to disk. Only the most recent snapshot
+    is kept, so if the disk is slow older ones are simply skipped.
+    """
+
+    def __init__(self, path=SAVE_FILE_PATH):
+        super().__init__(daemon=True)
+        self.path = path
+        self._pending = None
+        self._stopping = False
+        self._condition = threading.Condition()
+
+    def submit(self, data: bytes):
+        with self._condition:
+            self._pending = data
+            self._condition.notify()
+
+    def stop(self):
+        """Write whatever is still pending, then end the thread."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self.join()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopping:
+                    self._condition.wait()
+                data = self._pending
+                self._pending = None
+                stopping = self._stopping
+            if data is not None:
+                self._write(data)
+            if stopping:
+                return
+
+    def _write(self, data):
+        # Write to a temporary file first so a crash mid-write never leaves a half-written save
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "wb") as save_file:
+            save_file.write(data)
+        os.replace(temp_path, self.path)
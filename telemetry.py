@@ -0,0 +1,86 @@
+"""
+Records every answer attempt (a block dropped on a TargetLocation) to a local SQLite file.
+
+record() only appends to an in-memory ring buffer, so the game loop never touches the disk. A background
+thread drains the buffer and inserts the events in batches. If the writer falls behind and the buffer
+fills up, the oldest events are dropped (and counted) instead of letting memory grow.
+"""
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from constant import *
+from game_log import fields, get_logger
+
+log = get_logger("telemetry")
+
+
+class TelemetryRecorder:
+
+    def __init__(self, path=TELEMETRY_DB_PATH, capacity=TELEMETRY_BUFFER_SIZE):
+        self.path = path
+        self._events = deque(maxlen=capacity)
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self.dropped = 0
+        self.written = 0
+
+    def record(self, room, problem, value, correct, seconds_since_shown):
+        """Queue one attempt. Cheap and non-blocking; safe to call from the game loop."""
+        if len(self._events) == self._events.maxlen:
+            # The deque throws away the oldest event on append
+            self.dropped += 1
+        self._events.append((time.time(), room, problem, value, int(correct), seconds_since_shown))
+        if len(self._events) >= TELEMETRY_BATCH_SIZE:
+            self._wake.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write out whatever is still buffered and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        if self.dropped > 0:
+            log.warning("Dropped attempts because the writer fell behind", extra=fields(dropped=self.dropped))
+
+    def _run(self):
+        # SQLite connections can only be used on the thread that made them
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS attempts ("
+            "id INTEGER PRIMARY KEY, recorded_at REAL, room TEXT, problem TEXT, "
+            "value INTEGER, correct INTEGER, seconds_since_shown REAL)"
+        )
+        connection.commit()
+        while True:
+            self._wake.wait(TELEMETRY_FLUSH_INTERVAL)
+            self._wake.clear()
+            stopping = self._stopping
+            self._flush(connection)
+            if stopping:
+                break
+        connection.close()
+
+    def _flush(self, connection):
+        while len(self._events) > 0:
+            batch = []
+            while len(self._events) > 0 and len(batch) < TELEMETRY_BATCH_SIZE:
+                batch.append(self._events.popleft())
+            connection.executemany(
+                "INSERT INTO attempts (recorded_at, room, problem, value, correct, seconds_since_shown) "
+                "VALUES (?, ?, ?, ?, ?, ?)", batch
+            )
+            connection.commit()
+            self.written += len(batch)
+
+
+# The one recorder the game uses. MyGame starts and stops its writer thread.
+recorder = TelemetryRecorder()
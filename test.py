@@ -1,6 +1,43 @@
+import gc
+import logging
+import os
+import sqlite3
+import tempfile
+import time
 import unittest
+from types import SimpleNamespace
 import arcade
-from numbers_and_math import NumberBlockGroup, NumberBlock
+import numpy as np
+from numbers_and_math import NumberBlockGroup, NumberBlock, VisualMathProblem, VisualMathProblemLocation
+from benchmarks.stress_map import PROBLEM_HEIGHT, PROBLEM_TILE, PROBLEM_WIDTH, generate_tiles, write_stress_map
+from animation import AnimationClip, Animator
+import atlas
+from atlas import build_scaled_variants, load_scaled_texture, pack_regions, scaled_images, variant_path
+from chunked_map import ChunkStreamer, ChunkedMap, build_chunks, read_chunk
+from constant import (CORRIDOR_CHUNK_LENGTH, FRAME_BUFFER_COUNT, HOT_RELOAD_POLL_INTERVAL, IDLE_TIMEOUT,
+                      IDLE_UPDATE_RATE, IMG_PATH_EXT, LAYER_NAME_MATH_PROBLEM_ORIGIN, LAYER_NAME_WALLS,
+                      NUM_BASE_PATH, NUMBER_SCALING, PLAYER_MOVEMENT_SPEED, RENDER_ON_DEMAND, TILE_SCALING,
+                      UPDATE_RATE)
+from door import Door
+from FallingTileStuff.corridor import CORRIDOR_TILE_SIZE, CorridorStream, answer_choices
+from fixed_timestep import FixedTimestep
+from frame_throttle import FrameThrottle
+from guidance import FlowField
+from hit_box_cache import HitBoxCache
+from game_scene import GameScene
+from gc_policy import GCPolicy
+from game_log import FieldFormatter, SampleFilter, fields
+from interaction import InteractionTracker
+from memory_profile import leak_suspects, module_for_file
+from physics import PlayerPhysicsEngine
+from hot_reload import MapWatcher, build_layers, changed_layers
+from telemetry import TelemetryRecorder
+from prefetch import RoomPrefetcher
+from render_scale import ResolutionScaler
+from room_cache import RoomCache
+from Rooms.room import Room
+from save_state import (BlockSnapshot, GameSnapshot, LevelSnapshot, ProblemSnapshot, pack_snapshot,
+                        restore_groups, snapshot_problem, unpack_snapshot)
 
 window = arcade.Window(200, 200, "test", resizable=True)
 arcade.set_window(window)
@@ -55,5 +92,996 @@ class TestNumberBlockGroup(unittest.TestCase):
         self.assertEqual(group._blocks[1].value, 3)
 
 
+class TestAtlas(unittest.TestCase):
+
+    def test_pack_regions_do_not_overlap(self):
+        sizes = {f"crate_{i}": (64, 64) for i in range(40)}
+        sizes["page"] = (1600, 900)
+        regions, (width, height) = pack_regions(sizes, max_width=2048, padding=2)
+        self.assertEqual(len(regions), len(sizes))
+        placed = list(regions.values())
+        for index, (x, y, w, h) in enumerate(placed):
+            self.assertLessEqual(x + w, width)
+            self.assertLessEqual(y + h, height)
+            for other_x, other_y, other_w, other_h in placed[index + 1:]:
+                self.assertTrue(x + w <= other_x or other_x + other_w <= x
+                                or y + h <= other_y or other_y + other_h <= y)
+
+    def test_variant_path(self):
+        self.assertEqual(variant_path("Crates/crate_01.png", 0.5), "Crates/crate_01@0.5x.png")
+        self.assertEqual(variant_path("Numbers/1.png", 0.65), "Numbers/1@0.65x.png")
+
+    def test_shipped_scales_get_variants(self):
+        digit = f"{NUM_BASE_PATH}7{IMG_PATH_EXT}"
+        self.assertIn((digit, NUMBER_SCALING), scaled_images())
+        self.assertNotEqual(NUMBER_SCALING, 1)
+
+        variant = variant_path(digit, NUMBER_SCALING)
+        if not os.path.exists(variant):
+            self.addCleanup(os.remove, variant)
+        build_scaled_variants([(digit, NUMBER_SCALING)])
+        atlas._variant_paths.pop((digit, NUMBER_SCALING), None)
+        self.addCleanup(atlas._variant_paths.pop, (digit, NUMBER_SCALING), None)
+
+        original = atlas.load_texture(digit)
+        texture, scale = load_scaled_texture(digit, NUMBER_SCALING)
+        # Drawn pixel for pixel, already the size the original would be drawn at
+        self.assertEqual(scale, 1)
+        self.assertEqual(texture.width, round(original.width * NUMBER_SCALING))
+        self.assertEqual(texture.height, round(original.height * NUMBER_SCALING))
+
+
+class CountingTexture:
+    """Stands in for arcade.Texture, counting how often its hit box is worked out from the pixels."""
+
+    def __init__(self, name):
+        self.name = name
+        self._hit_box_points = None
+        self.scans = 0
+
+    @property
+    def hit_box_points(self):
+        if self._hit_box_points is None:
+            self.scans += 1
+            self._hit_box_points = ((-32.0, -32.0), (32.0, -32.0), (32.0, 32.0), (-32.0, 32.0))
+        return self._hit_box_points
+
+
+class TestHitBoxCache(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "hitboxes.json")
+        self.image_path = os.path.join(directory, "tile.png")
+        with open(self.image_path, "wb") as file:
+            file.write(b"png")
+
+    def test_identical_textures_are_scanned_once(self):
+        cache = HitBoxCache(self.path, persist=False)
+        first = cache.apply(CountingTexture("tile"), self.image_path, "Simple")
+        second = cache.apply(CountingTexture("tile"), self.image_path, "Simple")
+        self.assertEqual(first.scans, 1)
+        self.assertEqual(second.scans, 0)
+        self.assertEqual(second.hit_box_points, first.hit_box_points)
+        # A different algorithm is a different polygon
+        self.assertEqual(cache.apply(CountingTexture("tile"), self.image_path, "Detailed").scans, 1)
+
+    def test_persisted_between_runs(self):
+        cache = HitBoxCache(self.path, persist=True)
+        cache.apply(CountingTexture("tile"), self.image_path, "Simple")
+        cache.save()
+        texture = HitBoxCache(self.path, persist=True).apply(CountingTexture("tile"), self.image_path, "Simple")
+        self.assertEqual(texture.scans, 0)
+
+        # Editing the image makes the stored polygon stale
+        os.utime(self.image_path, (0, 0))
+        texture = HitBoxCache(self.path, persist=True).apply(CountingTexture("tile"), self.image_path, "Simple")
+        self.assertEqual(texture.scans, 1)
+
+
+def make_problem(scene, snapshot=None):
+    """A VisualMathProblem built the way a room's map builds them."""
+    location = VisualMathProblemLocation(operator_str="+")
+    location.center_x = 320
+    location.center_y = 320
+    location.setup(scene, snapshot)
+    return location.vmp
+
+
+def place_on_targets(problem):
+    """
+    Drop a movable block on every answer target, one of them wrong if there's a wrong digit to use.
+    Returns [(value, block type)] of what ended up on each target.
+    """
+    targets = problem.answer_target.get_blocks()
+    unused = list(problem.movable_blocks)
+    for index, target in enumerate(targets):
+        wanted = [block for block in unused if block.value == target.expected_value]
+        if index == 0:
+            # Only a digit none of the other targets need, or they could run out
+            needed = [other.expected_value for other in targets]
+            wrong = [block for block in unused if block.value not in needed]
+            wanted = wrong or wanted
+        block = wanted[0]
+        unused.remove(block)
+        block.target_location = target
+        target.place_number_block(block)
+    return [(target.number_attempt.value, target.number_attempt.block_type) for target in targets]
+
+
+class TestSaveState(unittest.TestCase):
+
+    def test_snapshot_round_trip(self):
+        blocks = [BlockSnapshot(4, 3, 100.0, 200.0, 0), BlockSnapshot(7, 0, 320.5, 96.0, -1, 2)]
+        snapshot = GameSnapshot("division", 544.0, 1547.0, {
+            "division": LevelSnapshot(1, [ProblemSnapshot("/", 8, 2, 4, blocks)]),
+            "addition": LevelSnapshot(0, []),
+        })
+        restored = unpack_snapshot(pack_snapshot(snapshot))
+        self.assertEqual(restored.current_room, "division")
+        self.assertEqual(list(restored.levels), ["division", "addition"])
+        problem = restored.levels["division"].problems[0]
+        self.assertEqual((problem.operator, problem.lhs, problem.rhs, problem.answer), ("/", 8, 2, 4))
+        self.assertEqual([vars(block) for block in problem.blocks], [vars(block) for block in blocks])
+
+    def test_blocks_on_targets_survive_a_round_trip(self):
+        problem = make_problem(GameScene())
+        placed = place_on_targets(problem)
+
+        restored = make_problem(GameScene(), unpack_snapshot(pack_snapshot(GameSnapshot("addition", 0, 0, {
+            "addition": LevelSnapshot(0, [snapshot_problem(problem)])
+        }))).levels["addition"].problems[0])
+        for index, target in enumerate(restored.answer_target.get_blocks()):
+            block = target.number_attempt
+            self.assertIs(block.target_location, target)
+            self.assertEqual((block.value, block.block_type), placed[index])
+            self.assertEqual((block.center_x, block.center_y), (target.center_x, target.center_y))
+        self.assertEqual(restored.is_solved(), problem.is_solved())
+
+    def test_bad_magic_is_rejected(self):
+        data = bytearray(pack_snapshot(GameSnapshot("home", 0, 0, {})))
+        data[0:4] = b"NOPE"
+        with self.assertRaises(ValueError):
+            unpack_snapshot(bytes(data))
+
+
+class TestHotReload(unittest.TestCase):
+
+    def test_only_edited_layers_change(self):
+        old = {None: "tiles", "walls": "a", "moat": "b", "Dirt": "c"}
+        new = {None: "tiles", "walls": "a", "moat": "B", "Paths": "d"}
+        self.assertEqual(changed_layers(old, new), ["Dirt", "Paths", "moat"])
+
+    def test_tileset_change_reloads_everything(self):
+        old = {None: "tiles", "walls": "a", "moat": "b"}
+        new = {None: "new tiles", "walls": "a", "moat": "b"}
+        self.assertEqual(changed_layers(old, new), ["moat", "walls"])
+
+    def test_only_changed_layers_are_built(self):
+        tile_map = build_layers("maps/Main-Spawn.tmx", ["Water", "exits"], {})
+        self.assertEqual(sorted(tile_map.sprite_lists), ["Water", "exits"])
+        self.assertEqual(len(tile_map.sprite_lists["Water"]), 45)
+
+    def test_reload_reports_patched_layers(self):
+        # Next to the original so the tileset's relative path still works
+        with open("maps/Main-Spawn.tmx") as original:
+            text = original.read()
+        handle, map_name = tempfile.mkstemp(suffix=".tmx", dir="maps")
+        os.close(handle)
+        self.addCleanup(os.remove, map_name)
+        with open(map_name, "w") as copy:
+            copy.write(text)
+        scene = arcade.Scene.from_tilemap(arcade.load_tilemap(map_name, TILE_SCALING))
+        watcher = MapWatcher()
+        watcher.watch(map_name, scene, {})
+        self.assertEqual(watcher.update(HOT_RELOAD_POLL_INTERVAL), [])
+
+        # Paint one more water tile
+        water = text.index("<data", text.index('name="Water"'))
+        empty = text.index(",0,", water)
+        with open(map_name, "w") as copy:
+            copy.write(text[:empty] + ",1," + text[empty + 3:])
+        os.utime(map_name, (time.time() + 1, time.time() + 1))
+        self.assertEqual(watcher.update(HOT_RELOAD_POLL_INTERVAL), ["Water"])
+        self.assertEqual(len(scene["Water"]), 46)
+
+
+class FakeSprite:
+    """Stands in for an arcade.Sprite so textures can just be strings."""
+    texture = None
+
+
+class TestAnimator(unittest.TestCase):
+
+    def test_frames_follow_delta_time(self):
+        sprite = FakeSprite()
+        animator = Animator()
+        clip = AnimationClip(["a", "b", "c"], frame_duration=0.1)
+        animator.play(sprite, clip)
+        self.assertEqual(sprite.texture, "a")
+        animator.update(0.15)
+        self.assertEqual(sprite.texture, "b")
+        animator.update(0.2)
+        self.assertEqual(sprite.texture, "a")  # Looped back around
+
+    def test_finished_clip_is_unregistered(self):
+        sprite = FakeSprite()
+        animator = Animator()
+        animator.play(sprite, AnimationClip(["a", "b"], frame_duration=0.1, loop=False))
+        animator.update(0.5)
+        self.assertEqual(sprite.texture, "b")
+        self.assertEqual(len(animator), 0)
+
+
+class TestFixedTimestep(unittest.TestCase):
+
+    def test_steps_follow_elapsed_time(self):
+        timestep = FixedTimestep(rate=60, max_steps=8)
+        self.assertEqual(timestep.advance(1 / 120), 0)
+        self.assertAlmostEqual(timestep.alpha, 0.5)
+        self.assertEqual(timestep.advance(1 / 120 + 1 / 30), 3)
+
+    def test_stall_is_capped(self):
+        timestep = FixedTimestep(rate=60, max_steps=8)
+        self.assertEqual(timestep.advance(2), 8)
+        self.assertEqual(timestep.accumulator, 0)
+        self.assertEqual(timestep.advance(1 / 60), 1)
+
+
+class TestInteractionTracker(unittest.TestCase):
+
+    def test_only_checks_when_cell_changes(self):
+        subject = arcade.Sprite(center_x=10, center_y=10)
+        calls = []
+        events = []
+
+        def find_target():
+            calls.append(subject.center_x)
+            return "block" if subject.center_x > 64 else None
+
+        tracker = InteractionTracker(subject, find_target,
+                                     lambda target: events.append(("enter", target)),
+                                     lambda target: events.append(("exit", target)), cell_size=32)
+        tracker.update()
+        tracker.update()
+        self.assertEqual(len(calls), 1)
+        subject.center_x = 70
+        tracker.update()
+        subject.center_x = 10
+        tracker.update()
+        self.assertEqual(events, [("enter", "block"), ("exit", "block")])
+
+    def test_invalidate_exits_the_current_target(self):
+        subject = arcade.Sprite(center_x=10, center_y=10)
+        events = []
+        tracker = InteractionTracker(subject, lambda: "block",
+                                     lambda target: events.append(("enter", target)),
+                                     lambda target: events.append(("exit", target)))
+        tracker.update()
+        # Going through a door: the caption for the old scene's block has to go
+        tracker.invalidate()
+        self.assertEqual(events, [("enter", "block"), ("exit", "block")])
+        tracker.invalidate()
+        self.assertEqual(len(events), 2)
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def test_full_buffer_drops_oldest_attempts(self):
+        path = os.path.join(tempfile.mkdtemp(), "telemetry.sqlite3")
+        recorder = TelemetryRecorder(path, capacity=3)
+        for value in range(5):
+            recorder.record("addition", "3+4", value, value == 7, 1.5)
+        recorder.start()
+        recorder.stop()
+        self.assertEqual(recorder.dropped, 2)
+        rows = sqlite3.connect(path).execute("SELECT value FROM attempts ORDER BY id").fetchall()
+        self.assertEqual(rows, [(2,), (3,), (4,)])
+
+
+class FakeRoom:
+    """
+    Stands in for a Level subclass; records the snapshot it was built from. Built staged, it takes STAGES calls
+    to build_step() before it's done.
+    """
+    STAGES = 3
+
+    def __init__(self, snapshot=None, staged=False):
+        self.snapshot = snapshot
+        self.score = 0 if snapshot is None else snapshot.score
+        self.problem_list = []
+        self.unloaded = False
+        self.stages_left = self.STAGES if staged else 0
+
+    def build_step(self):
+        if self.stages_left == 0:
+            return True
+        self.stages_left -= 1
+        return False
+
+    def finish_building(self):
+        self.stages_left = 0
+
+    def unload(self):
+        self.unloaded = True
+
+
+class ProblemRoom:
+    """A room with one real math problem in it, built from a LevelSnapshot like Room is."""
+
+    def __init__(self, snapshot=None):
+        self.problem_list = [make_problem(GameScene(), snapshot.problems[0] if snapshot is not None else None)]
+        self.score = 0 if snapshot is None else snapshot.score
+        if snapshot is not None:
+            restore_groups(self.problem_list, snapshot)
+
+    def unload(self):
+        self.problem_list = []
+
+
+class TestRoomCache(unittest.TestCase):
+
+    def test_least_recently_visited_room_is_evicted_and_rehydrated(self):
+        cache = RoomCache({"a": FakeRoom, "b": FakeRoom, "c": FakeRoom}, budget=2)
+        room_a = cache.get("a")
+        room_a.score = 3
+        cache.get("b")
+        cache.get("a")
+        cache.get("c")
+        self.assertTrue(cache.is_loaded("a"))
+        self.assertFalse(cache.is_loaded("b"))
+
+        cache.get("b")
+        self.assertFalse(cache.is_loaded("a"))
+        self.assertTrue(room_a.unloaded)
+        self.assertEqual(cache.get("a").snapshot.score, 3)
+
+    def test_progress_survives_eviction(self):
+        cache = RoomCache({"a": ProblemRoom, "b": ProblemRoom}, budget=1)
+        placed = place_on_targets(cache.get("a").problem_list[0])
+        cache.get("b")
+        self.assertFalse(cache.is_loaded("a"))
+
+        problem = cache.get("a").problem_list[0]
+        for target, (value, block_type) in zip(problem.answer_target.get_blocks(), placed):
+            self.assertEqual((target.number_attempt.value, target.number_attempt.block_type), (value, block_type))
+            self.assertIs(target.number_attempt.target_location, target)
+        unplaced = [block for block in problem.movable_blocks if block.target_location is None]
+        self.assertEqual(len(unplaced), len(problem.movable_blocks) - len(placed))
+
+    def test_snapped_groups_survive_eviction(self):
+        cache = RoomCache({"a": ProblemRoom, "b": ProblemRoom}, budget=1)
+        problem = cache.get("a").problem_list[0]
+        index = problem.scene.block_index
+        first, second = problem.movable_blocks[:2]
+        first.move_to(*index.cell_center((2, 0)))
+        second.move_to(*index.cell_center((3, 0)))
+        NumberBlockGroup.of(second).snap()
+        value = first.group.value
+        cache.get("b")
+
+        problem = cache.get("a").problem_list[0]
+        first, second = problem.movable_blocks[:2]
+        self.assertIsNotNone(first.group)
+        self.assertIs(first.group, second.group)
+        self.assertEqual(first.group.value, value)
+        self.assertEqual(first.group.get_blocks(), [first, second])
+        self.assertTrue(all(block.group is None for block in problem.movable_blocks[2:]))
+
+    def test_prefetch_is_not_a_visit(self):
+        cache = RoomCache({name: FakeRoom for name in "abcd"}, budget=2)
+        cache.get("a")
+        cache.get("b")
+        cache.prefetch("c")
+        steps = 0
+        while cache.prefetch_step(current="b") is None:
+            steps += 1
+        self.assertEqual(steps, FakeRoom.STAGES)
+        self.assertEqual([cache.is_loaded(name) for name in "abc"], [False, True, True])
+
+        # Walking past another door: the room that was only prefetched goes, not the one the player is in
+        cache.prefetch("d")
+        while cache.prefetch_step(current="b") is None:
+            pass
+        self.assertEqual([cache.is_loaded(name) for name in "bcd"], [True, False, True])
+
+    def test_entering_mid_prefetch_finishes_the_build(self):
+        snapshot = SimpleNamespace(score=4)
+        cache = RoomCache({"a": FakeRoom}, snapshots={"a": snapshot})
+        cache.prefetch("a")
+        cache.prefetch_step()
+        self.assertIs(cache.snapshot_all()["a"], snapshot)
+
+        room = cache.get("a")
+        self.assertEqual((room.stages_left, room.score), (0, 4))
+        self.assertFalse(cache.is_building())
+        self.assertIsNone(cache.prefetch_step())
+
+
+class TestRoomPrefetcher(unittest.TestCase):
+
+    def test_rooms_are_built_when_the_player_nears_their_door(self):
+        cache = RoomCache({"a": FakeRoom, "b": FakeRoom}, budget=2)
+        prefetcher = RoomPrefetcher(cache, radius=100)
+        doors = [SimpleNamespace(target_room_string=name, center_x=x, center_y=0)
+                 for name, x in [("a", 0), ("b", 1000), ("home", 500)]]
+
+        prefetcher.update(SimpleNamespace(center_x=500, center_y=0), doors)
+        self.assertFalse(cache.is_loaded("a"))
+        near_a = SimpleNamespace(center_x=60, center_y=50)
+        prefetcher.update(near_a, doors)
+        self.assertTrue(cache.is_building("a"))
+        # One stage of the build per step
+        for _ in range(FakeRoom.STAGES + 1):
+            self.assertFalse(cache.is_loaded("a"))
+            prefetcher.update(near_a, doors)
+        self.assertTrue(cache.is_loaded("a"))
+        self.assertFalse(cache.is_loaded("b"))
+
+        prefetcher.entered("a")
+        prefetcher.entered("b")
+        self.assertEqual((prefetcher.hits, prefetcher.misses, prefetcher.wasted), (1, 1, 0))
+
+    def test_rooms_are_built_a_stage_at_a_time(self):
+        room = Room("division", staged=True)
+        self.assertIsNone(room.scene)
+        steps = 1
+        while not room.build_step():
+            steps += 1
+        # Parsing the map, each layer in bands of rows, then the rest
+        self.assertGreater(steps, 10)
+        self.assertGreater(len(room.problem_list), 0)
+        self.assertEqual(room.max_score, len(room.problem_list))
+        self.assertEqual(len(room.scene.doors), 1)
+        # The same tiles as building it all at once
+        whole = Room("division")
+        for name in ["Bottom Grass", "Water"]:
+            self.assertEqual(sorted(sprite.position for sprite in room.scene.get_sprite_list(name)),
+                             sorted(sprite.position for sprite in whole.scene.get_sprite_list(name)))
+
+
+class TestGameScene(unittest.TestCase):
+
+    def test_every_layer_is_resolved_in_order(self):
+        # A map with its own background and walls but no falling tiles
+        background, walls, problems = arcade.SpriteList(), arcade.SpriteList(), arcade.SpriteList()
+        for sprite_list in (background, walls, problems):
+            # arcade.Scene swaps an empty list for a new one
+            sprite_list.append(arcade.Sprite())
+        tile_map = SimpleNamespace(sprite_lists={
+            "background": background, LAYER_NAME_WALLS: walls, LAYER_NAME_MATH_PROBLEM_ORIGIN: problems})
+        scene = GameScene.from_tilemap(tile_map)
+        self.assertIs(scene.walls, walls)
+        self.assertIs(scene.math_problems, problems)
+        # The missing layer is drawn under the map's layers, and the game's layers on top in GAME_LAYERS order
+        self.assertEqual(scene.sprite_lists, [
+            scene.falling_tiles, background, walls, problems, scene.number_targets, scene.players,
+            scene.numbers, scene.number_symbols, scene.number_hitboxes, scene.doors, scene.pages])
+
+    def test_added_walls_use_a_spatial_hash(self):
+        # Streamed scenes start without a walls layer, and chunks are added to the one GameScene makes
+        self.assertIsNotNone(GameScene().walls.spatial_hash)
+
+
+class Carrier(arcade.SpriteSolidColor):
+    """Stands in for Player, which PlayerPhysicsEngine only asks for the blocks it's carrying."""
+
+    def __init__(self, carried):
+        super().__init__(48, 48, arcade.color.WHITE)
+        self.carried = carried
+
+    def carried_blocks(self):
+        return self.carried
+
+
+class TestPlayerPhysics(unittest.TestCase):
+
+    def test_walks_through_the_carried_block_only(self):
+        scene = GameScene()
+        index = scene.block_index
+        carried = NumberBlock(scene, 1)
+        carried.move_to(*index.cell_center((1, 0)))
+        other = NumberBlock(scene, 2)
+        other.move_to(*index.cell_center((3, 0)))
+        wall = arcade.SpriteSolidColor(64, 64, arcade.color.BLACK)
+        wall.position = index.cell_center((2, 1))
+        scene.walls.append(wall)
+        player = Carrier([carried])
+        player.position = index.cell_center((0, 0))
+        engine = PlayerPhysicsEngine(player, [scene.walls, scene.numbers])
+
+        player.change_x = PLAYER_MOVEMENT_SPEED
+        for _ in range(60):
+            engine.update()
+        # Straight through the carried block, then stopped by the next one
+        self.assertEqual(player.right, other.left)
+
+        player.change_x = 0
+        player.change_y = PLAYER_MOVEMENT_SPEED
+        for _ in range(60):
+            engine.update()
+        self.assertEqual(player.top, wall.bottom)
+
+
+class TestBlockSnapping(unittest.TestCase):
+
+    def setUp(self):
+        self.scene = GameScene()
+        self.index = self.scene.block_index
+
+    def place(self, value, column, row=0):
+        block = NumberBlock(self.scene, value)
+        block.move_to(*self.index.cell_center((column, row)))
+        return block
+
+    def test_adjacency_index(self):
+        block = self.place(4, 2)
+        self.assertEqual(list(self.index.at((2, 0))), [block])
+        block.move_to(*self.index.cell_center((5, 1)))
+        self.assertEqual(list(self.index.at((2, 0))), [])
+        self.assertEqual(list(self.index.at((5, 1))), [block])
+
+    def test_dropped_digits_snap_together(self):
+        five = self.place(5, 0)
+        six = self.place(6, 1)
+        NumberBlockGroup.of(six).snap()
+        self.assertIs(five.group, six.group)
+        self.assertEqual(five.group.value, 56)
+        # A digit dropped on the right joins the same group
+        seven = self.place(7, 2)
+        NumberBlockGroup.of(seven).snap()
+        self.assertEqual(five.group.value, 567)
+
+    def test_split_off_middle(self):
+        blocks = [self.place(digit, column) for column, digit in enumerate([1, 2, 3, 4])]
+        for block in blocks[1:]:
+            NumberBlockGroup.of(block).snap()
+        group = blocks[0].group
+        group.split_off(blocks[1])
+        self.assertIsNone(blocks[1].group)
+        self.assertEqual(group.value, 1)
+        # A group left with one block is just that block again
+        self.assertIsNone(blocks[0].group)
+        self.assertEqual(blocks[2].group.value, 34)
+
+    def test_group_that_does_not_fit_the_targets_goes_back(self):
+        problem = make_problem(self.scene)
+        targets = problem.answer_target.get_blocks()
+        first = self.place(1, 30)
+        second = self.place(2, 31)
+        NumberBlockGroup.of(second).snap()
+        group = first.group
+        picked_up_at = (group.center_x, group.center_y)
+
+        # Leftmost digit on the last target, so the other digit has no target to go on
+        group.move_to(targets[-1].center_x, targets[-1].center_y)
+        group.drop(picked_up_at)
+        self.assertEqual((first.center_x, first.center_y), picked_up_at)
+        self.assertEqual(group.get_blocks(), [first, second])
+        self.assertIsNone(targets[-1].number_attempt)
+
+        # Onto targets that are already taken
+        taken = problem.movable_blocks[0]
+        taken.target_location = targets[0]
+        targets[0].place_number_block(taken)
+        group.move_to(targets[0].center_x, targets[0].center_y)
+        group.drop(picked_up_at)
+        self.assertEqual((first.center_x, first.center_y), picked_up_at)
+        self.assertIs(targets[0].number_attempt, taken)
+        self.assertIsNone(first.target_location)
+
+    def test_regrabbed_block_snaps_where_it_is_dropped(self):
+        four = self.place(4, 20)
+        NumberBlockGroup.of(four).snap()
+        self.assertIsNone(four.group)
+        seven = self.place(7, 21, row=3)
+
+        # Carried on its own to column 40 and dropped a little off the grid
+        four.move_to(*self.index.cell_center((40, 3)))
+        four.move_to(four.center_x + 5, four.center_y - 5)
+        NumberBlockGroup.of(four).snap()
+        self.assertEqual((four.center_x, four.center_y), self.index.cell_center((40, 3)))
+        self.assertIsNone(seven.group)
+
+        # Picked up again and dropped next to the 7
+        four.move_to(*self.index.cell_center((20, 3)))
+        NumberBlockGroup.of(four).snap()
+        self.assertIs(four.group, seven.group)
+        self.assertEqual(four.group.value, 47)
+
+        # Pulled back off, carried away and dropped again: neither digit keeps a stale group
+        four.group.split_off(four)
+        self.assertIsNone(seven.group)
+        four.move_to(*self.index.cell_center((30, 0)))
+        NumberBlockGroup.of(four).snap()
+        self.assertEqual((four.center_x, four.center_y), self.index.cell_center((30, 0)))
+        self.assertIsNone(four.group)
+
+
+def count_calls(counts, obj, name):
+    """Wrap obj.name so each call adds 1 to counts[name]."""
+    method = getattr(obj, name)
+
+    def counted(*args, **kwargs):
+        counts[name] += 1
+        return method(*args, **kwargs)
+    setattr(obj, name, counted)
+
+
+class TestDirtyFlags(unittest.TestCase):
+
+    def setUp(self):
+        self.scene = GameScene()
+
+    def count_updates(self, blocks):
+        counts = {"move_to": 0, "configure_texture": 0}
+        for block in blocks:
+            count_calls(counts, block, "move_to")
+            if isinstance(block, NumberBlock):
+                count_calls(counts, block, "configure_texture")
+        return counts
+
+    def test_unchanged_move_does_nothing(self):
+        group = NumberBlockGroup(scene=self.scene, from_number=123)
+        group.move_to(100, 100)
+        counts = self.count_updates(group.get_blocks())
+
+        group.move_to(100, 100)
+        self.assertEqual(counts, {"move_to": 0, "configure_texture": 0})
+
+        # Moving lays the blocks out again, but their textures are still right
+        group.move_to(164, 100)
+        self.assertEqual(counts, {"move_to": 3, "configure_texture": 0})
+
+    def test_draw_moves_each_block_once(self):
+        problem = VisualMathProblem(self.scene, 500, 500, operator_str="+")
+        blocks = [block for chunk in problem.draw_order for block in chunk.get_blocks()]
+        counts = self.count_updates(blocks)
+        counts["_update_locations"] = 0
+        for chunk in problem.draw_order:
+            count_calls(counts, chunk, "_update_locations")
+
+        problem.draw()
+        # Each group is laid out once, after all of them have been given their positions
+        self.assertEqual(counts["_update_locations"], len(problem.draw_order))
+        self.assertEqual(counts["move_to"], len(blocks))
+        self.assertLessEqual(counts["configure_texture"], len(blocks))
+
+        # Nothing about the problem itself changed, so the next frame doesn't touch it
+        for name in counts:
+            counts[name] = 0
+        problem.draw(shuffle=False)
+        self.assertEqual(counts, {"move_to": 0, "configure_texture": 0, "_update_locations": 0})
+
+
+class TestCorridor(unittest.TestCase):
+
+    def test_answer_choices(self):
+        for answer in [0, 1, 7, 100]:
+            choices = answer_choices(answer, 5)
+            self.assertEqual(len(choices), 5)
+            self.assertEqual(len(set(choices)), 5)
+            self.assertIn(answer, choices)
+            self.assertTrue(all(choice >= 0 for choice in choices))
+
+    def test_chunks_are_reused(self):
+        scene = GameScene()
+        stream = CorridorStream(scene, 0, 0, "+", ring_size=3)
+        walls = len(scene.walls)
+        chunks = list(stream.chunks)
+
+        # Teleport far up the corridor; everything behind gets moved ahead instead of rebuilt
+        player = arcade.Sprite()
+        player.center_x, player.center_y = stream.start
+        player.center_y += 10000
+        stream.update(player)
+        self.assertGreater(stream.first_index, 0)
+        self.assertEqual(stream.chunks, chunks)
+        self.assertEqual(len(scene.walls), walls)
+        self.assertGreater(min(chunk.top for chunk in stream.chunks), player.center_y - 10000)
+
+    def test_only_wrong_answers_fall(self):
+        scene = GameScene()
+        stream = CorridorStream(scene, 0, 0, "+", ring_size=1)
+        chunk = stream.chunks[0]
+        player = arcade.SpriteSolidColor(32, 32, arcade.color.RED)
+        scene.players.append(player)
+
+        # Standing on the floor doesn't drop it
+        player.center_x, player.center_y = stream.start
+        stream.update(player)
+        self.assertFalse(any(tile.isFalling for tile in chunk.floor_tiles))
+
+        wrong = next(tile for tile in chunk.answer_tiles if tile.answer != chunk.problem.answer)
+        right = next(tile for tile in chunk.answer_tiles if tile.answer == chunk.problem.answer)
+        player.center_x, player.center_y = wrong.center_x, wrong.center_y
+        stream.update(player)
+        self.assertTrue(wrong.isFalling)
+        player.center_x, player.center_y = right.center_x, right.center_y
+        stream.update(player)
+        self.assertFalse(right.isFalling)
+        self.assertTrue(chunk.solved)
+
+    def test_landing_follows_the_corridor_up(self):
+        scene = GameScene()
+        door = Door("home")
+        stream = CorridorStream(scene, 0, 0, "+", ring_size=3, exit_door=door)
+        walls = len(scene.walls)
+        # The door is walled in just below the first row, in the middle
+        self.assertEqual((door.center_x, door.center_y), (stream.start[0], -CORRIDOR_TILE_SIZE / 2))
+
+        player = arcade.Sprite()
+        player.center_x, player.center_y = stream.start
+        player.center_y += 10000
+        stream.update(player)
+        # The landing is now below the lowest chunk left
+        bottom = stream.first_index * CORRIDOR_CHUNK_LENGTH * CORRIDOR_TILE_SIZE
+        self.assertEqual(door.center_y, bottom - CORRIDOR_TILE_SIZE / 2)
+        self.assertEqual(min(wall.center_y for wall in stream.landing), bottom - 3 * CORRIDOR_TILE_SIZE / 2)
+        self.assertEqual(len(scene.walls), walls)
+
+        stream.restart()
+        self.assertEqual(stream.first_index, 0)
+        self.assertEqual(door.center_y, -CORRIDOR_TILE_SIZE / 2)
+
+
+class TestFlowField(unittest.TestCase):
+
+    @staticmethod
+    def make_field(picture):
+        """A FlowField with 1-pixel cells from rows of '#' (wall) and '.' (floor), top row first."""
+        blocked = np.array([[character == "#" for character in row] for row in reversed(picture)])
+        return FlowField(blocked, cell_size=1)
+
+    def test_points_around_walls(self):
+        field = self.make_field([
+            "....",
+            ".##.",
+            "....",
+        ])
+        field.set_goals({"door": (3, 1)})
+        # Straight right is a wall, so go around it
+        self.assertIn(field.direction_at(0, 1), [(0, 1), (0, -1)])
+        self.assertEqual(field.distance[1, 0], 5)
+        self.assertEqual(field.direction_at(3, 1), (0, 0))
+
+    def test_remove_and_add_goal(self):
+        field = self.make_field([".......", "......."])
+        field.set_goals({"near": (1, 0), "far": (6, 0)})
+        self.assertEqual(field.direction_at(2, 0), (-1, 0))
+        field.remove_goal("near")
+        self.assertEqual(field.direction_at(2, 0), (1, 0))
+        self.assertEqual(field.distance[0, 0], 6)
+        field.add_goal("near", 1, 0)
+        self.assertEqual(field.direction_at(2, 0), (-1, 0))
+        self.assertEqual(field.distance[0, 0], 1)
+
+
+class TestGameLog(unittest.TestCase):
+
+    @staticmethod
+    def make_record(msg, level=logging.DEBUG, **values):
+        record = logging.LogRecord("game.test", level, __file__, 0, msg, None, None)
+        record.__dict__.update(fields(**values))
+        return record
+
+    def test_sample_filter_counts_skipped_records(self):
+        now = [0]
+        sample = SampleFilter(interval=1, clock=lambda: now[0])
+        self.assertTrue(sample.filter(self.make_record("tile moved", y=1)))
+        self.assertFalse(sample.filter(self.make_record("tile moved", y=2)))
+        self.assertFalse(sample.filter(self.make_record("tile moved", y=3)))
+        # A different message isn't held back by the first one
+        self.assertTrue(sample.filter(self.make_record("score updated")))
+        now[0] = 1.5
+        record = self.make_record("tile moved", y=4)
+        self.assertTrue(sample.filter(record))
+        self.assertEqual(record.fields, {"y": 4, "skipped": 2})
+
+    def test_sample_filter_passes_warnings(self):
+        sample = SampleFilter(interval=1, clock=lambda: 0)
+        for _ in range(3):
+            self.assertTrue(sample.filter(self.make_record("save failed", level=logging.WARNING)))
+
+    def test_field_formatter(self):
+        formatter = FieldFormatter("%(message)s%(field_text)s")
+        self.assertEqual(formatter.format(self.make_record("Entered room", room="addition")),
+                         "Entered room room=addition")
+
+
+class TestMemoryProfile(unittest.TestCase):
+
+    def test_module_for_file(self):
+        self.assertEqual(module_for_file("/game/numbers_and_math.py", "/game"), "numbers_and_math")
+        self.assertEqual(module_for_file("/game/Rooms/room.py", "/game"), "Rooms.room")
+        self.assertEqual(module_for_file("/venv/site-packages/arcade/sprite.py", "/game"), "arcade")
+        self.assertEqual(module_for_file("/usr/lib/python3/json/decoder.py", "/game"), "other")
+
+    def test_leak_suspects(self):
+        history = {
+            "home": [{"player": 10, "arcade": 50}, {"player": 20, "arcade": 40}, {"player": 30, "arcade": 60}],
+            "addition": [{"player": 10}, {"player": 20}],
+        }
+        # Only player grew on every visit, and addition hasn't been visited enough times to judge
+        self.assertEqual(leak_suspects(history), [("home", "player", 20)])
+
+
+class TestGCPolicy(unittest.TestCase):
+
+    def test_pauses_are_split_between_play_and_transitions(self):
+        times = iter([0, 0.010, 1, 1.5, 1.5, 1.502])
+        policy = GCPolicy(clock=lambda: next(times))
+        policy._on_gc("start", {"generation": 0})
+        policy._on_gc("stop", {"generation": 0, "collected": 5})
+        policy._in_transition = True
+        policy._on_gc("start", {"generation": 2})
+        policy._on_gc("stop", {"generation": 2, "collected": 100})
+        policy._in_transition = False
+        policy._on_gc("start", {"generation": 0})
+        policy._on_gc("stop", {"generation": 0, "collected": 0})
+
+        self.assertEqual(policy.pauses[("transition", 2)].count, 1)
+        play = policy.play_pauses()
+        self.assertEqual(play.count, 2)
+        self.assertAlmostEqual(play.longest, 0.010)
+
+    def test_transition_freezes_what_is_left(self):
+        policy = GCPolicy(thresholds=(5000, 20, 100))
+        policy.start()
+        try:
+            self.assertEqual(gc.get_threshold(), (5000, 20, 100))
+            policy.transition("test")
+            self.assertGreater(gc.get_freeze_count(), 0)
+            self.assertIn(("transition", 2), policy.pauses)
+        finally:
+            policy.stop()
+        self.assertEqual(gc.get_freeze_count(), 0)
+        self.assertNotEqual(gc.get_threshold(), (5000, 20, 100))
+
+    def test_building_ahead_holds_off_collections(self):
+        policy = GCPolicy(thresholds=(100, 10, 10))
+        policy.start()
+        try:
+            with policy.build_ahead("test"):
+                built = [[] for _ in range(10000)]
+            self.assertEqual(policy.play_pauses().count, 0)
+            self.assertTrue(gc.isenabled())
+            self.assertGreater(gc.get_freeze_count(), len(built))
+        finally:
+            policy.stop()
+
+
+class TestStressMap(unittest.TestCase):
+
+    def test_problems_get_clear_areas(self):
+        walls, problems = generate_tiles(60, 40, wall_density=1, problem_count=5, seed=3)
+        markers = [(row, column) for row, tiles in enumerate(problems)
+                   for column, tile in enumerate(tiles) if tile == PROBLEM_TILE]
+        self.assertEqual(len(markers), 5)
+        for row, column in markers:
+            for clear_row in range(row - PROBLEM_HEIGHT + 1, row + 1):
+                self.assertEqual(walls[clear_row][column:column + PROBLEM_WIDTH], [0] * PROBLEM_WIDTH)
+
+
+class TestResolutionScaler(unittest.TestCase):
+
+    def test_scale_follows_the_draw_time(self):
+        scaler = ResolutionScaler(budget=0.010, minimum=0.5, maximum=1.0, step=0.1, cooldown=30)
+        # A slow GPU: drawing costs 20ms per frame at full resolution
+        for _ in range(500):
+            scaler.record(0.020 * scaler.scale ** 2)
+        self.assertEqual(scaler.scale, 0.7)
+        self.assertLessEqual(scaler.average, 0.010)
+
+        # The window got smaller, so even full resolution is cheap now
+        for _ in range(500):
+            scaler.record(0.004 * scaler.scale ** 2)
+        self.assertEqual(scaler.scale, 1.0)
+
+    def test_waits_between_changes(self):
+        scaler = ResolutionScaler(budget=0.010, minimum=0.5, maximum=1.0, step=0.1, cooldown=5)
+        changes = [scaler.record(0.050) for _ in range(12)]
+        self.assertEqual(changes, [False] * 5 + [True] + [False] * 5 + [True])
+
+
+class ThrottledWindow:
+    """The parts of MyGame that FrameThrottle uses."""
+
+    def __init__(self):
+        self.signature = 0
+        self.update_rate = UPDATE_RATE
+
+    def render_signature(self):
+        return self.signature
+
+    def set_update_rate(self, rate):
+        self.update_rate = rate
+
+
+@unittest.skipUnless(RENDER_ON_DEMAND, "only skips frames with RENDER_ON_DEMAND")
+class TestFrameThrottle(unittest.TestCase):
+
+    def draws(self, throttle, frames):
+        return [throttle.should_draw() for _ in range(frames)]
+
+    def test_draws_only_after_changes(self):
+        window = ThrottledWindow()
+        throttle = FrameThrottle(window)
+        throttle.update(UPDATE_RATE)
+        self.assertEqual(self.draws(throttle, FRAME_BUFFER_COUNT + 2), [True] * FRAME_BUFFER_COUNT + [False] * 2)
+
+        # Nothing changed
+        throttle.update(UPDATE_RATE)
+        self.assertEqual(self.draws(throttle, 1), [False])
+
+        window.signature += 1
+        throttle.update(UPDATE_RATE)
+        self.assertEqual(self.draws(throttle, FRAME_BUFFER_COUNT + 1), [True] * FRAME_BUFFER_COUNT + [False])
+
+        throttle.mark_dirty()
+        self.assertEqual(self.draws(throttle, FRAME_BUFFER_COUNT + 1), [True] * FRAME_BUFFER_COUNT + [False])
+
+    def test_slows_down_when_idle_or_unfocused(self):
+        window = ThrottledWindow()
+        throttle = FrameThrottle(window)
+        throttle.update(UPDATE_RATE)
+        throttle.update(IDLE_TIMEOUT)
+        self.assertEqual(window.update_rate, IDLE_UPDATE_RATE)
+        throttle.notify_input()
+        self.assertEqual(window.update_rate, UPDATE_RATE)
+
+        # Something moving on screen keeps it awake
+        for _ in range(3):
+            window.signature += 1
+            throttle.update(IDLE_TIMEOUT)
+        self.assertEqual(window.update_rate, UPDATE_RATE)
+
+        throttle.set_focused(False)
+        self.assertEqual(window.update_rate, IDLE_UPDATE_RATE)
+        window.signature += 1
+        throttle.update(UPDATE_RATE)
+        self.assertEqual(window.update_rate, IDLE_UPDATE_RATE)
+        throttle.set_focused(True)
+        self.assertEqual(window.update_rate, UPDATE_RATE)
+
+
+class TestChunkedMap(unittest.TestCase):
+
+    def setUp(self):
+        map_name = os.path.join(tempfile.mkdtemp(), "stress.tmx")
+        write_stress_map(map_name, 40, 40, wall_density=0.2, problem_count=2, seed=1)
+        self.walls, _ = generate_tiles(40, 40, wall_density=0.2, problem_count=2, seed=1)
+        self.map = ChunkedMap(build_chunks(map_name, chunk_size=8))
+
+    def test_chunks_match_the_map(self):
+        self.assertEqual(len(self.map.chunks), 25)
+        self.assertEqual(len(self.map.problem_origins), 2)
+        wall_layer = self.map.layers.index(LAYER_NAME_WALLS)
+        for row, tiles in enumerate(self.walls):
+            # Chunks count rows from the bottom
+            bottom_row = 39 - row
+            for column, tile in enumerate(tiles):
+                layers = read_chunk(self.map.directory, (column // 8, bottom_row // 8), len(self.map.layers), 8)
+                self.assertEqual(layers[wall_layer][bottom_row % 8 * 8 + column % 8], tile)
+
+    def test_only_chunks_near_the_player_are_loaded(self):
+        scene = GameScene()
+        streamer = ChunkStreamer(scene, self.map, radius=1)
+        chunk_pixels = self.map.chunk_pixels
+        streamer.load_around(chunk_pixels / 2, chunk_pixels / 2)
+        self.assertEqual(streamer.loaded_chunks(), {(0, 0), (0, 1), (1, 0), (1, 1)})
+        self.assertEqual(len(scene.walls), sum(1 for row in self.walls[-16:] for tile in row[:16] if tile != 0))
+
+        # Walk to the far corner and let the loader thread catch up
+        for _ in range(1000):
+            streamer.update(chunk_pixels * 4.5, chunk_pixels * 4.5)
+            if streamer.loaded_chunks() == {(3, 3), (3, 4), (4, 3), (4, 4)}:
+                break
+            time.sleep(0.001)
+        streamer.stop()
+        self.assertEqual(streamer.loaded_chunks(), {(3, 3), (3, 4), (4, 3), (4, 4)})
+        self.assertEqual(len(scene.walls), sum(1 for row in self.walls[:16] for tile in row[-16:] if tile != 0))
+
+
 if __name__ == '__main__':
     unittest.main()